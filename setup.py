@@ -32,6 +32,12 @@ INSTALL_REQUIRES = ['msgpack==1.1.0',
 
 CLI_REQUIRES = ['click==8.1.7', 'rich==13.9.3', 'pygments==2.18.0']
 
+LZ4_REQUIRES = ['lz4==4.3.3']
+
+ZSTD_REQUIRES = ['zstandard==0.23.0']
+
+UVLOOP_REQUIRES = ['uvloop==0.21.0']
+
 TEST_REQUIRE = ['pytest',
                 'coverage']
 
@@ -86,7 +92,10 @@ setup(
       ]
     },
     extras_require={
-      'cli': CLI_REQUIRES
+      'cli': CLI_REQUIRES,
+      'lz4': LZ4_REQUIRES,
+      'zstd': ZSTD_REQUIRES,
+      'uvloop': UVLOOP_REQUIRES
     },
     packages=find_packages(exclude=("tests",)),
     package_dir={'sqlite_rx': 'sqlite_rx'},
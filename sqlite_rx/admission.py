@@ -0,0 +1,184 @@
+import collections
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlite_rx.query import is_read_only_request
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['PRIORITIES', 'RateLimiter', 'RequestQueue', 'TokenBucket', 'request_priority', 'retry_after_ms']
+
+# Priority classes of the requests, served strictly in this order
+INTERACTIVE, WRITE, BULK = range(3)
+PRIORITIES = ('interactive', 'write', 'bulk')
+
+# Every so many requests the oldest queued request is served whatever its class, so that no class starves
+OLDEST_FIRST_INTERVAL = 8
+
+# Clients whose token buckets are remembered. The least recently seen client is forgotten first.
+MAX_RATE_LIMITED_CLIENTS = 10000
+
+# Bounds of the delay, in ms, after which an overloaded server asks clients to retry
+MIN_RETRY_AFTER = 10
+MAX_RETRY_AFTER = 5000
+
+
+def request_priority(request: dict) -> int:
+    """The priority class of a client request.
+
+    Reads, fetches of open cursors and admin requests are interactive. Scripts, ``execute_many``
+    and batches are bulk requests, and every other statement is a write.
+
+    """
+    if 'admin' in request or 'cursor_id' in request:
+        return INTERACTIVE
+    if request.get('execute_script') or request.get('execute_many') or 'batch' in request:
+        return BULK
+    if is_read_only_request(request):
+        return INTERACTIVE
+    return WRITE
+
+
+def retry_after_ms(seconds: float) -> int:
+    """A retry delay in ms, within :data: `MIN_RETRY_AFTER` and :data: `MAX_RETRY_AFTER`"""
+    return min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(seconds * 1000)))
+
+
+class TokenBucket:
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        """Admits ``rate`` requests per second on average and bursts of up to ``capacity`` requests"""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token. Returns 0 if one was available, otherwise the seconds until there is one."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int = None, max_clients: int = MAX_RATE_LIMITED_CLIENTS):
+        """Token bucket rate limits per client id.
+
+        Args:
+            rate: Requests per second admitted from every client
+            burst: Requests a client may send at once after being idle. Defaults to ``rate``, and at least 1.
+            max_clients: Number of clients remembered. A forgotten client starts again with a full bucket.
+
+        """
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else math.ceil(rate))
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def take(self, client_id: Hashable, now: float = None) -> float:
+        """Admit a request of ``client_id``. Returns 0 if it is admitted, otherwise the seconds until it would be."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        return bucket.take(now)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RequestQueue:
+
+    def __init__(self, max_size: int = None):
+        """A bounded queue of requests served by priority class, and in arrival order within a class.
+
+        Requests queued with the same ``key``, e.g. the requests of one client connection, are served in
+        arrival order: a request never overtakes an earlier request of its key, and is queued in the class
+        of that request if it is lower. Every :data: `OLDEST_FIRST_INTERVAL` requests the oldest request
+        queued is served whatever its class, so that a steady stream of higher classes can't starve the
+        lower ones.
+
+        When the queue is full, a request of a higher class takes the place of the latest request
+        of the lowest class queued, which is shed instead.
+
+        Args:
+            max_size: Maximum number of queued requests. None leaves the queue unbounded.
+
+        """
+        self.max_size = max_size
+        self._queues = [collections.deque() for _ in PRIORITIES]
+        self._size = 0
+        self._sequence = 0
+        self._served = 0
+        # Queued requests of every key, per class
+        self._keys = {}
+
+    def put(self, item: Any, priority: int, key: Hashable = None) -> Optional[Any]:
+        """Queue ``item``.
+
+        Returns:
+            The item shed to stay within ``max_size``: None, ``item`` itself or an item of a lower class
+
+        """
+        counts = self._keys.get(key) if key is not None else None
+        if counts is not None:
+            priority = max(priority, max(index for index, count in enumerate(counts) if count))
+        shed = None
+        if self.max_size is not None and self._size >= self.max_size:
+            lowest = max((index for index, queue in enumerate(self._queues) if queue), default=None)
+            if lowest is None or lowest <= priority:
+                return item
+            _, shed_key, shed = self._queues[lowest].pop()
+            self._forget(shed_key, lowest)
+            self._size -= 1
+        self._sequence += 1
+        self._queues[priority].append((self._sequence, key, item))
+        self._size += 1
+        if key is not None:
+            self._keys.setdefault(key, [0] * len(PRIORITIES))[priority] += 1
+        return shed
+
+    def get(self) -> Any:
+        """The next item by priority
+
+        Raises:
+            IndexError: If the queue is empty
+
+        """
+        heads = [(queue[0][0], index) for index, queue in enumerate(self._queues) if queue]
+        if not heads:
+            raise IndexError("get from an empty RequestQueue")
+        self._served += 1
+        index = min(heads)[1] if self._served % OLDEST_FIRST_INTERVAL == 0 else heads[0][1]
+        _, key, item = self._queues[index].popleft()
+        self._forget(key, index)
+        self._size -= 1
+        return item
+
+    def _forget(self, key: Hashable, priority: int):
+        if key is None:
+            return
+        counts = self._keys[key]
+        counts[priority] -= 1
+        if not any(counts):
+            del self._keys[key]
+
+    def sizes(self) -> dict:
+        """Queued items per priority class"""
+        return {name: len(queue) for name, queue in zip(PRIORITIES, self._queues)}
+
+    def __len__(self):
+        return self._size
@@ -2,7 +2,7 @@ import logging
 import os
 import sqlite3
 import sys
-from typing import Dict, Set
+from typing import Dict, Set, Tuple, Union
 
 import zmq
 import zmq.auth
@@ -55,25 +55,42 @@ DEFAULT_AUTH_CONFIG = {
 }
 
 
+# Largest action code passed to authorizers, i.e. SQLITE_RECURSIVE
+MAX_ACTION = 33
+
+
 class Authorizer:
 
-    def __init__(self, config: Dict[int, Set[int]] = None):
+    def __init__(self, config: Dict[int, Set[Union[int, Tuple]]] = None):
         """Represents the authorization config which can be passed to the :class: ``sqlite_rx.server.SQLiteServer``
         class during server startup. This class represents a callable passed to the sqlite3's
         ``set_authorizer()`` method.
 
+        Besides plain actions, the sets of actions may hold ``(action, table)`` and ``(action, table, column)``
+        tuples which only apply to the given table, or column. ``table`` is matched against the first
+        argument sqlite passes for the action, which is the table name for e.g. ``SQLITE_READ``,
+        ``SQLITE_INSERT``, ``SQLITE_UPDATE``, ``SQLITE_DELETE`` and ``SQLITE_DROP_TABLE``, and ``column``
+        against the second one, the column name for ``SQLITE_READ`` and ``SQLITE_UPDATE``. Names are
+        case-insensitive. A column rule takes precedence over a table rule, which takes precedence
+        over an action rule. Among rules of the same kind the first permission listed wins.
+
+        The config is compiled into lookup tables once, so deciding on an action is a list lookup
+        and, for actions with table or column rules, a few dictionary lookups.
+
         Args:
             config: A dictionary which maps ``permissions`` to sqlite3 ``actions``. Valid
             permissions are ``sqlite3.SQLITE_OK``, ``sqlite3.SQLITE_DENY`` and ``sqlite3.SQLITE_IGNORE``
 
         Raises:
             sqlite_rx.exception.SQLiteRxAuthConfigError: if ``config`` contains invalid permissions other than
-            ``sqlite3.SQLITE_OK``, ``sqlite3.SQLITE_DENY`` and ``sqlite3.SQLITE_IGNORE``
+            ``sqlite3.SQLITE_OK``, ``sqlite3.SQLITE_DENY`` and ``sqlite3.SQLITE_IGNORE`` or invalid rules
 
         Example:
             >>> from sqlite_rx.auth import Authorizer
             >>> auth_config = {
-            >>>                  sqlite3.SQLITE_DENY: {sqlite3.SQLITE_CREATE_INDEX, sqlite3.SQLITE_CREATE_TABLE}
+            >>>                  sqlite3.SQLITE_DENY: {sqlite3.SQLITE_CREATE_INDEX,
+            >>>                                        sqlite3.SQLITE_CREATE_TABLE,
+            >>>                                        (sqlite3.SQLITE_READ, 'secrets', 'ssn')}
             >>>               }
             >>> authorizer = Authorizer(config=auth_config)
 
@@ -87,12 +104,42 @@ class Authorizer:
             raise SQLiteRxAuthConfigError(
                 "Allowed return values are: "
                 "sqlite3.SQLITE_OK(0), sqlite3.SQLITE_DENY(1), sqlite3.SQLITE_IGNORE(2)")
-
-    def __call__(self, action: int, *args, **kwargs) -> int:
+        self._compile()
+
+    def _compile(self):
+        # Permission of every action, and the table and column rules of every action as
+        # {table: (permission of the table, {column: permission})}
+        self._actions = [sqlite3.SQLITE_OK] * (MAX_ACTION + 1)
+        # Actions of later sqlite versions, which are looked up like any other
+        self._other_actions = {}
+        self._rules = {}
+        # Rules are applied in reverse order so that the first permission listed wins, like before
+        for permission, rules in reversed(list(self.config.items())):
+            for rule in rules:
+                if isinstance(rule, int) and 0 <= rule <= MAX_ACTION:
+                    self._actions[rule] = permission
+                elif isinstance(rule, int):
+                    self._other_actions[rule] = permission
+                elif isinstance(rule, tuple) and len(rule) in (2, 3) and isinstance(rule[0], int) \
+                        and all(isinstance(name, str) for name in rule[1:]):
+                    tables = self._rules.setdefault(rule[0], {})
+                    table_permission, columns = tables.get(rule[1].lower(), (None, {}))
+                    if len(rule) == 2:
+                        table_permission = permission
+                    else:
+                        columns[rule[2].lower()] = permission
+                    tables[rule[1].lower()] = (table_permission, columns)
+                else:
+                    raise SQLiteRxAuthConfigError("Invalid authorization rule {!r}. Expected an action, "
+                                                  "(action, table) or (action, table, column)".format(rule))
+
+    def __call__(self, action: int, arg1=None, arg2=None, *args, **kwargs) -> int:
         """Returns the permission for the passed ``action``
 
         Args:
             action: The integer representing the action for which permission is to be fetched.
+            arg1: The first argument passed by sqlite, e.g. the table name
+            arg2: The second argument passed by sqlite, e.g. the column name
 
         Returns:
             The permission ``sqlite3.SQLITE_OK``, ``sqlite3.SQLITE_IGNORE`` or ``sqlite3.SQLITE_DENY``
@@ -100,10 +147,19 @@ class Authorizer:
             Default is ``sqlite3.SQLITE_OK``
 
         """
-        for return_val, actions in self.config.items():
-            if action in actions:
-                return return_val
-        return sqlite3.SQLITE_OK
+        tables = self._rules.get(action)
+        if tables is not None and arg1 is not None:
+            rules = tables.get(arg1.lower())
+            if rules is not None:
+                if arg2 and rules[1]:
+                    permission = rules[1].get(arg2.lower())
+                    if permission is not None:
+                        return permission
+                if rules[0] is not None:
+                    return rules[0]
+        if 0 <= action <= MAX_ACTION:
+            return self._actions[action]
+        return self._other_actions.get(action, sqlite3.SQLITE_OK)
 
 
 class KeyGenerator:
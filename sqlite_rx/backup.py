@@ -1,13 +1,44 @@
+import gzip
+import hashlib
+import json
 import logging.config
+import os
+import re
 import threading
 import platform
 import sqlite3
 import sys
+import time
 
-from typing import Any
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+from sqlite_rx.exception import SQLiteRxBackUpError
 
 LOG = logging.getLogger(__name__)
 
+# Pages copied per step of a backup. Between steps the source is not locked.
+BACKUP_PAGES = 1024
+
+# Seconds slept between two steps of a backup
+BACKUP_SLEEP = 0.01
+
+# Restarts of a backup, caused by writes to the source, before the rest is copied in a single step
+BACKUP_RESTARTS = 3
+
+# Status of a backup step which could not lock the source. The sqlite3 module names them from Python 3.11.
+SQLITE_BUSY, SQLITE_LOCKED = 5, 6
+
+# Reports of the last runs kept in memory
+RECENT_BACKUPS = 20
+
+# Name of the file listing the snapshots of a snapshot directory
+MANIFEST = 'manifest.json'
+
+# Size of the chunks read while compressing and hashing a snapshot
+CHUNK_SIZE = 1024 * 1024
+
 
 def is_backup_supported():
 
@@ -20,26 +51,298 @@ def is_backup_supported():
     return True
 
 
+class _Restarted(Exception):
+    pass
+
+
 class SQLiteBackUp:
 
-    def __init__(self, src, target, pages=-1) -> None:
+    def __init__(self, src, target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, restarts=BACKUP_RESTARTS) -> None:
+        """Copies the ``src`` database to ``target`` with the sqlite online backup API.
+
+        The database is copied ``pages`` pages at a time, sleeping ``sleep`` seconds between two
+        steps, so that the source is only locked for short periods and writers can make progress
+        while a large database is copied. A run is skipped when nothing was committed to the source
+        since the last backup, as told by ``pragma data_version`` on a connection kept open
+        between runs.
+
+        sqlite restarts a backup from the first page when another connection writes to the source
+        between two steps, so under a steady write load a backup in steps may never finish. After
+        ``restarts`` restarts the run copies the whole database in a single step instead, which
+        holds the read lock on the source, and so blocks the writers, until the copy is done.
+
+        Every run is reported with its duration, the number of pages copied, the bytes written and
+        the number of restarts.
+
+        Args:
+            src: The database to back up
+            target: The backup database
+            pages: Pages copied per step. -1 copies the whole database in a single step.
+            sleep: Seconds slept between two steps
+            restarts: Restarts allowed before copying the database in a single step
+
+        """
         self.src = src
         self.target = target
         self.pages = pages
+        self.sleep = sleep
+        self.restarts = restarts
+        self.runs = 0
+        self.skipped = 0
+        self.reports = deque(maxlen=RECENT_BACKUPS)
+        self._source = None
+        self._data_version = None
+
+    @property
+    def last_report(self) -> Optional[dict]:
+        return self.reports[-1] if self.reports else None
+
+    def _changed(self) -> bool:
+        if self._source is None:
+            self._source = sqlite3.connect(self.src)
+        data_version = self._source.execute('pragma data_version').fetchone()[0]
+        changed = data_version != self._data_version or not os.path.exists(self.target)
+        self._data_version = data_version
+        return changed
 
     def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        if not self._changed():
+            self.skipped += 1
+            LOG.debug("Skipped Backup: no changes to %s since the last backup", self.src)
+            return None
+
+        copied = {"pages": 0, "steps": 0, "restarts": 0}
 
         def progress(status, remaining, total):
-            copied = total - remaining
-            LOG.info('Copied %s of %s pages', copied, total)
+            if status not in (SQLITE_BUSY, SQLITE_LOCKED) and total - remaining <= copied["pages"]:
+                # Another connection wrote to the source and sqlite started over from the first page
+                copied["restarts"] += 1
+                if copied["restarts"] > self.restarts:
+                    raise _Restarted()
+            copied["pages"] = total - remaining
+            copied["steps"] += 1
+            LOG.debug('Copied %s of %s pages', copied["pages"], total)
+            # The sleep argument of backup() only applies when the source is busy, the pause
+            # between two steps is made here.
+            if remaining and self.sleep:
+                time.sleep(self.sleep)
 
-        source = sqlite3.connect(self.src)
+        started = time.perf_counter()
+        page_size = self._source.execute('pragma page_size').fetchone()[0]
         backup = sqlite3.connect(self.target)
+        try:
+            try:
+                with backup:
+                    self._source.backup(backup, pages=self.pages, progress=progress)
+            except _Restarted:
+                LOG.warning("Backup of %s restarted %d times, copying it in a single step",
+                            self.src, self.restarts)
+                copied["pages"] = 0
+                with backup:
+                    self._source.backup(backup, pages=-1, progress=progress)
+        except Exception:
+            # Retry at the next run whether or not the database changes in the meantime
+            self._data_version = None
+            LOG.exception("Backup of %s to %s failed", self.src, self.target)
+            return None
+        finally:
+            backup.close()
+        # data_version was read before the copy, so commits made during the copy trigger one more run.
+        self.runs += 1
+        report = {
+            "time": time.time(),
+            "duration": time.perf_counter() - started,
+            "pages": copied["pages"],
+            "steps": copied["steps"],
+            "bytes": copied["pages"] * page_size,
+            "restarts": copied["restarts"]
+        }
+        self.reports.append(report)
+        LOG.info("Finished Backup: Source %s , Target %s , %d pages (%d bytes) in %.3f seconds",
+                 self.src, self.target, report["pages"], report["bytes"], report["duration"])
+        return report
+
+
+def parse_retention(retention: Optional[str]) -> Tuple[Optional[int], Optional[float]]:
+    """Parse a snapshot retention such as ``10`` (snapshots), ``24h`` (hours) or ``10,24h`` (both)
+
+    Returns:
+        The number of snapshots and the hours to keep. None means no limit.
+
+    Raises:
+        ValueError: If ``retention`` can't be parsed
+
+    """
+    count, hours = None, None
+    for part in (retention or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d+)|(\d+(?:\.\d+)?)h", part, re.IGNORECASE)
+        if match is None:
+            raise ValueError("Invalid snapshot retention {!r}. Expected e.g. 10, 24h or 10,24h".format(retention))
+        if match.group(1):
+            count = int(match.group(1))
+        else:
+            hours = float(match.group(2))
+    return count, hours
+
+
+class SQLiteSnapshot:
+
+    def __init__(self,
+                 src,
+                 directory: str,
+                 retention_count: int = None,
+                 retention_hours: float = None,
+                 compress: bool = False) -> None:
+        """Writes timestamped, compacted snapshots of ``src`` to ``directory``.
+
+        Every snapshot is made with ``VACUUM INTO`` on a connection dedicated to snapshots, so it
+        holds none of the free pages of the source and is as small as the data allows. It is
+        optionally gzip compressed, a chunk at a time. Snapshots are listed in ``manifest.json``
+        along with their size and SHA-256 checksum, and the ones beyond the retention are deleted.
+        A run is skipped when nothing was committed to the source since the last snapshot.
+
+        Args:
+            src: The database to snapshot
+            directory: The directory holding the snapshots and the manifest. It is created if needed.
+            retention_count: Number of snapshots to keep. None keeps them all.
+            retention_hours: Age in hours after which a snapshot is deleted. None keeps them all.
+                The newest snapshot is always kept.
+            compress: True to gzip the snapshots
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxBackUpError: If the sqlite library does not support ``VACUUM INTO``
+
+        """
+        if sqlite3.sqlite_version_info < (3, 27, 0):
+            raise SQLiteRxBackUpError("Snapshots need VACUUM INTO, available since sqlite 3.27.0. "
+                                      "This is sqlite {}".format(sqlite3.sqlite_version))
+        self.src = src
+        self.directory = directory
+        self.retention_count = retention_count
+        self.retention_hours = retention_hours
+        self.compress = compress
+        self.runs = 0
+        self.skipped = 0
+        self._source = None
+        self._data_version = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST)
+
+    def manifest(self) -> List[dict]:
+        """The snapshots in the directory, oldest first"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)['snapshots']
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, snapshots: List[dict]):
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({"database": str(self.src), "snapshots": snapshots}, f, indent=2)
+        os.replace(temporary, self.manifest_path)
+
+    def _changed(self) -> bool:
+        if self._source is None:
+            self._source = sqlite3.connect(self.src)
+        data_version = self._source.execute('pragma data_version').fetchone()[0]
+        changed = data_version != self._data_version
+        self._data_version = data_version
+        return changed
+
+    def _finish(self, vacuumed: str, path: str) -> Tuple[int, str]:
+        """Move or compress ``vacuumed`` to ``path``. Returns the size and checksum of ``path``."""
+        checksum = hashlib.sha256()
+        if self.compress:
+            with open(vacuumed, 'rb') as source, open(path + '.tmp', 'wb') as target:
+                # The checksum covers the compressed bytes, i.e. the file as stored
+                with gzip.GzipFile(filename=os.path.basename(path)[:-len('.gz')], mode='wb',
+                                   fileobj=_Hashing(target, checksum)) as compressed:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        compressed.write(chunk)
+            os.remove(vacuumed)
+        else:
+            with open(vacuumed, 'rb') as source:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    checksum.update(chunk)
+            os.replace(vacuumed, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return os.path.getsize(path), checksum.hexdigest()
+
+    def expire(self, snapshots: List[dict], now: float = None) -> List[dict]:
+        """Delete the snapshots beyond the retention. Returns the snapshots kept."""
+        now = time.time() if now is None else now
+        kept, expired = [], []
+        for index, snapshot in enumerate(reversed(snapshots)):
+            if index and ((self.retention_count is not None and index >= self.retention_count) or
+                          (self.retention_hours is not None and now - snapshot['time'] > self.retention_hours * 3600)):
+                expired.append(snapshot)
+            else:
+                kept.append(snapshot)
+        for snapshot in expired:
+            try:
+                os.remove(os.path.join(self.directory, snapshot['file']))
+            except FileNotFoundError:
+                pass
+            LOG.info("Deleted snapshot %s", snapshot['file'])
+        return kept[::-1]
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Optional[dict]:
+        if not self._changed():
+            self.skipped += 1
+            LOG.debug("Skipped Snapshot: no changes to %s since the last snapshot", self.src)
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        name = "snapshot-{}.db".format(now.strftime('%Y%m%dT%H%M%S%fZ'))
+        vacuumed = os.path.join(self.directory, name + '.vacuum')
+        path = os.path.join(self.directory, name + ('.gz' if self.compress else ''))
+        try:
+            self._source.execute('VACUUM INTO ?', (vacuumed,))
+            database_size = os.path.getsize(vacuumed)
+            size, checksum = self._finish(vacuumed, path)
+        except Exception:
+            self._data_version = None
+            LOG.exception("Snapshot of %s to %s failed", self.src, self.directory)
+            for leftover in (vacuumed, path + '.tmp'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            return None
+        self.runs += 1
+        snapshot = {
+            "file": os.path.basename(path),
+            "time": now.timestamp(),
+            "created": now.isoformat(),
+            "duration": time.perf_counter() - started,
+            "database_size": database_size,
+            "size": size,
+            "compressed": self.compress,
+            "sha256": checksum
+        }
+        self._write_manifest(self.expire(self.manifest() + [snapshot], now.timestamp()))
+        LOG.info("Finished Snapshot: Source %s , Snapshot %s , %d bytes in %.3f seconds",
+                 self.src, path, size, snapshot["duration"])
+        return snapshot
+
+
+class _Hashing:
+
+    def __init__(self, f, checksum):
+        """A write-only file object updating ``checksum`` with the bytes written to ``f``"""
+        self._f = f
+        self._checksum = checksum
 
-        with backup:
-            source.backup(backup, pages=self.pages, progress=progress)
+    def write(self, data) -> int:
+        self._checksum.update(data)
+        return self._f.write(data)
 
-        LOG.info("Finished Backup: Source %s , Target %s ", self.src, self.target)
+    def flush(self):
+        self._f.flush()
 
 
 class RecurringTimer(threading.Timer):
@@ -0,0 +1,17 @@
+"""End-to-end benchmarks of :class: `sqlite_rx.server.SQLiteServer` and :class: `sqlite_rx.client.SQLiteClient`
+
+Run ``python -m sqlite_rx.benchmarks --help`` for the options.
+
+"""
+from sqlite_rx.benchmarks.compare import compare, load_results, save_results
+from sqlite_rx.benchmarks.runner import Scenario, percentile, run_scenario, run_scenarios, running_server, scenarios
+
+__all__ = ['Scenario',
+           'compare',
+           'load_results',
+           'percentile',
+           'run_scenario',
+           'run_scenarios',
+           'running_server',
+           'save_results',
+           'scenarios']
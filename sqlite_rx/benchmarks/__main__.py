@@ -0,0 +1,112 @@
+"""Benchmark a local SQLiteServer
+
+Examples:
+
+    python -m sqlite_rx.benchmarks --clients 1 8 --batch-size 1 100 --output baseline.json
+    python -m sqlite_rx.benchmarks --clients 1 8 --batch-size 1 100 --compare baseline.json
+    python -m sqlite_rx.benchmarks --clients 1 8 --engine tornado asyncio
+
+"""
+import argparse
+import logging.config
+import sys
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.benchmarks.compare import compare, load_results, save_results
+from sqlite_rx.benchmarks.runner import ENGINES, MODES, environment, run_scenarios, scenarios
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sqlite_rx.benchmarks",
+                                     description="Measure the throughput and latency of a local SQLiteServer")
+    parser.add_argument('--mode', nargs='+', choices=MODES, default=['plain'],
+                        help="Transport security of the server")
+    parser.add_argument('--engine', nargs='+', choices=ENGINES, default=['tornado'],
+                        help="Event loop of the server. With several engines, the per-request overhead of "
+                             "each engine against the first one is reported")
+    parser.add_argument('--clients', nargs='+', type=int, default=[1],
+                        help="Number of concurrent clients, each in a thread of its own")
+    parser.add_argument('--payload-size', nargs='+', type=int, default=[64],
+                        help="Size in bytes of the BLOB written by each inserted row")
+    parser.add_argument('--read-ratio', nargs='+', type=float, default=[0.8],
+                        help="Fraction of the requests which are point reads. The others are inserts")
+    parser.add_argument('--batch-size', nargs='+', type=int, default=[1],
+                        help="Rows per insert request. Above 1 the rows are sent with execute_many")
+    parser.add_argument('--operations', type=int, default=2000,
+                        help="Requests per scenario, shared by the clients")
+    parser.add_argument('--database', default=':memory:',
+                        help="Database of the server")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the read/write mix")
+    parser.add_argument('--output', help="Save the results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="Compare the results with a JSON file saved by --output and exit with status 1 "
+                             "on regressions")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change of a metric considered a regression")
+    parser.add_argument('--log-level', default='CRITICAL',
+                        choices="CRITICAL FATAL ERROR WARN WARNING INFO DEBUG NOTSET".split())
+    return parser.parse_args(argv)
+
+
+def print_results(results):
+    header = "{:<32} {:>10} {:>12} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+        "scenario", "ops/sec", "rows/sec", "p50 ms", "p95 ms", "p99 ms", "p999 ms", "errors")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        latency = result['latency_ms']
+        print("{:<32} {:>10.1f} {:>12.1f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>7}".format(
+            result['name'], result['ops_per_sec'], result['rows_per_sec'], latency['p50'],
+            latency['p95'], latency['p99'], latency['p999'], result['errors']))
+
+
+def print_engine_overhead(results, reference: str):
+    """Compare the mean latency of every scenario with the same scenario on the ``reference`` engine"""
+    fields = ('mode', 'clients', 'operations', 'payload_size', 'read_ratio', 'batch_size')
+    means = {tuple(result[field] for field in fields): result['latency_ms']['mean']
+             for result in results if result['engine'] == reference}
+    print("\nMean latency per request against the {} engine:".format(reference))
+    for result in results:
+        if result['engine'] == reference:
+            continue
+        baseline = means.get(tuple(result[field] for field in fields))
+        if baseline:
+            difference = result['latency_ms']['mean'] - baseline
+            print("  {:<40} {:+9.1f} us ({:+.1%})".format(result['name'], 1000 * difference, difference / baseline))
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.config.dictConfig(get_default_logger_settings(level=args.log_level))
+    runs = scenarios(modes=args.mode,
+                     clients=args.clients,
+                     payload_sizes=args.payload_size,
+                     read_ratios=args.read_ratio,
+                     batch_sizes=args.batch_size,
+                     operations=args.operations,
+                     engines=args.engine)
+    document = {
+        "environment": environment(),
+        "results": run_scenarios(runs, database=args.database, seed=args.seed)
+    }
+    print_results(document['results'])
+    if len(args.engine) > 1:
+        print_engine_overhead(document['results'], args.engine[0])
+    if args.output:
+        save_results(args.output, document)
+
+    if args.compare:
+        regressions = compare(load_results(args.compare), document, threshold=args.threshold)
+        if not regressions:
+            print("\nNo regression against {}".format(args.compare))
+            return 0
+        print("\nRegressions against {}:".format(args.compare))
+        for regression in regressions:
+            print("  {name} {metric}: {baseline:.3f} -> {current:.3f} ({change:+.1%})".format(**regression))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
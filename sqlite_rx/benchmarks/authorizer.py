@@ -0,0 +1,124 @@
+"""Microbenchmark of the authorizer callback
+
+sqlite calls the authorizer once per table, column and function referenced by a statement when it
+compiles the statement, so wide statements make hundreds of calls. This measures the cost of these
+calls per statement for the compiled :class: `sqlite_rx.auth.Authorizer` and for the previous
+implementation, which walked the whole configuration on every call.
+
+Example:
+
+    python -m sqlite_rx.benchmarks.authorizer --columns 100 --statements 2000
+
+"""
+import argparse
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from sqlite_rx.auth import DEFAULT_AUTH_CONFIG, Authorizer
+
+__all__ = ['LoopAuthorizer', 'benchmark_authorizer', 'run']
+
+
+class LoopAuthorizer:
+
+    def __init__(self, config: dict = None):
+        """The authorizer as it was before it was compiled, kept as the baseline of the benchmark"""
+        self.config = config if config else DEFAULT_AUTH_CONFIG
+
+    def __call__(self, action: int, *args, **kwargs) -> int:
+        for permission, actions in self.config.items():
+            if action in actions:
+                return permission
+        return sqlite3.SQLITE_OK
+
+
+class _Counter:
+
+    def __init__(self, authorizer: Callable):
+        self.authorizer = authorizer
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.authorizer(*args)
+
+
+def _prepare(connection: sqlite3.Connection, query: str, statements: int) -> float:
+    started = time.perf_counter()
+    for _ in range(statements):
+        # Statements are not cached by the connection, so each execution compiles the statement
+        connection.execute(query)
+    return time.perf_counter() - started
+
+
+def benchmark_authorizer(authorizer: Optional[Callable],
+                         columns: int = 50,
+                         statements: int = 1000) -> dict:
+    """Time the compilation of ``statements`` SELECTs of ``columns`` columns with ``authorizer``.
+
+    Returns:
+        The time per statement, the authorizer calls per statement and the time per call in
+        microseconds, measured against the same statements compiled without authorizer
+
+    """
+    connection = sqlite3.connect(':memory:', cached_statements=0)
+    names = ["c{}".format(index) for index in range(columns)]
+    connection.execute("CREATE TABLE wide ({})".format(", ".join(names)))
+    query = "SELECT {} FROM wide WHERE c0 = 1".format(", ".join(names))
+
+    baseline = _prepare(connection, query, statements)
+    calls = 0
+    if authorizer is not None:
+        counter = _Counter(authorizer)
+        connection.set_authorizer(counter)
+        connection.execute(query)
+        calls = counter.calls
+    connection.set_authorizer(authorizer)
+    elapsed = _prepare(connection, query, statements)
+    connection.close()
+
+    overhead = max(elapsed - baseline, 0.0) / statements * 1e6
+    return {
+        "statement_us": elapsed / statements * 1e6,
+        "overhead_us": overhead,
+        "calls_per_statement": calls,
+        "call_us": overhead / calls if calls else 0.0
+    }
+
+
+def run(columns: int = 50, statements: int = 1000, config: dict = None) -> dict:
+    """Benchmark no authorizer, :class: `LoopAuthorizer` and :class: `sqlite_rx.auth.Authorizer`, with
+    and without a column rule on the benchmarked statements' action.
+
+    """
+    config = config if config else DEFAULT_AUTH_CONFIG
+    with_rules = {permission: set(actions) for permission, actions in config.items()}
+    with_rules.setdefault(sqlite3.SQLITE_DENY, set()).add((sqlite3.SQLITE_READ, 'secrets', 'ssn'))
+    return {
+        "none": benchmark_authorizer(None, columns, statements),
+        "loop": benchmark_authorizer(LoopAuthorizer(config), columns, statements),
+        "compiled": benchmark_authorizer(Authorizer(config), columns, statements),
+        "rules": benchmark_authorizer(Authorizer(with_rules), columns, statements),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m sqlite_rx.benchmarks.authorizer",
+                                     description="Measure the cost of the authorizer callback per statement")
+    parser.add_argument('--columns', type=int, default=50, help="Columns read by the statement")
+    parser.add_argument('--statements', type=int, default=1000, help="Statements compiled per authorizer")
+    args = parser.parse_args(argv)
+
+    header = "{:<10} {:>14} {:>14} {:>16} {:>10}".format(
+        "authorizer", "statement us", "overhead us", "calls/statement", "call us")
+    print(header)
+    print("-" * len(header))
+    for name, result in run(args.columns, args.statements).items():
+        print("{:<10} {:>14.2f} {:>14.2f} {:>16.1f} {:>10.3f}".format(
+            name, result['statement_us'], result['overhead_us'], result['calls_per_statement'], result['call_us']))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
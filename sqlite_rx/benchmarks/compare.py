@@ -0,0 +1,60 @@
+import json
+from typing import List
+
+__all__ = ['compare', 'load_results', 'save_results']
+
+# Metrics checked for regressions and whether higher values are better
+METRICS = (
+    ('ops_per_sec', True),
+    ('latency_ms.p50', False),
+    ('latency_ms.p99', False),
+)
+
+
+def save_results(path: str, document: dict):
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _metric(result: dict, metric: str) -> float:
+    value = result
+    for key in metric.split('.'):
+        value = value[key]
+    return value
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[dict]:
+    """Compare two documents written by ``python -m sqlite_rx.benchmarks --output``.
+
+    Scenarios are matched by name. A metric regresses when it is worse than the baseline by more
+    than ``threshold``, e.g. 0.1 flags a throughput drop or a latency increase of more than 10%.
+
+    Returns:
+        One ``{"name", "metric", "baseline", "current", "change"}`` entry per regression. ``change``
+        is the relative change of the metric.
+
+    """
+    baseline_results = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        reference = baseline_results.get(result['name'])
+        if reference is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            before = _metric(reference, metric)
+            after = _metric(result, metric)
+            if not before:
+                continue
+            change = (after - before) / before
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append({"name": result['name'],
+                                    "metric": metric,
+                                    "baseline": before,
+                                    "current": after,
+                                    "change": change})
+    return regressions
@@ -0,0 +1,250 @@
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import product
+from typing import Iterable, List, Sequence
+
+import zmq
+from sqlite_rx import get_version
+from sqlite_rx.auth import KeyGenerator
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.engine import ENGINES
+from sqlite_rx.exception import SQLiteRxError
+from sqlite_rx.server import SQLiteServer
+
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['ENGINES', 'MODES', 'Scenario', 'environment', 'percentile', 'run_scenario', 'running_server', 'scenarios']
+
+MODES = ('plain', 'curvezmq', 'zap')
+
+# Rows inserted before a scenario starts, so that reads find something
+PRELOADED_ROWS = 1000
+
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('p999', 0.999))
+
+
+class Scenario(namedtuple('Scenario', ('mode', 'clients', 'operations', 'payload_size', 'read_ratio', 'batch_size',
+                                       'engine'),
+                          defaults=('tornado',))):
+    """One benchmark run.
+
+    ``clients`` threads, each with its own :class: `sqlite_rx.client.SQLiteClient`, share ``operations``
+    requests. A request is a point read with probability ``read_ratio`` and otherwise an insert of
+    ``batch_size`` rows of ``payload_size`` random bytes, sent with ``execute_many`` when ``batch_size > 1``.
+    The server runs on the event loop of ``engine``.
+
+    """
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        """Identifies the scenario across runs, e.g. in :func: `sqlite_rx.benchmarks.compare`"""
+        name = "{}-c{}-p{}-r{}-b{}".format(self.mode, self.clients, self.payload_size, self.read_ratio, self.batch_size)
+        # Scenarios on the default engine keep the names of the results saved before engines existed
+        return name if self.engine == 'tornado' else "{}-{}".format(name, self.engine)
+
+
+def scenarios(modes: Sequence[str] = ('plain',),
+              clients: Sequence[int] = (1,),
+              payload_sizes: Sequence[int] = (64,),
+              read_ratios: Sequence[float] = (0.8,),
+              batch_sizes: Sequence[int] = (1,),
+              operations: int = 2000,
+              engines: Sequence[str] = ('tornado',)) -> List[Scenario]:
+    """Every combination of the given parameters"""
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError("Unknown mode {}. Choose from {}".format(mode, MODES))
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine {}. Choose from {}".format(engine, ENGINES))
+    return [Scenario(mode, count, operations, size, ratio, batch, engine)
+            for engine, mode, count, size, ratio, batch in product(engines, modes, clients, payload_sizes,
+                                                                   read_ratios, batch_sizes)]
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def environment() -> dict:
+    """Describes where the benchmarks ran. Results of different machines should not be compared."""
+    return {
+        "sqlite_rx": get_version(),
+        "python": "{} {}".format(platform.python_implementation(), platform.python_version()),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "libzmq": zmq.zmq_version(),
+        "pyzmq": zmq.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(mode: str = 'plain', database: str = ':memory:', **server_kwargs):
+    """Start a :class: `sqlite_rx.server.SQLiteServer` on a free local port and stop it on exit.
+
+    For the ``curvezmq`` and ``zap`` modes, server and client keys are generated in a temporary directory.
+
+    Yields:
+        The keyword arguments of a :class: `sqlite_rx.client.SQLiteClient` connecting to the server
+
+    """
+    with tempfile.TemporaryDirectory() as curve_dir:
+        address = "tcp://127.0.0.1:{}".format(free_port())
+        client_kwargs = {"connect_address": address}
+        if mode != 'plain':
+            server_key_id = "id_server_bench_curve"
+            client_key_id = "id_client_bench_curve"
+            KeyGenerator(destination_dir=curve_dir, key_id=server_key_id).generate()
+            KeyGenerator(destination_dir=curve_dir, key_id=client_key_id).generate()
+            shutil.copyfile(os.path.join(curve_dir, "{}.key".format(client_key_id)),
+                            os.path.join(curve_dir, 'authorized_clients', "{}.key".format(client_key_id)))
+            server_kwargs.update(use_encryption=True,
+                                 use_zap_auth=mode == 'zap',
+                                 curve_dir=curve_dir,
+                                 server_curve_id=server_key_id)
+            client_kwargs.update(use_encryption=True,
+                                 curve_dir=curve_dir,
+                                 server_curve_id=server_key_id,
+                                 client_curve_id=client_key_id)
+
+        server = SQLiteServer(bind_address=address, database=database, **server_kwargs)
+        server.start()
+        LOG.info("Started benchmark SQLiteServer (%s) on %s", mode, address)
+        try:
+            yield client_kwargs
+        finally:
+            server.terminate()
+            server.join()
+
+
+def _check(result: dict):
+    if result['error']:
+        raise SQLiteRxError("Benchmark setup failed: {}".format(result['error']))
+
+
+def _drive(client_kwargs: dict, table: str, scenario: Scenario, operations: int, seed: int,
+           barrier: threading.Barrier, samples: list, index: int):
+    rng = random.Random(seed)
+    select = "SELECT id, payload FROM {} WHERE id = ?".format(table)
+    insert = "INSERT INTO {} (payload) VALUES (?)".format(table)
+    rows = [(os.urandom(scenario.payload_size),) for _ in range(scenario.batch_size)]
+    latencies = []
+    errors = 0
+    rows_done = 0
+    client = SQLiteClient(**client_kwargs)
+    try:
+        barrier.wait()
+        for _ in range(operations):
+            read = rng.random() < scenario.read_ratio
+            start = time.perf_counter()
+            try:
+                if read:
+                    result = client.execute(select, rng.randint(1, PRELOADED_ROWS))
+                elif scenario.batch_size > 1:
+                    result = client.execute(insert, *rows, execute_many=True)
+                else:
+                    result = client.execute(insert, *rows[0])
+            except SQLiteRxError:
+                LOG.exception("Benchmark request failed")
+                result = None
+            latencies.append(time.perf_counter() - start)
+            if result is None or result['error']:
+                errors += 1
+            else:
+                rows_done += 1 if read else scenario.batch_size
+    finally:
+        client.cleanup()
+        samples[index] = (latencies, errors, rows_done)
+
+
+def run_scenario(scenario: Scenario, client_kwargs: dict, seed: int = 0) -> dict:
+    """Run ``scenario`` against the server reached with ``client_kwargs``.
+
+    Every scenario writes into a table of its own, preloaded with :data: `PRELOADED_ROWS` rows.
+
+    Returns:
+        The scenario parameters along with ``ops_per_sec``, ``rows_per_sec``, ``errors`` and
+        the ``latency_ms`` mean, percentiles and maximum.
+
+    """
+    table = "bench_{}".format(uuid.uuid4().hex[:12])
+    client = SQLiteClient(**client_kwargs)
+    try:
+        _check(client.execute("CREATE TABLE {} (id INTEGER PRIMARY KEY, payload BLOB)".format(table)))
+        preload = [(os.urandom(scenario.payload_size),) for _ in range(PRELOADED_ROWS)]
+        _check(client.execute("INSERT INTO {} (payload) VALUES (?)".format(table), *preload, execute_many=True))
+    finally:
+        client.cleanup()
+
+    barrier = threading.Barrier(scenario.clients + 1)
+    samples = [None] * scenario.clients
+    share, remainder = divmod(scenario.operations, scenario.clients)
+    threads = [threading.Thread(target=_drive,
+                                args=(client_kwargs, table, scenario, share + (index < remainder),
+                                      seed + index, barrier, samples, index),
+                                daemon=True)
+               for index in range(scenario.clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies = sorted(latency for sample in samples if sample for latency in sample[0])
+    errors = sum(sample[1] for sample in samples if sample)
+    rows_done = sum(sample[2] for sample in samples if sample)
+    latency_ms = {"mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0}
+    for name, fraction in PERCENTILES:
+        latency_ms[name] = 1000 * percentile(latencies, fraction)
+    latency_ms["max"] = 1000 * latencies[-1] if latencies else 0.0
+
+    result = scenario._asdict()
+    result.update(name=scenario.name,
+                  ops=len(latencies),
+                  errors=errors,
+                  duration=duration,
+                  ops_per_sec=len(latencies) / duration if duration else 0.0,
+                  rows_per_sec=rows_done / duration if duration else 0.0,
+                  latency_ms=latency_ms)
+    return result
+
+
+def run_scenarios(runs: Iterable[Scenario], database: str = ':memory:', seed: int = 0, **server_kwargs) -> List[dict]:
+    """Run the scenarios, starting one server per mode and engine"""
+    results = []
+    by_server = {}
+    for scenario in runs:
+        by_server.setdefault((scenario.mode, scenario.engine), []).append(scenario)
+    for (mode, engine), server_scenarios in by_server.items():
+        with running_server(mode, database, engine=engine, **server_kwargs) as client_kwargs:
+            for scenario in server_scenarios:
+                LOG.info("Running scenario %s", scenario.name)
+                results.append(run_scenario(scenario, client_kwargs, seed=seed))
+    return results
@@ -0,0 +1,218 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterable, Optional
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['ResultCache', 'TableTracker']
+
+# Actions which change the schema. Any of them invalidates every cached result.
+SCHEMA_ACTIONS = {
+    sqlite3.SQLITE_ALTER_TABLE,
+    sqlite3.SQLITE_ATTACH,
+    sqlite3.SQLITE_CREATE_INDEX,
+    sqlite3.SQLITE_CREATE_TABLE,
+    sqlite3.SQLITE_CREATE_TEMP_INDEX,
+    sqlite3.SQLITE_CREATE_TEMP_TABLE,
+    sqlite3.SQLITE_CREATE_TEMP_TRIGGER,
+    sqlite3.SQLITE_CREATE_TEMP_VIEW,
+    sqlite3.SQLITE_CREATE_TRIGGER,
+    sqlite3.SQLITE_CREATE_VIEW,
+    sqlite3.SQLITE_CREATE_VTABLE,
+    sqlite3.SQLITE_DETACH,
+    sqlite3.SQLITE_DROP_INDEX,
+    sqlite3.SQLITE_DROP_TABLE,
+    sqlite3.SQLITE_DROP_TEMP_INDEX,
+    sqlite3.SQLITE_DROP_TEMP_TABLE,
+    sqlite3.SQLITE_DROP_TEMP_TRIGGER,
+    sqlite3.SQLITE_DROP_TEMP_VIEW,
+    sqlite3.SQLITE_DROP_TRIGGER,
+    sqlite3.SQLITE_DROP_VIEW,
+    sqlite3.SQLITE_DROP_VTABLE,
+}
+
+WRITE_ACTIONS = {
+    sqlite3.SQLITE_INSERT,
+    sqlite3.SQLITE_UPDATE,
+    sqlite3.SQLITE_DELETE,
+}
+
+# Number of statements whose tables are remembered
+MAX_TRACKED_STATEMENTS = 4096
+
+# Marker for "all tables", used for schema changes and statements of unknown effect
+ALL_TABLES = '*'
+
+
+class TableTracker:
+
+    def __init__(self, authorizer: Callable):
+        """Wraps the authorizer passed to ``set_authorizer()`` to record the tables read and written
+        by the statements of a request.
+
+        sqlite only calls the authorizer when it compiles a statement and sqlite3 caches compiled
+        statements, so the tables touched by each SQL text are remembered and reused when the
+        statement runs again without being compiled.
+
+        Args:
+            authorizer: The authorizer deciding the permissions, e.g. :class: `sqlite_rx.auth.Authorizer`
+
+        """
+        self._authorizer = authorizer
+        self._statements = OrderedDict()
+        self._reads = set()
+        self._writes = set()
+        self._compiled = False
+        self.reads = set()
+        self.writes = set()
+        self.complete = True
+        self.failed = False
+        self.internal = False
+
+    def __call__(self, action: int, arg1, arg2, dbname, source) -> int:
+        if self.internal:
+            # Statements run by the server itself, e.g. ``pragma data_version``
+            return sqlite3.SQLITE_OK
+        self._compiled = True
+        if action == sqlite3.SQLITE_READ:
+            self._reads.add(arg1.lower())
+        elif action in WRITE_ACTIONS:
+            self._writes.add(arg1.lower())
+        elif action in SCHEMA_ACTIONS:
+            self._writes.add(ALL_TABLES)
+        return self._authorizer(action, arg1, arg2, dbname, source)
+
+    def begin(self):
+        """Start recording the tables of a new request"""
+        self.reads = set()
+        self.writes = set()
+        self.complete = True
+        self.failed = False
+
+    @contextmanager
+    def track(self, query: str):
+        """Attribute the authorizer calls made while executing ``query`` to the current request"""
+        self._reads = set()
+        self._writes = set()
+        self._compiled = False
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = self.failed = True
+            raise
+        finally:
+            if self._compiled:
+                self._statements[query] = (frozenset(self._reads), frozenset(self._writes))
+                self._statements.move_to_end(query)
+                if len(self._statements) > MAX_TRACKED_STATEMENTS:
+                    self._statements.popitem(last=False)
+            tables = self._statements.get(query)
+            if tables is None:
+                # Either it failed to compile and had no effect, or it was compiled before it
+                # could be tracked and nothing is known about it.
+                if not failed:
+                    self.complete = False
+                    self.writes.add(ALL_TABLES)
+            else:
+                self._statements.move_to_end(query)
+                self.reads.update(tables[0])
+                self.writes.update(tables[1])
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes: int):
+        """An LRU cache of encoded replies to read-only queries, bounded by the total size of the replies.
+
+        Every entry records the tables its query read. A write to one of these tables evicts it.
+
+        Args:
+            max_bytes: Total size of the cached replies
+
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._tables = {}
+        self._data_version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def check_data_version(self, data_version: int):
+        """Drop everything if another connection, e.g. another worker process, committed since the last check.
+
+        ``pragma data_version`` does not change for commits made on the server's own connection;
+        these are invalidated table by table.
+
+        """
+        if self._data_version is not None and data_version != self._data_version:
+            LOG.debug("Database changed by another connection, clearing the result cache")
+            self.invalidate([ALL_TABLES])
+        self._data_version = data_version
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, reply: bytes, tables: Iterable[str]):
+        if len(reply) > self.max_bytes:
+            return
+        self._remove(key)
+        tables = frozenset(tables)
+        self._entries[key] = (reply, tables)
+        self.size += len(reply)
+        for table in tables:
+            self._tables.setdefault(table, set()).add(key)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, tables: Iterable[str]):
+        """Evict the entries which read any of ``tables``. ``'*'`` evicts all the entries."""
+        tables = set(tables)
+        if ALL_TABLES in tables:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tables.clear()
+            self.size = 0
+            return
+        for table in tables:
+            for key in list(self._tables.get(table, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        reply, tables = entry
+        self.size -= len(reply)
+        for table in tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
@@ -13,7 +13,10 @@ import rich.syntax
 import rich.table
 
 from sqlite_rx import get_default_logger_settings, __version__
-from sqlite_rx.server import SQLiteServer
+from sqlite_rx.backup import BACKUP_PAGES, BACKUP_SLEEP, parse_retention
+from sqlite_rx.codec import Codec, DEFAULT_FRAME_THRESHOLD, DEFAULT_THRESHOLD, available_compressions
+from sqlite_rx.engine import ENGINES
+from sqlite_rx.server import EXECUTOR_QUEUE_SIZE, GROUP_COMMIT_SIZE, MAX_OPEN_DATABASES, SQLiteServer
 
 
 LOG = logging.getLogger(__name__)
@@ -55,6 +58,100 @@ def print_help():
                   "Path to the backup database")
     table.add_row("-i --backup-interval [cyan]FLOAT",
                   "Backup interval in seconds")
+    table.add_row("--backup-pages [cyan]INTEGER",
+                  "Pages copied per step of a backup. -1 copies the database in one step\n"
+                  "Default value is [bold][cyan]{}".format(BACKUP_PAGES))
+    table.add_row("--backup-sleep [cyan]SECONDS",
+                  "Pause between two steps of a backup\n"
+                  "Default value is [bold][cyan]{}".format(BACKUP_SLEEP))
+    table.add_row("--snapshot-dir [cyan]PATH",
+                  "Directory of the compacted snapshots made with VACUUM INTO")
+    table.add_row("--snapshot-interval [cyan]SECONDS",
+                  "Interval between two snapshots\n"
+                  "Default value is [bold][cyan]3600")
+    table.add_row("--snapshot-retention [cyan]COUNT|HOURSh|COUNT,HOURSh",
+                  "Snapshots to keep, e.g. 10, 24h or 10,24h\n"
+                  "Default value keeps all the snapshots")
+    table.add_row("--snapshot-compress/--no-snapshot-compress",
+                  "Gzip the snapshots\n"
+                  "Default value is [bold][cyan]False")
+    table.add_row("-w --read-workers [cyan]INTEGER",
+                  "Number of reader processes for an on-disk database\n"
+                  "Default value is [bold][cyan]0")
+    table.add_row("--executor/--no-executor",
+                  "Execute queries on a writer thread rather than on the event loop\n"
+                  "Default value is [bold][cyan]False")
+    table.add_row("--read-threads [cyan]INTEGER",
+                  "Number of executor threads serving reads of an on-disk database. Implies --executor\n"
+                  "Default value is [bold][cyan]0")
+    table.add_row("--queue-size [cyan]INTEGER",
+                  "Requests queued per pool of executor threads, served reads first, then writes, then bulk requests\n"
+                  "Default value is [bold][cyan]1024")
+    table.add_row("--high-water-mark [cyan]INTEGER",
+                  "Messages queued by zmq per client on the server socket\n"
+                  "Default value is the zmq default of [bold][cyan]1000")
+    table.add_row("--rate-limit [cyan]FLOAT",
+                  "Requests per second admitted from every client id\n"
+                  "Default value disables rate limits")
+    table.add_row("--rate-burst [cyan]INTEGER",
+                  "Requests a client may send at once after being idle\n"
+                  "Default value is the rate limit")
+    table.add_row("--database-dir [cyan]PATH",
+                  "Directory of databases which clients name per request, served along with --database")
+    table.add_row("--max-databases [cyan]INTEGER",
+                  "Databases of the database directory with an open connection, per executor thread\n"
+                  f"Default value is [bold][cyan]{MAX_OPEN_DATABASES}")
+    table.add_row("--max-database-memory [cyan]INTEGER",
+                  "Bytes the open databases of the database directory may hold in their caches\n"
+                  "Default value only limits their number")
+    table.add_row("--create-databases/--no-create-databases",
+                  "Create the databases of the database directory on their first request\n"
+                  "Default value is [bold][cyan]False")
+    table.add_row("--engine [cyan]tornado|asyncio",
+                  "Event loop of the server processes. asyncio uses uvloop when it is installed\n"
+                  "Default value is [bold][cyan]tornado")
+    table.add_row("--compression [cyan]none|zlib|lz4|zstd",
+                  "Preferred compression for replies\n"
+                  "Default value is [bold][cyan]zlib")
+    table.add_row("--compression-level [cyan]INTEGER",
+                  "Compression level. -1 is the default level of the compression")
+    table.add_row("--compression-threshold [cyan]INTEGER",
+                  "Replies smaller than this many bytes are not compressed\n"
+                  "Default value is [bold][cyan]512")
+    table.add_row("--frame-threshold [cyan]BYTES",
+                  "Blobs of this many bytes or more are sent as uncompressed out-of-band frames, e.g. 65536\n"
+                  "Default value is [bold][cyan]0[/bold] (disabled)")
+    table.add_row("--cache-size [cyan]BYTES",
+                  "Size of the result cache of read-only queries\n"
+                  "Default value is [bold][cyan]0[/bold] (disabled)")
+    table.add_row("--group-commit-window [cyan]SECONDS",
+                  "Window during which write requests are collected and committed in one transaction\n"
+                  "Default value is [bold][cyan]0[/bold] (disabled)")
+    table.add_row("--group-commit-size [cyan]INTEGER",
+                  "Maximum number of write requests committed together\n"
+                  "Default value is [bold][cyan]64")
+    table.add_row("--metrics/--no-metrics",
+                  "Enable/Disable request counters and latency histograms\n"
+                  "Default value is [bold][cyan]False")
+    table.add_row("--metrics-address [cyan]HOST:PORT",
+                  "Serve the metrics in the Prometheus text format on http://HOST:PORT/metrics")
+    table.add_row("--slow-query-threshold [cyan]SECONDS",
+                  "Log the queries running longer than this, along with their query plan")
+    table.add_row("--slow-query-log [cyan]PATH",
+                  "Rotating file of the slow query log\n"
+                  "Default is the server log")
+    table.add_row("--redact-params/--no-redact-params",
+                  "Leave the query parameters out of the slow query log\n"
+                  "Default value is [bold][cyan]False")
+    table.add_row("--query-stats [cyan]INTEGER",
+                  "Number of query fingerprints for which calls, time, rows and bytes are aggregated\n"
+                  "Default value is [bold][cyan]0[/bold] (disabled)")
+    table.add_row("--replication-address [cyan]ADDRESS",
+                  "Address on which committed writes are published to followers, e.g. tcp://0.0.0.0:5001")
+    table.add_row("--follow [cyan]ADDRESS",
+                  "Address of a primary server whose writes are applied. The server then serves reads only")
+    table.add_row("--bootstrap-database [cyan]PATH",
+                  "Backup of the primary's database from which a follower restores its database")
     table.add_row("--help", "Show this message and exit.")
     console.print(table)
 
@@ -68,6 +165,16 @@ def handle_help(ctx: click.Context,
     ctx.exit()
 
 
+def validate_retention(ctx: click.Context,
+                       param: typing.Union[click.Option, click.Parameter],
+                       value: typing.Any) -> typing.Any:
+    try:
+        parse_retention(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    return value
+
+
 @click.command(add_help_option=False)
 @click.version_option(__version__, '-v', '--version', message='%(version)s')
 @click.option('--log-level',
@@ -119,6 +226,162 @@ def handle_help(ctx: click.Context,
               default=600.0,
               type=click.FLOAT,
               show_default=True)
+@click.option('--backup-pages',
+              help='Pages copied per step of a backup. -1 copies the database in one step',
+              default=BACKUP_PAGES,
+              type=click.INT,
+              show_default=True)
+@click.option('--backup-sleep',
+              help='Seconds slept between two steps of a backup',
+              default=BACKUP_SLEEP,
+              type=click.FloatRange(min=0),
+              show_default=True)
+@click.option('--snapshot-dir',
+              help='Directory of the compacted snapshots made with VACUUM INTO',
+              default=None,
+              type=str)
+@click.option('--snapshot-interval',
+              help='Seconds between two snapshots',
+              default=3600.0,
+              type=click.FloatRange(min=0, min_open=True),
+              show_default=True)
+@click.option('--snapshot-retention',
+              help='Snapshots to keep, e.g. 10, 24h or 10,24h. All are kept by default',
+              callback=validate_retention,
+              default=None,
+              type=str)
+@click.option('--snapshot-compress/--no-snapshot-compress',
+              help='Gzip the snapshots',
+              default=False,
+              show_default=True)
+@click.option('--read-workers',
+              '-w',
+              help='Number of reader processes. Read-only statements are dispatched to these processes',
+              default=0,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--executor/--no-executor',
+              help='Execute queries on a writer thread rather than on the event loop',
+              default=False,
+              show_default=True)
+@click.option('--read-threads',
+              help='Number of executor threads serving reads of an on-disk database. Implies --executor',
+              default=0,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--queue-size',
+              help='Requests queued per pool of executor threads, served reads first, then writes, then bulk requests',
+              default=EXECUTOR_QUEUE_SIZE,
+              type=click.IntRange(min=1),
+              show_default=True)
+@click.option('--high-water-mark',
+              help='Messages queued by zmq per client on the server socket. Defaults to the zmq default of 1000',
+              default=None,
+              type=click.IntRange(min=0))
+@click.option('--rate-limit',
+              help='Requests per second admitted from every client id. Rate limits are disabled by default',
+              default=None,
+              type=click.FloatRange(min=0, min_open=True))
+@click.option('--rate-burst',
+              help='Requests a client may send at once after being idle. Defaults to the rate limit',
+              default=None,
+              type=click.IntRange(min=1))
+@click.option('--database-dir',
+              help='Directory of databases which clients name per request, served along with --database',
+              default=None,
+              type=click.Path(exists=True, file_okay=False))
+@click.option('--max-databases',
+              help='Databases of the database directory with an open connection, per executor thread',
+              default=MAX_OPEN_DATABASES,
+              type=click.IntRange(min=1),
+              show_default=True)
+@click.option('--max-database-memory',
+              help='Bytes the open databases of the database directory may hold in their caches',
+              default=None,
+              type=click.IntRange(min=0))
+@click.option('--create-databases/--no-create-databases',
+              help='Create the databases of the database directory on their first request',
+              default=False,
+              show_default=True)
+@click.option('--engine',
+              help='Event loop of the server processes. asyncio uses uvloop when it is installed',
+              default='tornado',
+              type=click.Choice(ENGINES),
+              show_default=True)
+@click.option('--compression',
+              help='Preferred compression for replies',
+              default='zlib',
+              type=click.Choice(available_compressions()),
+              show_default=True)
+@click.option('--compression-level',
+              help='Compression level. -1 is the default level of the compression',
+              default=-1,
+              type=click.INT,
+              show_default=True)
+@click.option('--compression-threshold',
+              help='Replies smaller than this many bytes are not compressed',
+              default=DEFAULT_THRESHOLD,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--frame-threshold',
+              help='Blobs of this many bytes or more are sent as uncompressed out-of-band frames, e.g. 65536. '
+                   '0 disables it',
+              default=DEFAULT_FRAME_THRESHOLD,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--cache-size',
+              help='Size in bytes of the result cache of read-only queries. 0 disables the cache',
+              default=0,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--group-commit-window',
+              help='Seconds during which write requests are collected and committed in one transaction. '
+                   '0 disables group commit',
+              default=0.0,
+              type=click.FloatRange(min=0),
+              show_default=True)
+@click.option('--group-commit-size',
+              help='Maximum number of write requests committed together',
+              default=GROUP_COMMIT_SIZE,
+              type=click.IntRange(min=1),
+              show_default=True)
+@click.option('--metrics/--no-metrics',
+              help='True if you want to keep request counters and latency histograms',
+              default=False,
+              show_default=True)
+@click.option('--metrics-address',
+              help='host:port on which to serve the metrics in the Prometheus text format. Implies --metrics',
+              default=None)
+@click.option('--slow-query-threshold',
+              help='Queries running longer than this many seconds are logged with their query plan',
+              default=None,
+              type=click.FloatRange(min=0))
+@click.option('--slow-query-log',
+              help='Path of the rotating slow query log. Defaults to the server log',
+              default=None,
+              type=click.Path())
+@click.option('--redact-params/--no-redact-params',
+              help='True if you want to leave the query parameters out of the slow query log',
+              default=False,
+              show_default=True)
+@click.option('--query-stats',
+              help='Number of query fingerprints for which calls, time, rows and bytes are aggregated. '
+                   '0 disables query statistics',
+              default=0,
+              type=click.IntRange(min=0),
+              show_default=True)
+@click.option('--replication-address',
+              help='Address on which committed writes are published to followers, e.g. tcp://0.0.0.0:5001',
+              default=None,
+              type=str)
+@click.option('--follow',
+              help='Address of a primary server whose writes are applied. The server then serves reads only',
+              default=None,
+              type=str)
+@click.option('--bootstrap-database',
+              help="Backup of the primary's database from which a follower restores its database",
+              default=None,
+              type=str)
 @click.option("--help",
               is_flag=True,
               is_eager=True,
@@ -133,7 +396,41 @@ def main(log_level,
          curve_dir,
          key_id,
          backup_database,
-         backup_interval):
+         backup_interval,
+         backup_pages,
+         backup_sleep,
+         snapshot_dir,
+         snapshot_interval,
+         snapshot_retention,
+         snapshot_compress,
+         read_workers,
+         executor,
+         read_threads,
+         queue_size,
+         high_water_mark,
+         rate_limit,
+         rate_burst,
+         database_dir,
+         max_databases,
+         max_database_memory,
+         create_databases,
+         engine,
+         compression,
+         compression_level,
+         compression_threshold,
+         frame_threshold,
+         cache_size,
+         group_commit_window,
+         group_commit_size,
+         metrics,
+         metrics_address,
+         slow_query_threshold,
+         slow_query_log,
+         redact_params,
+         query_stats,
+         replication_address,
+         follow,
+         bootstrap_database):
     logging.config.dictConfig(get_default_logger_settings(level=log_level))
     LOG.info("Python Platform %s", platform.python_implementation())
     kwargs = {
@@ -144,7 +441,39 @@ def main(log_level,
         'use_encryption': curvezmq,
         'server_curve_id': key_id,
         'backup_database': backup_database,
-        'backup_interval': backup_interval
+        'backup_interval': backup_interval,
+        'backup_pages': backup_pages,
+        'backup_sleep': backup_sleep,
+        'snapshot_dir': snapshot_dir,
+        'snapshot_interval': snapshot_interval,
+        'snapshot_retention': snapshot_retention,
+        'snapshot_compress': snapshot_compress,
+        'read_workers': read_workers,
+        'executor': executor,
+        'read_threads': read_threads,
+        'queue_size': queue_size,
+        'high_water_mark': high_water_mark,
+        'rate_limit': rate_limit,
+        'rate_burst': rate_burst,
+        'database_dir': database_dir,
+        'max_databases': max_databases,
+        'max_database_memory': max_database_memory,
+        'create_databases': create_databases,
+        'engine': engine,
+        'codec': Codec(compression=compression, level=compression_level, threshold=compression_threshold,
+                       frame_threshold=frame_threshold),
+        'cache_size': cache_size,
+        'group_commit_window': group_commit_window,
+        'group_commit_size': group_commit_size,
+        'metrics': metrics,
+        'metrics_address': metrics_address,
+        'slow_query_threshold': slow_query_threshold,
+        'slow_query_log': slow_query_log,
+        'redact_params': redact_params,
+        'query_stats': query_stats,
+        'replication_address': replication_address,
+        'follow': follow,
+        'bootstrap_database': bootstrap_database
     }
     LOG.info('Args %s', pformat(kwargs))
     server = SQLiteServer(**kwargs)
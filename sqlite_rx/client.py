@@ -1,32 +1,186 @@
+import asyncio
+import collections
+import itertools
 import logging.config
 import os
+import random
 import socket
 import threading
-import zlib
+import time
+from concurrent.futures import Future
+from typing import List, Sequence, Tuple, Union
 
 import msgpack
 import zmq
+import zmq.asyncio
 from sqlite_rx.auth import KeyMonkey
+from sqlite_rx.codec import Codec, Peer, LEGACY_PEER, blob_hook
+from sqlite_rx.query import is_read_only, statement_id
 from sqlite_rx.exception import (
     SQLiteRxCompressionError,
     SQLiteRxConnectionError,
+    SQLiteRxError,
+    SQLiteRxOverloadedError,
+    SQLiteRxQueryError,
     SQLiteRxTransportError,
     SQLiteRxSerializationError,
+    SQLiteRxTimeoutError,
+    SQLiteRxUnknownStatementError,
 )
 
 
 DEFAULT_REQUEST_TIMEOUT = 2500
 REQUEST_RETRIES = 5
+DEFAULT_BATCH_SIZE = 1000
+# Fraction of the request timeout sent to the server as the request's deadline. The server gives up
+# slightly before the client does, so that its timeout reply arrives while the client still waits.
+# Only a `request_timeout` passed by the caller is sent, the default one gives the server no deadline.
+DEADLINE_FRACTION = 0.9
+# Upper bound, in ms, of the delay before resending a request an overloaded server turned away
+MAX_BACKOFF = 5000
+RESULT_FORMATS = ('rows', 'columnar')
 
 
 PARENT_DIR = os.path.dirname(__file__)
 
 LOG = logging.getLogger(__name__)
 
-__all__ = ['SQLiteClient']
+__all__ = ['SQLiteClient', 'AsyncSQLiteClient', 'MultiplexedSQLiteClient', 'PreparedStatement']
 
+UNKNOWN_STATEMENT_ERROR = "{}.{}".format(SQLiteRxUnknownStatementError.__module__,
+                                         SQLiteRxUnknownStatementError.__name__)
+TIMEOUT_ERROR = "{}.{}".format(SQLiteRxTimeoutError.__module__, SQLiteRxTimeoutError.__name__)
+OVERLOADED_ERROR = "{}.{}".format(SQLiteRxOverloadedError.__module__, SQLiteRxOverloadedError.__name__)
 
-class SQLiteClient(threading.local):
+
+class PreparedStatement:
+
+    __slots__ = ('statement_id', 'query', 'read_only')
+
+    def __init__(self, query: str):
+        """Handle returned by :meth: `sqlite_rx.client.SQLiteClient.prepare`
+
+        Args:
+            query: The SQL of the prepared statement
+
+        """
+        self.statement_id = statement_id(query)
+        self.query = query
+        self.read_only = is_read_only(query)
+
+    def __repr__(self):
+        return "PreparedStatement({!r})".format(self.query)
+
+
+def encode_request(request: dict, codec: Codec, peer: Peer) -> bytes:
+    try:
+        payload = msgpack.dumps(request)
+    except Exception:
+        LOG.exception("Exception while serializing the request")
+        raise SQLiteRxSerializationError("msgpack serialization")
+    try:
+        return codec.encode(payload, peer)
+    except SQLiteRxCompressionError:
+        LOG.exception("Exception while request body compression")
+        raise
+
+
+def response_error(error: dict) -> SQLiteRxQueryError:
+    """The exception for an error reported by the server. A request the server cancelled past its
+    deadline gives a :class: `sqlite_rx.exception.SQLiteRxTimeoutError` and a request an overloaded
+    server turned away a :class: `sqlite_rx.exception.SQLiteRxOverloadedError`.
+
+    """
+    message = "{type}: {message}".format(**error)
+    if error['type'] == TIMEOUT_ERROR:
+        return SQLiteRxTimeoutError(message)
+    if error['type'] == OVERLOADED_ERROR:
+        return SQLiteRxOverloadedError(message)
+    return SQLiteRxQueryError(message)
+
+
+def is_overloaded(response: dict) -> bool:
+    """Returns True if the server turned the request away, asking to retry later"""
+    error = response.get('error')
+    return bool(error) and error.get('type') == OVERLOADED_ERROR
+
+
+def backoff_delay(response: dict, attempt: int) -> float:
+    """Seconds to wait before resending a request an overloaded server turned away.
+
+    The ``retry_after`` ms of the reply doubles with every attempt, up to :data: `MAX_BACKOFF`, and
+    up to half of it again is added at random so that the turned away clients don't come back together.
+
+    """
+    delay = min(MAX_BACKOFF, response.get('retry_after', 0) * 2 ** attempt)
+    return delay * (1 + random.random() / 2) / 1000
+
+
+def with_deadline(request: dict, request_timeout: int = None) -> int:
+    """Give ``request`` a server-side deadline if the caller passed a ``request_timeout``, so that the
+    server gives up on the request when the client does. Returns the request timeout in ms."""
+    if request_timeout is None:
+        return DEFAULT_REQUEST_TIMEOUT
+    request['timeout'] = request_timeout * DEADLINE_FRACTION
+    return request_timeout
+
+
+def decode_response(body: bytes, codec: Codec, frames: Sequence = ()) -> Tuple[dict, Peer]:
+    try:
+        payload, peer = codec.decode(body)
+    except SQLiteRxCompressionError:
+        LOG.exception("Exception while request body decompression")
+        raise
+    try:
+        return msgpack.loads(payload, raw=False, ext_hook=blob_hook(frames)), peer
+    except Exception:
+        LOG.exception("Exception while deserializing the request")
+        raise SQLiteRxSerializationError("msgpack deserialization error")
+
+
+class CodecNegotiation:
+    """Encodes requests and decodes replies with the client's ``_codec``.
+
+    The first requests are plain zlib messages announcing the codecs the client can decode, so
+    that servers which predate the codec header can still serve them. Once the server replies
+    with a framed message, requests are framed too.
+
+    """
+
+    def _encode(self, request: dict) -> List:
+        """Returns the frames of the request: the message, followed by its out-of-band blobs"""
+        if self.database is not None:
+            request = dict(request, database=self.database)
+        if self._peer is None:
+            return [encode_request(dict(request, codec=self._codec.announcement()), self._codec, LEGACY_PEER)]
+        frames = []
+        if self._codec.out_of_band(self._peer):
+            request = self._detach(request, frames)
+        return [encode_request(request, self._codec, self._peer)] + frames
+
+    def _detach(self, request: dict, frames: List) -> dict:
+        detach = self._codec.detach
+        if 'params' in request:
+            params = request['params']
+            if request.get('execute_many'):
+                params = [detach(row, frames) if isinstance(row, (list, tuple)) else row for row in params]
+            elif isinstance(params, (list, tuple)):
+                params = detach(params, frames)
+            request = dict(request, params=params)
+        if 'batch' in request:
+            request = dict(request, batch=[(query, detach(params, frames) if isinstance(params, (list, tuple)) else params)
+                                           for query, params in request['batch']])
+        return request
+
+    def _decode(self, frames: List) -> dict:
+        """Decode a reply received as ``zmq.Frame`` objects. Out-of-band blobs are returned as memoryviews of their frame."""
+        response, peer = decode_response(frames[0].buffer, self._codec, [frame.buffer for frame in frames[1:]])
+        if not peer.legacy:
+            self._peer = peer
+        return response
+
+
+class SQLiteClient(CodecNegotiation, threading.local):
 
     def __init__(self,
                  connect_address: str,
@@ -34,7 +188,9 @@ class SQLiteClient(threading.local):
                  curve_dir: str = None,
                  client_curve_id: str = None,
                  server_curve_id: str = None,
-                 context=None):
+                 context=None,
+                 codec: Codec = None,
+                 database: str = None):
         """
         A thin and reliable client to send query execution requests to a remote :class: `sqlite_rx.server.SQLiteServer`
 
@@ -47,6 +203,10 @@ class SQLiteClient(threading.local):
             client_curve_id: Server curve id. Defaults to "id_server_{}_curve".format(socket.gethostname())
             server_curve_id: Client curve id. Defaults to "id_client_{}_curve".format(socket.gethostname())
             context: `zmq.Context`
+            codec: The :class: `sqlite_rx.codec.Codec` deciding how requests are compressed.
+                Defaults to zlib for payloads of 512 bytes or more.
+            database: The name of the database to query on a server hosting a database directory.
+                Defaults to the server's own database.
 
         """
         self.client_id = "python@{}_{}".format(socket.gethostname(), threading.get_ident())
@@ -56,6 +216,10 @@ class SQLiteClient(threading.local):
         self.server_curve_id = server_curve_id if server_curve_id else "id_server_{}_curve".format(socket.gethostname())
         client_curve_id = client_curve_id if client_curve_id else "id_client_{}_curve".format(socket.gethostname())
         self._keymonkey = KeyMonkey(client_curve_id, destination_dir=curve_dir)
+        self._codec = codec or Codec()
+        self.database = database
+        # Until the server replies with a framed message it may predate the codec header.
+        self._peer = None
         self._client = self._init_client()
 
     def _init_client(self):
@@ -72,31 +236,20 @@ class SQLiteClient(threading.local):
         return client
 
     def _send_request(self, request):
+        frames = self._encode(request)
         try:
-            self._client.send(zlib.compress(msgpack.dumps(request)))
+            self._client.send_multipart(frames, copy=False)
         except zmq.ZMQError:
             LOG.exception("Exception while sending message")
             raise SQLiteRxTransportError("ZMQ send error")
-        except zlib.error:
-            LOG.exception("Exception while request body compression")
-            raise SQLiteRxCompressionError("zlib compression error")
-        except Exception:
-            LOG.exception("Exception while serializing the request")
-            raise SQLiteRxSerializationError("msgpack serialization")
 
     def _recv_response(self):
         try:
-            response = msgpack.loads(zlib.decompress(self._client.recv()), raw=False)
+            frames = self._client.recv_multipart(copy=False)
         except zmq.ZMQError:
             LOG.exception("Exception while receiving message")
             raise SQLiteRxTransportError("ZMQ receive error")
-        except zlib.error:
-            LOG.exception("Exception while request body decompression")
-            raise SQLiteRxCompressionError("zlib compression error")
-        except Exception:
-            LOG.exception("Exception while deserializing the request")
-            raise SQLiteRxSerializationError("msgpack deserialization error")
-        return response
+        return self._decode(frames)
 
     def execute(self,
                 query: str,
@@ -111,9 +264,24 @@ class SQLiteClient(threading.local):
 
             2. `execute_script`: True if you want to execute a script with multiple SQL commands.
 
-            3. `request_timeout`: Time in ms to wait for a response before retrying. Default is 2500 ms
+            3. `request_timeout`: Time in ms to wait for a response before retrying. Default is 2500 ms.
+               When passed, it is sent along as the request's deadline: the server skips the request if it waited
+               about that long in a queue, or interrupts it once it ran that long, and replies with an error of type
+               `sqlite_rx.exception.SQLiteRxTimeoutError`. Without it the server runs the request to completion.
+               No reply at all raises `SQLiteRxConnectionError`.
+
+            4. `retries`: Number of times to retry before abandoning the request. Default is 5.
+               A request which an overloaded server turned away is retried after the delay the server asked for,
+               doubled with every attempt, and the last reply is returned as it is.
+
+            5. `result_format`: "rows" (default) or "columnar". A columnar response has the column names
+               in "columns" and one entry per column in "data": an `array.array` of int64 ('q') or
+               float64 ('d') for integer or real columns, a list otherwise. The arrays can be handed to
+               NumPy (`numpy.asarray`) or pandas (`pandas.DataFrame(dict(zip(columns, data)))`) as they are.
 
-            4. `retries`: Number of times to retry before abandoning the request. Default is 5
+        When both the client's codec and the server's opt in with a `frame_threshold`, blobs of at least that
+        many bytes, in the parameters or the result, travel as out-of-band frames which are neither copied into
+        the message nor compressed. Such blobs are returned as a `memoryview` of the received frame.
 
         Args:
             query: A valid SQL query or SQL script
@@ -136,12 +304,16 @@ class SQLiteClient(threading.local):
         request_retries = kwargs.pop('retries', REQUEST_RETRIES)
         execute_many = kwargs.pop('execute_many', False)
         execute_script = kwargs.pop('execute_script', False)
-        request_timeout = kwargs.pop('request_timeout', DEFAULT_REQUEST_TIMEOUT)
+        request_timeout = kwargs.pop('request_timeout', None)
+        result_format = kwargs.pop('result_format', 'rows')
 
         # Do some client side validations.
         if execute_script and execute_many:
             raise ValueError("Both `execute_script` and `execute_many` cannot be True")
 
+        if result_format not in RESULT_FORMATS:
+            raise ValueError("`result_format` should be one of {}".format(RESULT_FORMATS))
+
         request = {
             "client_id": self.client_id,
             "query": query,
@@ -149,8 +321,279 @@ class SQLiteClient(threading.local):
             "execute_many": execute_many,
             "execute_script": execute_script
         }
+        if result_format != 'rows':
+            request['result_format'] = result_format
+
+        return self._request(request, request_retries, request_timeout)
+
+    def iterate(self,
+                query: str,
+                *args,
+                **kwargs):
+        """Send the `query` to a remote SQLiteServer and iterate over the result rows as they are streamed back.
+
+        The server keeps a cursor open and the rows are pulled in batches of `batch_size`, so memory
+        on both sides is bounded by the batch size and the first rows are available immediately.
+        The server-side cursor is closed when the iteration completes or the generator is closed.
+
+        Important keyword arguments are as follows:
+
+            1. `batch_size`: Number of rows to fetch per round trip. Default is 1000
+
+            2. `request_timeout`: Time in ms to wait for a response before retrying. Default is 2500 ms
+
+            3. `retries`: Number of times to retry before abandoning the request. Default is 5
+
+        Args:
+            query: A valid SQL query
+
+        Yields:
+            row: A list of column values
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxQueryError: If the server reports an error executing the query
+            sqlite_rx.exception.SQLiteRxTimeoutError: If the server cancels a fetch past its ``request_timeout``
+            sqlite_rx.exception.SQLiteRxConnectionError: If no response is received after retrying
+
+        """
+        LOG.info("Iterating over query %s for client %s", query, self.client_id)
+
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+        batch_size = kwargs.pop('batch_size', DEFAULT_BATCH_SIZE)
+
+        if batch_size < 1:
+            raise ValueError("`batch_size` should be a positive integer")
+
+        request = {
+            "client_id": self.client_id,
+            "query": query,
+            "params": args,
+            "execute_many": False,
+            "execute_script": False,
+            "batch_size": batch_size
+        }
+        response = self._request(request, request_retries, request_timeout)
+        cursor_id = None
+        position = 0
+        try:
+            while True:
+                if response['error']:
+                    raise response_error(response['error'])
+                cursor_id = response['cursor_id']
+                for row in response['items']:
+                    yield row
+                position += len(response['items'])
+                if cursor_id is None:
+                    return
+                request = {
+                    "client_id": self.client_id,
+                    "cursor_id": cursor_id,
+                    "position": position
+                }
+                response = self._request(request, request_retries, request_timeout)
+        finally:
+            if cursor_id is not None:
+                self._close_cursor(cursor_id, request_timeout)
+
+    def execute_batch(self,
+                      statements: List[Union[str, Sequence]],
+                      transactional: bool = True,
+                      **kwargs) -> dict:
+        """Send several statements to the remote SQLiteServer in a single round trip.
+
+        With `transactional` set, the statements run inside one transaction which is rolled back
+        if any statement fails. Otherwise each statement is committed on its own and the batch
+        stops at the first failing statement.
+
+        Important keyword arguments are `request_timeout` and `retries` as described in
+        :meth: `sqlite_rx.client.SQLiteClient.execute`
+
+        Args:
+            statements: A list of SQL queries or ``(query, params)`` pairs
+            transactional: True to run the batch atomically. Default is True
+
+        Returns:
+            response: A dictionary of the form
+            {
+                "items": [],
+                "error": None,
+                "results": [{"items": [], "rowcount": 1, "lastrowid": 1}, ...]
+            }
+            If a statement fails, "error" describes the failure and "failed_statement" is its index.
+            A rolled back transactional batch has no results.
+
+        """
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+
+        batch = []
+        for statement in statements:
+            if isinstance(statement, str):
+                batch.append((statement, ()))
+            else:
+                query, params = statement
+                batch.append((query, params))
+
+        request = {
+            "client_id": self.client_id,
+            "batch": batch,
+            "transactional": transactional
+        }
+        return self._request(request, request_retries, request_timeout)
+
+    def prepare(self, query: str, **kwargs) -> PreparedStatement:
+        """Register `query` as a prepared statement on the server and return its handle.
+
+        Executing the handle with :meth: `sqlite_rx.client.SQLiteClient.execute_prepared` only sends
+        the statement id and the parameters, and the server reuses the compiled statement.
+
+        Args:
+            query: A valid SQL query
+
+        Returns:
+            A :class: `sqlite_rx.client.PreparedStatement` handle
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxQueryError: If the server rejects the statement
+
+        """
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+        request = {
+            "client_id": self.client_id,
+            "prepare": query
+        }
+        response = self._request(request, request_retries, request_timeout)
+        if response['error']:
+            raise response_error(response['error'])
+        return PreparedStatement(query)
+
+    def execute_prepared(self,
+                         statement: PreparedStatement,
+                         *args,
+                         **kwargs) -> dict:
+        """Execute a statement returned by :meth: `sqlite_rx.client.SQLiteClient.prepare`
+
+        Only the statement id and the parameters are sent. If the server no longer knows the
+        statement, e.g. it was evicted or the server restarted, the request is transparently sent
+        again along with the SQL.
+
+        Important keyword arguments are `execute_many`, `request_timeout` and `retries` as
+        described in :meth: `sqlite_rx.client.SQLiteClient.execute`
+
+        Args:
+            statement: The prepared statement handle
+
+        Returns:
+            response: A dictionary of the form
+            {
+                "items": []
+                "error": None
+            }
+
+        """
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+        request = {
+            "client_id": self.client_id,
+            "statement_id": statement.statement_id,
+            "read_only": statement.read_only,
+            "params": args,
+            "execute_many": kwargs.pop('execute_many', False),
+            "execute_script": False
+        }
+        response = self._request(request, request_retries, request_timeout)
+        if response['error'] and response['error']['type'] == UNKNOWN_STATEMENT_ERROR:
+            LOG.info("Server does not know statement %s, sending it again", statement.statement_id)
+            request['query'] = statement.query
+            response = self._request(request, request_retries, request_timeout)
+        return response
+
+    def stats(self, **kwargs) -> dict:
+        """Returns the statistics reported by the server.
+
+        With read workers enabled, the statistics are the ones of the writer process.
+
+        """
+        return self._admin('stats', **kwargs)['stats']
+
+    def metrics(self, **kwargs) -> dict:
+        """Returns the counters, gauges and latency histograms of the server, or None if the server
+        was started without metrics. Latencies are in seconds.
+
+        With read workers enabled, the metrics are the ones of the writer process.
+
+        """
+        return self._admin('metrics', **kwargs)['metrics']
+
+    def slow_queries(self, **kwargs) -> list:
+        """Returns the last queries recorded by the server's slow query log, or None if the server
+        was started without one. Each query comes with its duration, the number of rows, the client id,
+        the parameters unless redacted and its ``EXPLAIN QUERY PLAN``.
+
+        """
+        return self._admin('slow_queries', **kwargs)['slow_queries']
+
+    def query_stats(self, order_by: str = 'total_time', limit: int = 20, **kwargs) -> dict:
+        """Returns the statistics aggregated per query fingerprint by the server, or None if the server
+        was started without query statistics.
+
+        Args:
+            order_by: One of ``total_time``, ``mean_time``, ``max_time``, ``calls``, ``rows``, ``bytes``,
+                ``errors`` and ``cache_hits``
+            limit: Number of fingerprints to return. 0 returns all of them.
+
+        Returns:
+            A dictionary with the ``statements`` and when the statistics were last reset (``since``).
+            Every statement has its normalized ``query``, ``calls``, ``errors``, ``total_time``,
+            ``mean_time``, ``min_time``, ``max_time`` (in seconds), ``rows``, ``bytes`` and ``cache_hits``.
+
+        """
+        return self._admin('query_stats', order_by=order_by, limit=limit, **kwargs)['query_stats']
+
+    def reset_query_stats(self, **kwargs):
+        """Clears the statistics aggregated per query fingerprint by the server"""
+        self._admin('reset_query_stats', **kwargs)
+
+    def replication(self, **kwargs) -> dict:
+        """Returns the replication status of the server, or None if it neither publishes nor follows.
+
+        A primary reports its ``sequence``, the number of its last committed transaction, and its
+        ``publish_address``. A follower reports the ``sequence`` it applied, the ``primary_sequence``
+        it knows of, its ``lag`` in transactions and ``lag_seconds``, the time since it fell behind.
+
+        """
+        return self._admin('replication', **kwargs)['replication']
+
+    def _admin(self, command: str, **kwargs) -> dict:
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+        request = {
+            "client_id": self.client_id,
+            "admin": command
+        }
+        request.update(kwargs)
+        response = self._request(request, request_retries, request_timeout)
+        if response['error']:
+            raise response_error(response['error'])
+        return response
 
+    def _close_cursor(self, cursor_id: str, request_timeout: int = None):
+        request = {
+            "client_id": self.client_id,
+            "cursor_id": cursor_id,
+            "close": True
+        }
+        try:
+            self._request(request, 1, request_timeout)
+        except SQLiteRxError:
+            LOG.warning("Could not close cursor %s", cursor_id)
+
+    def _request(self, request: dict, request_retries: int, request_timeout: int = None) -> dict:
         expect_reply = True
+        attempt = 0
+        request_timeout = with_deadline(request, request_timeout)
 
         while request_retries:
             LOG.info("Preparing to send request")
@@ -159,6 +602,13 @@ class SQLiteClient(threading.local):
                 socks = dict(self._poller.poll(request_timeout))
                 if socks.get(self._client) == zmq.POLLIN:
                     response = self._recv_response()
+                    if is_overloaded(response) and request_retries > 1:
+                        request_retries -= 1
+                        delay = backoff_delay(response, attempt)
+                        attempt += 1
+                        LOG.warning("Server is overloaded, resending request in %.3f s", delay)
+                        time.sleep(delay)
+                        break
                     return response
                 else:
                     LOG.warning("No response from server, retrying...")
@@ -172,7 +622,7 @@ class SQLiteClient(threading.local):
                     self._send_request(request)
 
         raise SQLiteRxConnectionError("No response after retrying. Abandoning Request")
-    
+
     def __enter__(self):
         return self
     
@@ -199,3 +649,509 @@ class SQLiteClient(threading.local):
                 LOG.error("ZeroMQ context is not a state to handle this request for socket")
         except Exception:
             LOG.exception("Exception while shutting down SQLiteClient")
+
+
+class AsyncSQLiteClient(CodecNegotiation):
+
+    def __init__(self,
+                 connect_address: str,
+                 use_encryption: bool = False,
+                 curve_dir: str = None,
+                 client_curve_id: str = None,
+                 server_curve_id: str = None,
+                 context=None,
+                 codec: Codec = None,
+                 database: str = None):
+        """
+        An asyncio client to send query execution requests to a remote :class: `sqlite_rx.server.SQLiteServer`
+
+        A single `zmq.DEALER` socket is shared by all the coroutines using the client. Every request
+        carries a request id in its envelope which the server sends back with the reply, so many
+        requests can be in flight on the same connection.
+
+        Args:
+            connect_address: The address and port on which the server will listen for client requests.
+            use_encryption: True means use `CurveZMQ` encryption. False means don't
+            curve_dir: Curve key files directory. Defaults to `~/.curve`
+            client_curve_id: Client curve id. Defaults to "id_client_{}_curve".format(socket.gethostname())
+            server_curve_id: Server curve id. Defaults to "id_server_{}_curve".format(socket.gethostname())
+            context: `zmq.asyncio.Context`
+            codec: The :class: `sqlite_rx.codec.Codec` deciding how requests are compressed.
+                Defaults to zlib for payloads of 512 bytes or more.
+            database: The name of the database to query on a server hosting a database directory.
+                Defaults to the server's own database.
+
+        Example:
+            >>> async with AsyncSQLiteClient(connect_address="tcp://127.0.0.1:5000") as client:
+            >>>     result = await client.execute("SELECT 1")
+
+        """
+        self.client_id = "python@{}_{}_{}".format(socket.gethostname(), os.getpid(), id(self))
+        self._context = context or zmq.asyncio.Context.instance()
+        self._connect_address = connect_address
+        self._encrypt = use_encryption
+        self.server_curve_id = server_curve_id if server_curve_id else "id_server_{}_curve".format(socket.gethostname())
+        client_curve_id = client_curve_id if client_curve_id else "id_client_{}_curve".format(socket.gethostname())
+        self._keymonkey = KeyMonkey(client_curve_id, destination_dir=curve_dir)
+        self._request_ids = itertools.count()
+        self._pending = {}
+        self._receiver = None
+        self._codec = codec or Codec()
+        self.database = database
+        # Until the server replies with a framed message it may predate the codec header.
+        self._peer = None
+        self._client = self._init_client()
+
+    def _init_client(self):
+        LOG.info("Initializing AsyncSQLiteClient")
+        client = self._context.socket(zmq.DEALER)
+        if self._encrypt:
+            LOG.debug("requests will be encrypted; will load CurveZMQ keys")
+            client = self._keymonkey.setup_secure_client(client, self._connect_address, self.server_curve_id)
+        client.connect(self._connect_address)
+        LOG.info("client %s initialisation completed", self.client_id)
+        return client
+
+    async def _receive(self):
+        while True:
+            try:
+                frames = await self._client.recv_multipart(copy=False)
+            except zmq.ZMQError:
+                LOG.exception("Exception while receiving message")
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(SQLiteRxTransportError("ZMQ receive error"))
+                self._pending.clear()
+                return
+            # The reply is the request id, the empty delimiter, the message and its out-of-band blobs
+            request_id = frames[0].bytes
+            future = self._pending.pop(request_id, None)
+            if future is None or future.done():
+                LOG.debug("Dropping reply to abandoned request %r", request_id)
+                continue
+            try:
+                future.set_result(self._decode(frames[2:]))
+            except SQLiteRxError as e:
+                future.set_exception(e)
+
+    async def _send_request(self, request_id: bytes, frames: List):
+        try:
+            await self._client.send_multipart([request_id, b''] + frames, copy=False)
+        except zmq.ZMQError:
+            LOG.exception("Exception while sending message")
+            raise SQLiteRxTransportError("ZMQ send error")
+
+    async def execute(self,
+                      query: str,
+                      *args,
+                      **kwargs) -> dict:
+        """Coroutine which will send the `query` and the parameters to a remote SQLiteServer instance and
+        return the response once it arrives.
+
+        It accepts the same keyword arguments as :meth: `sqlite_rx.client.SQLiteClient.execute` i.e. `execute_many`,
+        `execute_script`, `request_timeout`, `retries` and `result_format`. A request which gets no reply within `request_timeout`
+        ms is sent again, with the same request id, until `retries` attempts are exhausted. A request which an
+        overloaded server turned away is sent again after the delay the server asked for, doubled with every attempt.
+
+        Args:
+            query: A valid SQL query or SQL script
+
+        Returns:
+            response: A dictionary of the form
+            {
+                "items": []
+                "error": None
+            }
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxConnectionError: No response after retrying
+            sqlite_rx.exception.SQLiteRxTransportError: An error at the Transport layer i.e. zmq socket
+            sqlite_rx.exception.SQLiteRxCompressionError: An error while compressing the request body using `zlib`
+            sqlite_rx.exception.SQLiteRxSerializationError: An error while serializing the request body using `msgpack`
+
+        """
+        LOG.info("Executing query %s for client %s", query, self.client_id)
+
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        execute_many = kwargs.pop('execute_many', False)
+        execute_script = kwargs.pop('execute_script', False)
+        request_timeout = kwargs.pop('request_timeout', None)
+        result_format = kwargs.pop('result_format', 'rows')
+
+        if execute_script and execute_many:
+            raise ValueError("Both `execute_script` and `execute_many` cannot be True")
+
+        if result_format not in RESULT_FORMATS:
+            raise ValueError("`result_format` should be one of {}".format(RESULT_FORMATS))
+
+        request = {
+            "client_id": self.client_id,
+            "query": query,
+            "params": args,
+            "execute_many": execute_many,
+            "execute_script": execute_script
+        }
+        if result_format != 'rows':
+            request['result_format'] = result_format
+        return await self._request(request, request_retries, request_timeout)
+
+    async def _request(self, request: dict, request_retries: int, request_timeout: int = None) -> dict:
+        if self._receiver is None or self._receiver.done():
+            self._receiver = asyncio.ensure_future(self._receive())
+
+        request_timeout = with_deadline(request, request_timeout)
+        frames = self._encode(request)
+        request_id = str(next(self._request_ids)).encode()
+        loop = asyncio.get_running_loop()
+        future = self._pending[request_id] = loop.create_future()
+        attempt = 0
+        try:
+            while request_retries:
+                await self._send_request(request_id, frames)
+                try:
+                    response = await asyncio.wait_for(asyncio.shield(future), request_timeout / 1000)
+                except asyncio.TimeoutError:
+                    request_retries -= 1
+                    LOG.warning("No response from server for request %r, retrying...", request_id)
+                    continue
+                if not is_overloaded(response) or request_retries == 1:
+                    return response
+                request_retries -= 1
+                delay = backoff_delay(response, attempt)
+                attempt += 1
+                LOG.warning("Server is overloaded, resending request %r in %.3f s", request_id, delay)
+                await asyncio.sleep(delay)
+                future = self._pending[request_id] = loop.create_future()
+        finally:
+            self._pending.pop(request_id, None)
+
+        LOG.error("Server seems to be offline, abandoning")
+        raise SQLiteRxConnectionError("No response after retrying. Abandoning Request")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def cleanup(self):
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        try:
+            self._client.setsockopt(zmq.LINGER, 0)
+            self._client.close()
+        except Exception:
+            LOG.exception("Exception while shutting down AsyncSQLiteClient")
+
+
+class MultiplexedSQLiteClient(CodecNegotiation):
+
+    def __init__(self,
+                 connect_address: str,
+                 use_encryption: bool = False,
+                 curve_dir: str = None,
+                 client_curve_id: str = None,
+                 server_curve_id: str = None,
+                 context=None,
+                 codec: Codec = None,
+                 database: str = None):
+        """
+        A thread-safe client to send query execution requests to a remote :class: `sqlite_rx.server.SQLiteServer`
+
+        Unlike :class: `SQLiteClient`, which opens a `zmq.REQ` socket in every thread using it, a single
+        background I/O thread owns one `zmq.DEALER` socket. Any thread can :meth: `submit` requests, which
+        returns a `concurrent.futures.Future`, or :meth: `execute` them and wait for the reply. Every request
+        carries a request id in its envelope, as with :class: `AsyncSQLiteClient`, so many requests from
+        many threads are in flight on the same connection.
+
+        Args:
+            connect_address: The address and port on which the server will listen for client requests.
+            use_encryption: True means use `CurveZMQ` encryption. False means don't
+            curve_dir: Curve key files directory. Defaults to `~/.curve`
+            client_curve_id: Client curve id. Defaults to "id_client_{}_curve".format(socket.gethostname())
+            server_curve_id: Server curve id. Defaults to "id_server_{}_curve".format(socket.gethostname())
+            context: `zmq.Context`
+            codec: The :class: `sqlite_rx.codec.Codec` deciding how requests are compressed.
+                Defaults to zlib for payloads of 512 bytes or more.
+            database: The name of the database to query on a server hosting a database directory.
+                Defaults to the server's own database.
+
+        Example:
+            >>> with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5000") as client:
+            >>>     futures = [client.submit("SELECT ?", i) for i in range(100)]
+            >>>     results = [future.result() for future in futures]
+
+        """
+        self.client_id = "python@{}_{}_{}".format(socket.gethostname(), os.getpid(), id(self))
+        self._context = context or zmq.Context.instance()
+        self._connect_address = connect_address
+        self._encrypt = use_encryption
+        self.server_curve_id = server_curve_id if server_curve_id else "id_server_{}_curve".format(socket.gethostname())
+        client_curve_id = client_curve_id if client_curve_id else "id_client_{}_curve".format(socket.gethostname())
+        self._keymonkey = KeyMonkey(client_curve_id, destination_dir=curve_dir)
+        self._codec = codec or Codec()
+        self.database = database
+        # Until the server replies with a framed message it may predate the codec header.
+        self._peer = None
+        self._request_ids = itertools.count()
+        # Requests submitted by any thread, waiting for the I/O thread to send them
+        self._submitted = collections.deque()
+        # Requests sent and waiting for a reply, only used by the I/O thread
+        self._pending = {}
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self._ready = threading.Event()
+        self._setup_error = None
+        self._thread = threading.Thread(target=self._run, name='sqlite-rx-client-io', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._setup_error is not None:
+            raise self._setup_error
+
+    def _init_client(self):
+        LOG.info("Initializing MultiplexedSQLiteClient")
+        client = self._context.socket(zmq.DEALER)
+        if self._encrypt:
+            LOG.debug("requests will be encrypted; will load CurveZMQ keys")
+            client = self._keymonkey.setup_secure_client(client, self._connect_address, self.server_curve_id)
+        client.connect(self._connect_address)
+        LOG.info("client %s initialisation completed", self.client_id)
+        return client
+
+    def _wakeup(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except BlockingIOError:
+            # The I/O thread already has wake up calls to read
+            pass
+
+    def _run(self):
+        try:
+            client = self._init_client()
+        except Exception as e:
+            self._setup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        poller = zmq.Poller()
+        poller.register(client, zmq.POLLIN)
+        poller.register(self._wakeup_receiver, zmq.POLLIN)
+        try:
+            while not self._closed:
+                events = dict(poller.poll(self._poll_timeout()))
+                if self._wakeup_receiver.fileno() in events:
+                    self._drain_wakeups()
+                self._send_submitted(client)
+                if events.get(client) == zmq.POLLIN:
+                    self._receive(client)
+                self._retry(client)
+        except zmq.ZMQError:
+            LOG.exception("Exception in the I/O thread of client %s", self.client_id)
+        finally:
+            self._abandon(SQLiteRxConnectionError("The client is closed"))
+            client.setsockopt(zmq.LINGER, 0)
+            client.close()
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_receiver.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _poll_timeout(self):
+        if not self._pending:
+            return None
+        deadline = min(pending[2] for pending in self._pending.values())
+        return max(0, int((deadline - time.monotonic()) * 1000) + 1)
+
+    def _send_submitted(self, client):
+        while self._submitted:
+            request_id, frames, future, request_retries, request_timeout = self._submitted.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                client.send_multipart([request_id, b''] + frames, copy=False)
+            except zmq.ZMQError:
+                LOG.exception("Exception while sending message")
+                future.set_exception(SQLiteRxTransportError("ZMQ send error"))
+                continue
+            self._pending[request_id] = [future, frames, time.monotonic() + request_timeout / 1000,
+                                         request_retries - 1, request_timeout, 0]
+
+    def _receive(self, client):
+        while True:
+            try:
+                frames = client.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return
+            # The reply is the request id, the empty delimiter, the message and its out-of-band blobs
+            request_id = frames[0].bytes
+            pending = self._pending.pop(request_id, None)
+            if pending is None:
+                LOG.debug("Dropping reply to abandoned request %r", request_id)
+                continue
+            try:
+                response = self._decode(frames[2:])
+            except SQLiteRxError as e:
+                pending[0].set_exception(e)
+                continue
+            if is_overloaded(response) and pending[3] > 0:
+                # Resent by _retry once the backoff delay is over
+                delay = backoff_delay(response, pending[5])
+                LOG.warning("Server is overloaded, resending request %r in %.3f s", request_id, delay)
+                pending[2] = time.monotonic() + delay
+                pending[5] += 1
+                self._pending[request_id] = pending
+                continue
+            pending[0].set_result(response)
+
+    def _retry(self, client):
+        now = time.monotonic()
+        for request_id, pending in list(self._pending.items()):
+            future, frames, deadline, request_retries, request_timeout, _ = pending
+            if deadline > now:
+                continue
+            if request_retries == 0:
+                LOG.error("Server seems to be offline, abandoning request %r", request_id)
+                del self._pending[request_id]
+                future.set_exception(SQLiteRxConnectionError("No response after retrying. Abandoning Request"))
+                continue
+            LOG.warning("Resending request %r", request_id)
+            client.send_multipart([request_id, b''] + frames, copy=False)
+            pending[2] = now + request_timeout / 1000
+            pending[3] = request_retries - 1
+
+    def _abandon(self, error: SQLiteRxError):
+        for pending in self._pending.values():
+            pending[0].set_exception(error)
+        self._pending.clear()
+        while self._submitted:
+            future = self._submitted.popleft()[2]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _submit(self, request: dict, request_retries: int, request_timeout: int = None) -> Future:
+        request_timeout = with_deadline(request, request_timeout)
+        frames = self._encode(request)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise SQLiteRxConnectionError("The client is closed")
+            self._submitted.append((str(next(self._request_ids)).encode(), frames, future, request_retries, request_timeout))
+        self._wakeup()
+        return future
+
+    def submit(self,
+               query: str,
+               *args,
+               **kwargs) -> Future:
+        """Send the `query` and the parameters to the remote SQLiteServer without waiting for the response.
+
+        It accepts the same keyword arguments as :meth: `sqlite_rx.client.SQLiteClient.execute` i.e. `execute_many`,
+        `execute_script`, `request_timeout`, `retries` and `result_format`. A request which gets no reply within
+        `request_timeout` ms is sent again, with the same request id, until `retries` attempts are exhausted.
+        A request which an overloaded server turned away is sent again after the delay the server asked for,
+        doubled with every attempt.
+
+        Args:
+            query: A valid SQL query or SQL script
+
+        Returns:
+            A `concurrent.futures.Future` of the response. It raises
+            :class: `sqlite_rx.exception.SQLiteRxConnectionError` if there is no response after retrying.
+            The future can be cancelled until the I/O thread sends the request.
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxConnectionError: If the client is closed
+            sqlite_rx.exception.SQLiteRxCompressionError: An error while compressing the request body using `zlib`
+            sqlite_rx.exception.SQLiteRxSerializationError: An error while serializing the request body using `msgpack`
+
+        """
+        LOG.info("Submitting query %s for client %s", query, self.client_id)
+
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        execute_many = kwargs.pop('execute_many', False)
+        execute_script = kwargs.pop('execute_script', False)
+        request_timeout = kwargs.pop('request_timeout', None)
+        result_format = kwargs.pop('result_format', 'rows')
+
+        if execute_script and execute_many:
+            raise ValueError("Both `execute_script` and `execute_many` cannot be True")
+
+        if result_format not in RESULT_FORMATS:
+            raise ValueError("`result_format` should be one of {}".format(RESULT_FORMATS))
+
+        request = {
+            "client_id": self.client_id,
+            "query": query,
+            "params": args,
+            "execute_many": execute_many,
+            "execute_script": execute_script
+        }
+        if result_format != 'rows':
+            request['result_format'] = result_format
+        return self._submit(request, request_retries, request_timeout)
+
+    def execute(self,
+                query: str,
+                *args,
+                **kwargs) -> dict:
+        """Like :meth: `sqlite_rx.client.SQLiteClient.execute`. Waits for the future returned by :meth: `submit`"""
+        return self.submit(query, *args, **kwargs).result()
+
+    def submit_batch(self,
+                     statements: List[Union[str, Sequence]],
+                     transactional: bool = True,
+                     **kwargs) -> Future:
+        """Like :meth: `sqlite_rx.client.SQLiteClient.execute_batch`, returning a `concurrent.futures.Future`
+        of the response"""
+        request_retries = kwargs.pop('retries', REQUEST_RETRIES)
+        request_timeout = kwargs.pop('request_timeout', None)
+        batch = []
+        for statement in statements:
+            if isinstance(statement, str):
+                batch.append((statement, ()))
+            else:
+                query, params = statement
+                batch.append((query, params))
+        request = {
+            "client_id": self.client_id,
+            "batch": batch,
+            "transactional": transactional
+        }
+        return self._submit(request, request_retries, request_timeout)
+
+    def execute_batch(self,
+                      statements: List[Union[str, Sequence]],
+                      transactional: bool = True,
+                      **kwargs) -> dict:
+        """Like :meth: `sqlite_rx.client.SQLiteClient.execute_batch`"""
+        return self.submit_batch(statements, transactional=transactional, **kwargs).result()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests submitted and not answered yet"""
+        return len(self._submitted) + len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def cleanup(self):
+        """Stop the I/O thread and close the socket. Requests still waiting for a reply fail with
+        :class: `sqlite_rx.exception.SQLiteRxConnectionError`"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup()
+        self._thread.join()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
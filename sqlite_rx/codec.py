@@ -0,0 +1,333 @@
+import logging
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from typing import Callable, List, Sequence, Tuple
+
+import msgpack
+from sqlite_rx.exception import SQLiteRxCompressionError
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['Codec', 'Peer', 'build_dictionary', 'available_compressions', 'pack_columns', 'ext_hook', 'blob_hook',
+           'message_size']
+
+# Codec ids carried in the message header
+NONE = 0
+ZLIB = 1
+ZLIB_DICT = 2
+LZ4 = 3
+ZSTD = 4
+
+COMPRESSIONS = {
+    'none': NONE,
+    'zlib': ZLIB,
+    'lz4': LZ4,
+    'zstd': ZSTD,
+}
+
+# 0xc1 is never used by msgpack and a zlib stream starts with 0x78, so a message starting
+# with this byte is unambiguously a framed message. Anything else is a legacy zlib message.
+MARKER = b'\xc1'
+
+DEFAULT_THRESHOLD = 512
+
+# Bit of the ``accept`` bitmask telling that a peer reads blobs sent as out-of-band frames
+OUT_OF_BAND = 7
+
+# Out-of-band frames are opt-in, since the blobs they carry are returned as a memoryview rather than bytes
+DEFAULT_FRAME_THRESHOLD = 0
+
+# Threshold to opt in with: zmq copies smaller frames anyway
+FRAME_THRESHOLD = 64 * 1024
+
+# msgpack extension types of columnar results. The data is little-endian.
+INT64_ARRAY = 1
+FLOAT64_ARRAY = 2
+
+# msgpack extension type of a blob sent as an out-of-band frame. The data is the index of the frame.
+BLOB_FRAME = 3
+
+_TYPECODES = {
+    INT64_ARRAY: 'q',
+    FLOAT64_ARRAY: 'd',
+}
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+# What a peer can decode. A legacy peer only understands zlib streams without header.
+Peer = namedtuple('Peer', ('legacy', 'accept', 'dict_id'))
+
+LEGACY_PEER = Peer(legacy=True, accept=1 << ZLIB, dict_id=None)
+
+
+def available_compressions() -> List[str]:
+    """Names of the compressions which can be used in this interpreter"""
+    names = ['none', 'zlib']
+    if lz4 is not None:
+        names.append('lz4')
+    if zstandard is not None:
+        names.append('zstd')
+    return names
+
+
+def _pack_array(code: int, values: array) -> msgpack.ExtType:
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return msgpack.ExtType(code, values.tobytes())
+
+
+def pack_column(values: Sequence):
+    """Pack the values of one result column.
+
+    A column holding only integers becomes an int64 array and a column holding only floats
+    becomes a float64 array. Any other column, e.g. TEXT, BLOB or one with NULLs, stays a list.
+
+    """
+    try:
+        return _pack_array(INT64_ARRAY, array('q', values))
+    except (TypeError, OverflowError):
+        pass
+    if all(type(value) is float for value in values):
+        return _pack_array(FLOAT64_ARRAY, array('d', values))
+    return list(values)
+
+
+def pack_columns(column_count: int, rows: List[Sequence]) -> list:
+    """Transpose result rows into one packed column per result column"""
+    if not rows:
+        return [[] for _ in range(column_count)]
+    return [pack_column(values) for values in zip(*rows)]
+
+
+def ext_hook(code: int, data: bytes):
+    """msgpack ``ext_hook`` turning packed columns back into :class: `array.array`"""
+    typecode = _TYPECODES.get(code)
+    if typecode is None:
+        return msgpack.ExtType(code, data)
+    values = array(typecode)
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def blob_hook(frames: Sequence) -> Callable:
+    """msgpack ``ext_hook`` resolving blobs sent as out-of-band ``frames`` and packed columns"""
+    def hook(code: int, data: bytes):
+        if code == BLOB_FRAME:
+            index, = struct.unpack('!I', data)
+            return frames[index]
+        return ext_hook(code, data)
+    return hook
+
+
+def message_size(parts: Sequence) -> int:
+    """Number of bytes of a multipart message"""
+    return sum(len(part) for part in parts)
+
+
+def build_dictionary(samples: List[bytes], size: int = 32 * 1024) -> bytes:
+    """Build a preset zlib dictionary from typical payloads, e.g. serialized requests and replies.
+
+    zlib gives priority to the end of the dictionary, so the most frequent samples are put last.
+
+    Args:
+        samples: Typical payloads
+        size: Maximum size of the dictionary. zlib uses at most 32KB.
+
+    """
+    counts = {}
+    for sample in samples:
+        counts[sample] = counts.get(sample, 0) + 1
+    dictionary = b''.join(sorted(counts, key=counts.get))
+    return dictionary[-size:]
+
+
+class Codec:
+
+    def __init__(self,
+                 compression: str = 'zlib',
+                 level: int = -1,
+                 threshold: int = DEFAULT_THRESHOLD,
+                 zdict: bytes = None,
+                 frame_threshold: int = DEFAULT_FRAME_THRESHOLD):
+        """Compresses and decompresses the messages exchanged between clients and servers.
+
+        Framed messages start with a small header: the marker byte, the codec id of the payload,
+        the bitmask of codec ids the sender can decode and, when the sender has a preset
+        dictionary, the adler32 checksum identifying it. The receiver replies with the sender's
+        preferred compression when the peer can decode it, otherwise with zlib.
+
+        Messages without the header are plain zlib streams sent by, or to, peers which predate
+        the header and they are handled as before.
+
+        Blobs of ``frame_threshold`` bytes or more are left out of the message when the peer reads
+        out-of-band frames. They follow the message as frames of their own, which are neither copied
+        into the msgpack payload nor compressed, and the payload refers to them by index.
+
+        Args:
+            compression: The preferred compression, one of ``none``, ``zlib``, ``lz4`` and ``zstd``.
+                ``lz4`` and ``zstd`` require the `lz4` and `zstandard` packages.
+            level: The compression level. -1 means the default level of the compression
+            threshold: Payloads smaller than this many bytes are sent uncompressed
+            zdict: A preset zlib dictionary. Both peers need the same dictionary to make use of it.
+            frame_threshold: Blobs of this many bytes or more are sent as out-of-band frames, e.g.
+                :data: `FRAME_THRESHOLD`. Both peers must opt in, and the blobs they receive that way are
+                a `memoryview` of the frame. 0, the default, sends every blob inside the message.
+
+        Raises:
+            ValueError: If the compression is unknown or not installed
+
+        """
+        if compression not in available_compressions():
+            raise ValueError("Compression {} is not available. Choose from {}".format(compression,
+                                                                                     available_compressions()))
+        self.compression = compression
+        self.level = level
+        self.threshold = threshold
+        self.zdict = zdict
+        self.dict_id = zlib.adler32(zdict) if zdict else None
+        self.frame_threshold = frame_threshold
+
+        self.accept = 0
+        for name in available_compressions():
+            self.accept |= 1 << COMPRESSIONS[name]
+        if zdict:
+            self.accept |= 1 << ZLIB_DICT
+        if frame_threshold:
+            self.accept |= 1 << OUT_OF_BAND
+        self._header_tail = struct.pack('!BI', self.accept, self.dict_id) if zdict else struct.pack('!B', self.accept)
+
+    def _choose(self, size: int, peer: Peer) -> int:
+        if size < self.threshold:
+            return NONE
+        preferred = COMPRESSIONS[self.compression]
+        if preferred == ZLIB and self.zdict and peer.dict_id == self.dict_id:
+            return ZLIB_DICT
+        if peer.accept & (1 << preferred):
+            return preferred
+        return ZLIB
+
+    def _compress(self, codec: int, payload: bytes) -> bytes:
+        if codec == NONE:
+            return payload
+        if codec == ZLIB:
+            return zlib.compress(payload, self.level)
+        if codec == ZLIB_DICT:
+            compressor = zlib.compressobj(self.level, zdict=self.zdict)
+            return compressor.compress(payload) + compressor.flush()
+        if codec == LZ4:
+            return lz4.frame.compress(payload, compression_level=max(self.level, 0))
+        return zstandard.ZstdCompressor(level=self.level if self.level > 0 else 3).compress(payload)
+
+    def _decompress(self, codec: int, payload: bytes) -> bytes:
+        if codec == NONE:
+            return payload
+        if codec == ZLIB:
+            return zlib.decompress(payload)
+        if codec == ZLIB_DICT:
+            if not self.zdict:
+                raise SQLiteRxCompressionError("Received a message compressed with an unknown dictionary")
+            decompressor = zlib.decompressobj(zdict=self.zdict)
+            return decompressor.decompress(payload) + decompressor.flush()
+        if codec == LZ4 and lz4 is not None:
+            return lz4.frame.decompress(payload)
+        if codec == ZSTD and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompress(payload)
+        raise SQLiteRxCompressionError("Codec {} is not available".format(codec))
+
+    def encode(self, payload: bytes, peer: Peer = LEGACY_PEER) -> bytes:
+        """Frame and compress ``payload`` for ``peer``
+
+        Args:
+            payload: The msgpack serialized message
+            peer: What the receiver can decode, as returned by :meth: `decode` for its last message
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxCompressionError: If the compression fails
+
+        """
+        try:
+            if peer.legacy:
+                return zlib.compress(payload, self.level)
+            codec = self._choose(len(payload), peer)
+            return MARKER + struct.pack('!B', codec) + self._header_tail + self._compress(codec, payload)
+        except SQLiteRxCompressionError:
+            raise
+        except Exception as e:
+            raise SQLiteRxCompressionError("Compression error: {}".format(e))
+
+    def decode(self, data: bytes) -> Tuple[bytes, Peer]:
+        """Decompress a message
+
+        Returns:
+            A tuple ``(payload, peer)`` where ``peer`` describes what the sender can decode
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxCompressionError: If the message cannot be decompressed
+
+        """
+        try:
+            if data[:1] != MARKER:
+                return zlib.decompress(data), LEGACY_PEER
+            codec, accept = struct.unpack_from('!BB', data, 1)
+            offset = 3
+            dict_id = None
+            if accept & (1 << ZLIB_DICT):
+                dict_id, = struct.unpack_from('!I', data, offset)
+                offset += 4
+            return self._decompress(codec, data[offset:]), Peer(legacy=False, accept=accept, dict_id=dict_id)
+        except SQLiteRxCompressionError:
+            raise
+        except Exception as e:
+            raise SQLiteRxCompressionError("Decompression error: {}".format(e))
+
+    def out_of_band(self, peer: Peer) -> bool:
+        """Returns True if blobs can be sent to ``peer`` as out-of-band frames"""
+        return bool(self.frame_threshold) and not peer.legacy and bool(peer.accept & (1 << OUT_OF_BAND))
+
+    def detach(self, values: Sequence, frames: List) -> Sequence:
+        """Move the blobs of ``values`` of :attr: `frame_threshold` bytes or more to ``frames``.
+
+        Returns:
+            ``values`` itself if it holds no such blob, otherwise a list where every moved blob is
+            replaced by a reference to its frame
+
+        """
+        threshold = self.frame_threshold
+        detached = None
+        for index, value in enumerate(values):
+            if isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= threshold:
+                if detached is None:
+                    detached = list(values)
+                detached[index] = msgpack.ExtType(BLOB_FRAME, struct.pack('!I', len(frames)))
+                frames.append(value)
+        return values if detached is None else detached
+
+    def negotiate(self, peer: Peer, request: dict) -> Peer:
+        """A client sends its first requests without header, since the server may predate it, and
+        announces what it can decode in the request. Returns the peer to reply to.
+
+        """
+        if peer.legacy and 'codec' in request:
+            accept, dict_id = request['codec']
+            return Peer(legacy=False, accept=accept, dict_id=dict_id)
+        return peer
+
+    def announcement(self) -> list:
+        """The ``codec`` entry a client adds to its requests until the server replied with a header"""
+        return [self.accept, self.dict_id]
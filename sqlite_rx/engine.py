@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import logging
+from typing import Callable, List
+
+import zmq
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover
+    uvloop = None
+
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['ENGINES', 'AsyncioStream', 'new_event_loop']
+
+# Event loops on which a server process can run
+ENGINES = ('tornado', 'asyncio')
+
+# Messages received from a socket before the other sockets get their turn
+MAX_BATCH = 256
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """A new asyncio event loop, from `uvloop` when it is installed"""
+    if uvloop is not None:
+        LOG.info("uvloop version %s", uvloop.__version__)
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class AsyncioStream:
+
+    def __init__(self, socket: zmq.Socket, loop: asyncio.AbstractEventLoop = None):
+        """Receive and send the messages of ``socket`` on an asyncio loop.
+
+        It implements the part of `zmq.eventloop.zmqstream.ZMQStream` used by the server, so that
+        :class: `sqlite_rx.server.QueryStreamHandler` and :class: `sqlite_rx.server.QueryRouter` run on
+        either loop, but it reads the socket from a reader callback of the loop itself. When the socket
+        is readable, the waiting messages are received and handed to the callback in one go.
+
+        The file descriptor of a zmq socket is edge triggered and any operation on the socket may
+        consume the edge, so the socket events are checked again after every send.
+
+        Args:
+            socket: A `zmq.Socket`
+            loop: Defaults to the current event loop
+
+        """
+        self.socket = socket
+        self._loop = loop or asyncio.get_event_loop()
+        self._callback = None
+        self._copy = True
+        # Messages the socket could not take yet, sent in order once it is writable
+        self._queue = collections.deque()
+        self._scheduled = False
+        self._fd = socket.getsockopt(zmq.FD)
+        self._loop.add_reader(self._fd, self._handle_events)
+
+    def on_recv(self, callback: Callable[[List], None], copy: bool = True):
+        """Call ``callback`` with every multipart message received"""
+        self._callback = callback
+        self._copy = copy
+        self._schedule()
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon(self._handle_events)
+
+    def _handle_events(self):
+        self._scheduled = False
+        if self.socket.closed:
+            return
+        events = self.socket.getsockopt(zmq.EVENTS)
+        while self._queue and events & zmq.POLLOUT:
+            message, flags, copy = self._queue[0]
+            try:
+                self.socket.send_multipart(message, zmq.NOBLOCK | flags, copy=copy)
+            except zmq.Again:
+                break
+            except zmq.ZMQError:
+                LOG.exception("Exception while sending a message")
+            self._queue.popleft()
+            events = self.socket.getsockopt(zmq.EVENTS)
+        if self._callback is None:
+            return
+        for _ in range(MAX_BATCH):
+            if not events & zmq.POLLIN:
+                return
+            try:
+                message = self.socket.recv_multipart(zmq.NOBLOCK, copy=self._copy)
+            except zmq.Again:
+                return
+            try:
+                self._callback(message)
+            except Exception:
+                LOG.exception("Uncaught exception while handling a message")
+            if self.socket.closed:
+                return
+            events = self.socket.getsockopt(zmq.EVENTS)
+        # Let the other sockets have their turn before receiving more
+        self._schedule()
+
+    def send_multipart(self, message: List, flags: int = 0, copy: bool = True):
+        if not self._queue:
+            try:
+                self.socket.send_multipart(message, zmq.NOBLOCK | flags, copy=copy)
+            except zmq.Again:
+                self._queue.append((message, flags, copy))
+        else:
+            self._queue.append((message, flags, copy))
+        if self._queue or self.socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            self._schedule()
+
+    def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._callback = None
+        self._queue.clear()
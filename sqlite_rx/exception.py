@@ -26,5 +26,34 @@ class SQLiteRxCompressionError(SQLiteRxError):
 class SQLiteRxConnectionError(SQLiteRxError):
     pass
 
+
+class SQLiteRxQueryError(SQLiteRxError):
+    pass
+
+
+class SQLiteRxUnknownStatementError(SQLiteRxError):
+    pass
+
+
+class SQLiteRxTimeoutError(SQLiteRxQueryError):
+    pass
+
+
+class SQLiteRxOverloadedError(SQLiteRxQueryError):
+    pass
+
+
+class SQLiteRxUnknownDatabaseError(SQLiteRxQueryError):
+    pass
+
+
 class SQLiteRxBackUpError(SQLiteRxError):
-    pass
\ No newline at end of file
+    pass
+
+
+class SQLiteRxWorkerSetupError(SQLiteRxError):
+    pass
+
+
+class SQLiteRxReplicationError(SQLiteRxError):
+    pass
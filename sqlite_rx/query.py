@@ -0,0 +1,130 @@
+import hashlib
+import re
+
+
+__all__ = ['fingerprint', 'is_deterministic', 'is_plain_write', 'is_read_only', 'is_read_only_request', 'statement_id']
+
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'")
+
+_READ_KEYWORDS = {'SELECT', 'VALUES', 'WITH', 'EXPLAIN'}
+
+_PLAIN_WRITE_KEYWORDS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+_WRITE_KEYWORDS = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|ATTACH|DETACH|"
+                             r"VACUUM|REINDEX|ANALYZE|PRAGMA|BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b",
+                             re.IGNORECASE)
+
+
+_NON_DETERMINISTIC = re.compile(r"\b(RANDOM|RANDOMBLOB|CHANGES|TOTAL_CHANGES|LAST_INSERT_ROWID|"
+                                r"CURRENT_TIME|CURRENT_DATE|CURRENT_TIMESTAMP)\b|'NOW'",
+                                re.IGNORECASE)
+
+
+# Comments, blob literals and string literals, matched in a single pass so that quotes inside
+# comments and comment markers inside strings are not mistaken for each other.
+_TOKENS = re.compile(r"(--[^\n]*|/\*.*?\*/)|(\b[xX]'[0-9a-fA-F]*'|'(?:[^']|'')*')", re.DOTALL)
+
+_NUMBERS_AND_PARAMETERS = re.compile(r"(?<![\w.])(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)(?![\w.])|"
+                                     r"\?\d*|[:@$][A-Za-z_]\w*")
+
+_LIST = r"\(\?(?:, \?)*\)"
+
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+
+_VALUES_ROWS = re.compile(r"({0})(?:, {0})+".format(_LIST))
+
+
+def fingerprint(query: str) -> str:
+    """Normalize ``query`` into the shape shared by all its executions.
+
+    Comments are removed, literals and parameters become ``?``, whitespace is collapsed, ``IN`` lists
+    become ``IN (...)`` and the rows of a multi-row ``VALUES`` collapse into one, e.g.
+    ``SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'`` becomes
+    ``SELECT * FROM t WHERE id IN (...) AND name = ?``
+
+    """
+    normalized = _TOKENS.sub(lambda match: ' ' if match.group(1) else '?', query)
+    normalized = _NUMBERS_AND_PARAMETERS.sub('?', normalized)
+    normalized = ' '.join(normalized.split())
+    normalized = re.sub(r"\s*,\s*", ", ", normalized)
+    normalized = re.sub(r"\(\s+", "(", normalized)
+    normalized = re.sub(r"\s+\)", ")", normalized)
+    normalized = _IN_LIST.sub(lambda match: match.group(0)[:2] + " (...)", normalized)
+    normalized = _VALUES_ROWS.sub(r"\1", normalized)
+    return normalized.rstrip('; ')
+
+
+def is_deterministic(query: str) -> bool:
+    """Returns False if ``query`` uses a builtin function whose result changes between executions,
+    e.g. ``random()`` or ``datetime('now')``. Application defined functions are not known.
+
+    """
+    return _NON_DETERMINISTIC.search(query) is None
+
+
+def is_read_only(query: str) -> bool:
+    """Conservatively decide whether ``query`` only reads from the database.
+
+    Comments and string literals are stripped before looking at the statement. A statement
+    is read-only when it starts with ``SELECT``, ``VALUES``, ``WITH`` or ``EXPLAIN`` and
+    does not contain any keyword which may modify the database. When in doubt the
+    statement is classified as a write.
+
+    Args:
+        query: A single SQL statement
+
+    Returns:
+        True if the statement can safely run on a read-only connection
+
+    """
+    statement = _LITERALS.sub("''", _COMMENTS.sub(' ', query)).strip()
+    if not statement:
+        return False
+    keyword = statement.split(None, 1)[0].upper()
+    if keyword not in _READ_KEYWORDS:
+        return False
+    return _WRITE_KEYWORDS.search(statement) is None
+
+
+def is_plain_write(query: str) -> bool:
+    """Returns True if ``query`` is an ``INSERT``, ``UPDATE``, ``DELETE`` or ``REPLACE`` statement.
+
+    Such statements can run inside a transaction opened by the server, unlike e.g. ``VACUUM``
+    or the transaction control statements.
+
+    """
+    statement = _COMMENTS.sub(' ', query).strip()
+    if not statement:
+        return False
+    return statement.split(None, 1)[0].upper() in _PLAIN_WRITE_KEYWORDS
+
+
+def is_read_only_request(request: dict) -> bool:
+    """Returns True if the client request can be served by a read-only connection.
+
+    Scripts and ``execute_many`` requests are always treated as writes.
+
+    """
+    if request.get('execute_script') or request.get('execute_many'):
+        return False
+    query = request.get('query')
+    if query is None and 'statement_id' in request:
+        # Prepared statements are classified by the client when the statement is prepared.
+        # A wrong hint is harmless because reader connections refuse writes.
+        return bool(request.get('read_only'))
+    if not isinstance(query, str):
+        return False
+    return is_read_only(query)
+
+
+def statement_id(query: str) -> str:
+    """Returns the handle under which ``query`` is registered as a prepared statement.
+
+    The id only depends on the SQL text so every server and worker process derives the same
+    handle for the same statement.
+
+    """
+    return hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
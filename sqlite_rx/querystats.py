@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import List
+
+from sqlite_rx.query import fingerprint
+
+__all__ = ['QueryStats']
+
+# SQL texts whose fingerprint is remembered, to avoid normalizing the same text again
+MAX_MEMOIZED_FINGERPRINTS = 4096
+
+ORDER_BY = ('total_time', 'mean_time', 'max_time', 'calls', 'rows', 'bytes', 'errors', 'cache_hits')
+
+
+class _Entry:
+
+    __slots__ = ('calls', 'errors', 'total_time', 'min_time', 'max_time', 'rows', 'bytes', 'cache_hits')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.cache_hits = 0
+
+
+class QueryStats:
+
+    def __init__(self, max_entries: int = 1000):
+        """Aggregated statistics per query fingerprint, in the style of ``pg_stat_statements``.
+
+        Queries are grouped by their :func: `sqlite_rx.query.fingerprint`, so executions which only
+        differ by their literals or parameters add up. When the table is full, the 10% of the
+        fingerprints with the fewest calls are evicted.
+
+        Args:
+            max_entries: Maximum number of fingerprints
+
+        """
+        self.max_entries = max_entries
+        self._entries = {}
+        self._fingerprints = OrderedDict()
+        self.evicted = 0
+        self.since = time.time()
+
+    def fingerprint(self, query: str) -> str:
+        normalized = self._fingerprints.get(query)
+        if normalized is None:
+            normalized = self._fingerprints[query] = fingerprint(query)
+            if len(self._fingerprints) > MAX_MEMOIZED_FINGERPRINTS:
+                self._fingerprints.popitem(last=False)
+        return normalized
+
+    def _entry(self, query: str) -> _Entry:
+        key = self.fingerprint(query)
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            entry = self._entries[key] = _Entry()
+        return entry
+
+    def _evict(self):
+        count = max(1, self.max_entries // 10)
+        for key in sorted(self._entries, key=lambda key: self._entries[key].calls)[:count]:
+            del self._entries[key]
+        self.evicted += count
+
+    def record(self, query: str, duration: float, rows: int = 0, error: bool = False):
+        """Account for one execution of ``query``"""
+        entry = self._entry(query)
+        entry.calls += 1
+        entry.total_time += duration
+        if entry.min_time is None or duration < entry.min_time:
+            entry.min_time = duration
+        if duration > entry.max_time:
+            entry.max_time = duration
+        entry.rows += rows
+        if error:
+            entry.errors += 1
+
+    def add_bytes(self, query: str, size: int):
+        """Account for the size of a reply sent for ``query``"""
+        self._entry(query).bytes += size
+
+    def cache_hit(self, query: str, size: int):
+        """Account for a reply to ``query`` served from the result cache"""
+        entry = self._entry(query)
+        entry.cache_hits += 1
+        entry.bytes += size
+
+    def reset(self):
+        self._entries.clear()
+        self.evicted = 0
+        self.since = time.time()
+
+    def top(self, order_by: str = 'total_time', limit: int = 20) -> List[dict]:
+        """The fingerprints with the highest ``order_by``, one dictionary each. Times are in seconds.
+
+        Raises:
+            ValueError: If ``order_by`` is not one of :data: `ORDER_BY`
+
+        """
+        if order_by not in ORDER_BY:
+            raise ValueError("Cannot order query stats by {}. Choose from {}".format(order_by, ORDER_BY))
+        rows = []
+        for query, entry in self._entries.items():
+            rows.append({
+                "query": query,
+                "calls": entry.calls,
+                "errors": entry.errors,
+                "total_time": entry.total_time,
+                "mean_time": entry.total_time / entry.calls if entry.calls else 0.0,
+                "min_time": entry.min_time or 0.0,
+                "max_time": entry.max_time,
+                "rows": entry.rows,
+                "bytes": entry.bytes,
+                "cache_hits": entry.cache_hits
+            })
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "evicted": self.evicted, "since": self.since}
@@ -0,0 +1,572 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, List, Optional, Union
+from urllib.parse import urlsplit
+
+import msgpack
+import zmq
+from tornado import ioloop
+from zmq.eventloop import zmqstream
+
+from sqlite_rx.exception import (SQLiteRxConnectionError, SQLiteRxError, SQLiteRxReplicationError,
+                                 SQLiteRxTransportError)
+from sqlite_rx.query import is_deterministic, is_read_only
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['Follower', 'ReplicationLog', 'setup_replication']
+
+# Table holding the sequence number of the last transaction committed (on the primary) or applied
+# (on a follower). It is written in the same transaction as the statements, so any backup of the
+# database tells which transactions it holds.
+SEQUENCE_TABLE = '_sqlite_rx_replication'
+
+# Transactions kept in memory by the primary for followers catching up
+REPLICATION_LOG_SIZE = 10000
+
+# Seconds between two heartbeats of the primary, which let idle followers notice missed transactions
+HEARTBEAT_INTERVAL = 1.0
+
+# Transactions fetched per catch-up request
+CATCH_UP_BATCH = 1000
+
+# Timeout in milliseconds of the requests made by followers to the primary
+PRIMARY_REQUEST_TIMEOUT = 1000
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+_RETURNING = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+
+_TRANSACTION_KEYWORDS = {'BEGIN', 'COMMIT', 'END', 'ROLLBACK'}
+
+_SAVEPOINT_KEYWORDS = {'SAVEPOINT', 'RELEASE'}
+
+# Statements which are not replicated: they can't run inside a transaction or only affect the connection
+_LOCAL_KEYWORDS = {'ATTACH', 'DETACH', 'PRAGMA', 'VACUUM'}
+
+_PROTECTED_ACTIONS = {
+    sqlite3.SQLITE_ALTER_TABLE,
+    sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_DROP_TABLE,
+    sqlite3.SQLITE_INSERT,
+    sqlite3.SQLITE_UPDATE,
+}
+
+
+def statement_kind(query: str) -> Optional[str]:
+    """How a statement executed on the primary is replicated.
+
+    Returns:
+        ``'write'`` for statements which may modify the database, ``'savepoint'`` for ``SAVEPOINT``,
+        ``RELEASE`` and ``ROLLBACK TO``, which are replicated within their transaction, and None for
+        reads and the statements which are not replicated, i.e. ``BEGIN``, ``COMMIT``, ``ROLLBACK``,
+        ``PRAGMA``, ``VACUUM``, ``ATTACH`` and ``DETACH``.
+
+    """
+    if is_read_only(query):
+        return None
+    words = _COMMENTS.sub(' ', query).split(None, 3)
+    if not words:
+        return None
+    keyword = words[0].upper()
+    if keyword == 'ROLLBACK' and 'TO' in (word.upper() for word in words[1:3]):
+        return 'savepoint'
+    if keyword in _TRANSACTION_KEYWORDS or keyword in _LOCAL_KEYWORDS:
+        return None
+    if keyword in _SAVEPOINT_KEYWORDS:
+        return 'savepoint'
+    return 'write'
+
+
+def ensure_sequence_table(connection: sqlite3.Connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS {} "
+                       "(id INTEGER PRIMARY KEY CHECK (id = 0), sequence INTEGER NOT NULL, time REAL)"
+                       .format(SEQUENCE_TABLE))
+    connection.execute("INSERT OR IGNORE INTO {} VALUES (0, 0, NULL)".format(SEQUENCE_TABLE))
+
+
+def read_sequence(connection: sqlite3.Connection) -> tuple:
+    """The sequence number and commit time of the last transaction held by the database"""
+    try:
+        row = connection.execute("SELECT sequence, time FROM {} WHERE id = 0".format(SEQUENCE_TABLE)).fetchone()
+    except sqlite3.OperationalError:
+        return 0, None
+    return tuple(row) if row else (0, None)
+
+
+class _Guard:
+
+    def __init__(self, authorizer: Callable):
+        """Wraps the authorizer to keep clients from writing to the sequence table, while letting
+        the replication write to it whatever the authorization config"""
+        self._authorizer = authorizer
+        self.internal = False
+
+    def __call__(self, action: int, arg1, arg2, dbname, source) -> int:
+        if self.internal:
+            return sqlite3.SQLITE_OK
+        if action in _PROTECTED_ACTIONS and SEQUENCE_TABLE in (str(arg1).lower(), str(arg2).lower()):
+            return sqlite3.SQLITE_DENY
+        return self._authorizer(action, arg1, arg2, dbname, source)
+
+
+class ReplicationLog:
+
+    def __init__(self, publisher: zmq.Socket, address: str, max_entries: int = REPLICATION_LOG_SIZE):
+        """Publishes the writes committed by a primary :class: `sqlite_rx.server.SQLiteServer` to its followers.
+
+        Writes are published per transaction, in commit order, each with the next sequence number,
+        as a msgpack encoded ``{"sequence": ..., "time": ..., "statements": [[query, params, mode], ...]}``
+        on a `zmq.PUB` socket. The sequence number is stored in the database in the same transaction,
+        by running statements which are not already part of a transaction inside one of their own.
+        The last ``max_entries`` transactions are kept in memory so that followers which missed some
+        can fetch them with the ``replication`` admin request. A heartbeat with the last sequence
+        number is published every second.
+
+        Scripts can't be part of a transaction and their sequence number is stored right after them.
+
+        Writes are replicated as SQL, so a write using a builtin function whose result changes between
+        executions, e.g. ``random()``, ``datetime('now')`` or ``last_insert_rowid()``, would store different
+        values on the followers. Such writes are refused; their values can be bound as parameters instead.
+        Application defined functions are not known and are the caller's responsibility.
+
+        Args:
+            publisher: The bound `zmq.PUB` socket
+            address: The address ``publisher`` is bound to, reported to followers
+            max_entries: Transactions kept for followers catching up
+
+        """
+        self.address = address
+        self.sequence = 0
+        self.time = None
+        self._publisher = publisher
+        self._log = deque(maxlen=max_entries)
+        self._pending = []
+        self._connection = None
+        self._guard = None
+        self._heartbeat = None
+
+    def attach(self, connection: sqlite3.Connection, authorizer: Callable) -> Callable:
+        """Use ``connection``, which must not have an authorizer yet. Returns the authorizer to set on it."""
+        self._connection = connection
+        ensure_sequence_table(connection)
+        self.sequence, self.time = read_sequence(connection)
+        LOG.info("Replication log starting at sequence %s, publishing on %s", self.sequence, self.address)
+        self._guard = _Guard(authorizer)
+        return self._guard
+
+    def start(self):
+        """Start the heartbeat on the current IOLoop"""
+        self._heartbeat = ioloop.PeriodicCallback(self.heartbeat, HEARTBEAT_INTERVAL * 1000)
+        self._heartbeat.start()
+
+    def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+
+    def heartbeat(self):
+        self._publish({"sequence": self.sequence, "time": self.time, "heartbeat": True})
+
+    def _publish(self, entry: dict):
+        try:
+            self._publisher.send(msgpack.dumps(entry), zmq.NOBLOCK)
+        except zmq.ZMQError:
+            LOG.exception("Could not publish replication entry %s", entry.get('sequence'))
+
+    def _persist(self, sequence: int):
+        self._guard.internal = True
+        try:
+            self._connection.execute("UPDATE {} SET sequence = ?, time = ? WHERE id = 0".format(SEQUENCE_TABLE),
+                                     (sequence, time.time()))
+        finally:
+            self._guard.internal = False
+
+    @contextmanager
+    def write(self, query: str, params, mode: str):
+        """Record ``query`` if it executes successfully inside this context.
+
+        A write statement executed outside of a transaction runs inside one opened here, which also
+        stores its sequence number. Statements returning rows are left to sqlite's own transaction,
+        which stays open until their rows are fetched and also covers the sequence number.
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxReplicationError: If the write is not deterministic
+
+        """
+        kind = 'script' if mode == 'script' else statement_kind(query)
+        if kind is None:
+            yield
+            return
+        if not is_deterministic(query):
+            raise SQLiteRxReplicationError("Writes using non-deterministic functions can't be replicated, "
+                                           "bind their values as parameters instead")
+        connection = self._connection
+        own = kind == 'write' and not connection.in_transaction and _RETURNING.search(query) is None
+        if own:
+            connection.execute('BEGIN')
+        try:
+            yield
+            if kind == 'script':
+                # The script committed the transaction it may have found open
+                self.flush()
+            self._pending.append([query, params, mode])
+            if kind != 'savepoint':
+                self._persist(self.sequence + 1)
+            if own:
+                connection.execute('COMMIT')
+        except Exception:
+            if own and connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        finally:
+            self.flush()
+
+    def flush(self):
+        """Publish the recorded statements once their transaction has ended, if it was committed"""
+        if not self._pending or self._connection.in_transaction:
+            return
+        pending, self._pending = self._pending, []
+        self._guard.internal = True
+        try:
+            sequence, commit_time = read_sequence(self._connection)
+        finally:
+            self._guard.internal = False
+        if sequence != self.sequence + 1:
+            LOG.debug("Transaction of %s statements was rolled back", len(pending))
+            return
+        self.sequence, self.time = sequence, commit_time
+        entry = {"sequence": sequence, "time": commit_time, "statements": pending}
+        self._log.append(entry)
+        self._publish(entry)
+
+    def entries(self, since: int, limit: int = CATCH_UP_BATCH) -> Optional[List[dict]]:
+        """The transactions committed after ``since``, or None if some of them are no longer kept"""
+        oldest = self._log[0]['sequence'] if self._log else self.sequence + 1
+        if since + 1 < oldest:
+            return None
+        return list(islice(self._log, max(since + 1 - oldest, 0), max(since + 1 - oldest, 0) + limit))
+
+    def status(self, message: dict) -> dict:
+        status = {
+            "role": "primary",
+            "sequence": self.sequence,
+            "time": self.time,
+            "publish_address": self.address,
+            "oldest": self._log[0]['sequence'] if self._log else self.sequence + 1
+        }
+        if message.get('since') is not None:
+            status['entries'] = self.entries(message['since'], message.get('limit', CATCH_UP_BATCH))
+        return status
+
+
+class Follower:
+
+    def __init__(self,
+                 database: Union[bytes, str],
+                 primary: str,
+                 bootstrap_database: Union[bytes, str] = None,
+                 context: zmq.Context = None):
+        """Applies the transactions published by a primary :class: `sqlite_rx.server.SQLiteServer` to ``database``.
+
+        The follower asks the primary, at its client address, for the address of its
+        :class: `ReplicationLog` and subscribes to it. Transactions are applied in order on a connection
+        of their own, each along with its sequence number. When a sequence number is skipped, the
+        missing transactions are fetched from the primary. If the primary no longer has them, the
+        database is restored from ``bootstrap_database``, e.g. the target of the primary's
+        :class: `sqlite_rx.backup.SQLiteBackUp`, before catching up again. The database is also
+        restored from it at start up when it is ahead of ``database``.
+
+        The requests to the primary and the bootstraps are made by a thread of the follower, so that
+        the server's loop keeps serving reads while the primary is slow or down. The transactions are
+        applied on the loop, and the published ones are left to the thread while it catches up.
+
+        Args:
+            database: The follower's database
+            primary: The client address of the primary, e.g. ``tcp://primary:5000``
+            bootstrap_database: A backup of the primary's database
+            context: The `zmq.Context` of the follower's process
+
+        """
+        self.database = database
+        self.primary = primary
+        self.bootstrap_database = bootstrap_database
+        self.sequence = 0
+        self.time = None
+        self.primary_sequence = 0
+        self.bootstraps = 0
+        self.applied = 0
+        self.error = None
+        self._context = context or zmq.Context.instance()
+        self._connection = None
+        self._client = None
+        self._subscriber = None
+        self._loop = None
+        self._thread = None
+        self._stopped = False
+        # Wakes the thread up before its next heartbeat, e.g. when a transaction was missed
+        self._wake = threading.Event()
+        # Held by the thread while it catches up
+        self._syncing = threading.Lock()
+        self._behind_since = None
+        self._apply_delay = None
+
+    def attach(self, connection: sqlite3.Connection, authorizer: Callable) -> Callable:
+        return authorizer
+
+    @contextmanager
+    def write(self, query: str, params, mode: str):
+        # Followers serve reads only. Their connection refuses writes.
+        yield
+
+    def flush(self):
+        pass
+
+    def open(self):
+        """Open the follower's connection and bootstrap if the bootstrap database is ahead"""
+        self._connection = sqlite3.connect(self.database, isolation_level=None, check_same_thread=False)
+        self._connection.execute('pragma journal_mode=wal')
+        ensure_sequence_table(self._connection)
+        self.sequence, self.time = read_sequence(self._connection)
+        if self.bootstrap_database and self._backup_sequence() > self.sequence:
+            self.bootstrap()
+
+    def start(self):
+        """Start following, applying the transactions on the current IOLoop"""
+        self._loop = ioloop.IOLoop.current()
+        self._thread = threading.Thread(target=self.run, name='sqlite-rx-follower', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self._subscriber is not None:
+            self._subscriber.close()
+
+    def run(self):
+        """Open the follower's connection, then sync with the primary every heartbeat until stopped"""
+        try:
+            self.open()
+        except Exception as e:
+            self.error = str(e)
+            LOG.exception("Could not open %s", self.database)
+            return
+        LOG.info("Following %s from sequence %s", self.primary, self.sequence)
+        while not self._stopped:
+            self.sync()
+            self._wake.wait(HEARTBEAT_INTERVAL)
+            self._wake.clear()
+        if self._client is not None:
+            self._client.cleanup()
+
+    def call(self, callback: Callable, *args):
+        """Run ``callback`` on the loop and wait for its result. Before :meth: `start` it runs right away."""
+        if self._loop is None:
+            return callback(*args)
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(callback(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._loop.add_callback(run)
+        return future.result()
+
+    def _backup_sequence(self) -> int:
+        connection = sqlite3.connect(self.bootstrap_database)
+        try:
+            return read_sequence(connection)[0]
+        finally:
+            connection.close()
+
+    def bootstrap(self):
+        """Replace the database with ``bootstrap_database``
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxReplicationError: If there is no database to bootstrap from
+
+        """
+        if not self.bootstrap_database:
+            raise SQLiteRxReplicationError("The follower is too far behind {} and has no database to "
+                                           "bootstrap from".format(self.primary))
+        LOG.info("Bootstrapping %s from %s", self.database, self.bootstrap_database)
+        source = sqlite3.connect(self.bootstrap_database)
+        try:
+            source.backup(self._connection)
+        finally:
+            source.close()
+        ensure_sequence_table(self._connection)
+        self.sequence, self.time = read_sequence(self._connection)
+        self.bootstraps += 1
+        LOG.info("Bootstrapped %s at sequence %s", self.database, self.sequence)
+
+    def _request(self, since: int) -> dict:
+        from sqlite_rx.client import SQLiteClient
+
+        if self._client is None:
+            self._client = SQLiteClient(connect_address=self.primary, context=self._context)
+        try:
+            return self._client._admin('replication', since=since, limit=CATCH_UP_BATCH,
+                                       retries=1, request_timeout=PRIMARY_REQUEST_TIMEOUT)['replication']
+        except (SQLiteRxConnectionError, SQLiteRxTransportError):
+            # The client's socket is closed after a timeout
+            self._client = None
+            raise
+
+    def _subscribe(self, address: str):
+        # The primary may publish on a wildcard address, reachable at the host we reach it with
+        parts = urlsplit(address)
+        if parts.hostname in ('*', '0.0.0.0', None):
+            address = "{}://{}:{}".format(parts.scheme, urlsplit(self.primary).hostname, parts.port)
+        socket = self._context.socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, b'')
+        socket.connect(address)
+        self._subscriber = zmqstream.ZMQStream(socket, ioloop.IOLoop.current())
+        self._subscriber.on_recv(self.on_publish)
+        LOG.info("Subscribed to %s", address)
+
+    def sync(self):
+        """Subscribe to the primary if not done yet and catch up when behind. Runs in the follower's thread."""
+        if self._subscriber is not None and self.primary_sequence <= self.sequence:
+            return
+        try:
+            with self._syncing:
+                if self._subscriber is None:
+                    status = self._request(self.sequence)
+                    self.call(self._subscribe, status['publish_address'])
+                    self._catch_up(status)
+                else:
+                    self.catch_up()
+        except SQLiteRxError as e:
+            self.error = str(e)
+            LOG.warning("Could not sync with %s: %s", self.primary, e)
+        except Exception as e:
+            self.error = str(e)
+            LOG.exception("Exception while syncing with %s", self.primary)
+
+    def on_publish(self, frames: List[bytes]):
+        try:
+            entry = msgpack.loads(frames[0], raw=False)
+            self._seen(entry['sequence'])
+            if entry.get('heartbeat') or entry['sequence'] <= self.sequence:
+                return
+            if not self._syncing.acquire(blocking=False):
+                # The thread is catching up and fetches the transaction along with the others
+                return
+            try:
+                if entry['sequence'] == self.sequence + 1:
+                    self.apply(entry)
+                else:
+                    LOG.info("Missed transactions %s to %s", self.sequence + 1, entry['sequence'] - 1)
+                    self._wake.set()
+            finally:
+                self._syncing.release()
+        except Exception as e:
+            self.error = str(e)
+            LOG.exception("Exception while applying replicated transaction")
+
+    def _seen(self, sequence: int):
+        if sequence > self.primary_sequence:
+            self.primary_sequence = sequence
+        if self.primary_sequence > self.sequence and self._behind_since is None:
+            self._behind_since = time.time()
+
+    def catch_up(self):
+        """Fetch the transactions missed and apply them on the loop, bootstrapping if the primary no longer
+        has them"""
+        self._catch_up(self._request(self.sequence))
+
+    def _catch_up(self, status: dict):
+        while True:
+            self._seen(status['sequence'])
+            entries = status['entries']
+            if entries is None:
+                self.bootstrap()
+                status = self._request(self.sequence)
+                if status['entries'] is None:
+                    raise SQLiteRxReplicationError("{} is older than the transactions kept by {}"
+                                                   .format(self.bootstrap_database, self.primary))
+                continue
+            self.call(self.apply_entries, entries)
+            if len(entries) < CATCH_UP_BATCH:
+                return
+            status = self._request(self.sequence)
+
+    def apply_entries(self, entries: List[dict]):
+        for entry in entries:
+            if entry['sequence'] == self.sequence + 1:
+                self.apply(entry)
+
+    def apply(self, entry: dict):
+        """Apply a transaction of the primary along with its sequence number"""
+        cursor = self._connection.cursor()
+        statements = entry['statements']
+        if statements and statements[0][2] == 'script':
+            cursor.executescript(statements[0][0])
+            self._connection.execute("UPDATE {} SET sequence = ?, time = ? WHERE id = 0".format(SEQUENCE_TABLE),
+                                     (entry['sequence'], entry['time']))
+        else:
+            cursor.execute('BEGIN')
+            try:
+                for query, params, mode in statements:
+                    if mode == 'many':
+                        cursor.executemany(query, params)
+                    elif params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
+                cursor.execute("UPDATE {} SET sequence = ?, time = ? WHERE id = 0".format(SEQUENCE_TABLE),
+                               (entry['sequence'], entry['time']))
+                cursor.execute('COMMIT')
+            except Exception:
+                if self._connection.in_transaction:
+                    cursor.execute('ROLLBACK')
+                raise
+        self.sequence, self.time = entry['sequence'], entry['time']
+        self.applied += 1
+        self.error = None
+        if entry['time'] is not None:
+            self._apply_delay = time.time() - entry['time']
+        if self.sequence >= self.primary_sequence:
+            self._behind_since = None
+
+    def status(self, message: dict) -> dict:
+        lag = max(self.primary_sequence - self.sequence, 0)
+        return {
+            "role": "follower",
+            "primary": self.primary,
+            "sequence": self.sequence,
+            "time": self.time,
+            "primary_sequence": self.primary_sequence,
+            "lag": lag,
+            "lag_seconds": time.time() - self._behind_since if lag and self._behind_since else 0.0,
+            "apply_delay": self._apply_delay,
+            "applied": self.applied,
+            "bootstraps": self.bootstraps,
+            "subscribed": self._subscriber is not None,
+            "error": self.error
+        }
+
+
+def setup_replication(context: zmq.Context,
+                      database: Union[bytes, str],
+                      replication_address: str = None,
+                      follow: str = None,
+                      bootstrap_database: Union[bytes, str] = None) -> Optional[Union[ReplicationLog, Follower]]:
+    """The replication role of a server process: a :class: `ReplicationLog` publishing on
+    ``replication_address``, a :class: `Follower` of ``follow`` or None"""
+    if follow:
+        return Follower(database, follow, bootstrap_database=bootstrap_database, context=context)
+    if replication_address:
+        publisher = context.socket(zmq.PUB)
+        publisher.bind(replication_address)
+        return ReplicationLog(publisher, replication_address)
+    return None
@@ -1,12 +1,18 @@
+import asyncio
 import logging.config
 import os
 import platform
+import re
 import socket
 import sqlite3
 import sys
 import threading
+import time
 import traceback
-import zlib
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import partial
 from signal import SIGTERM, SIGINT, signal
 
 from typing import List, Union, Callable
@@ -15,10 +21,26 @@ import billiard as multiprocessing
 import msgpack
 import zmq
 from sqlite_rx import get_version
+from sqlite_rx.admission import WRITE, RateLimiter, RequestQueue, request_priority, retry_after_ms
 from sqlite_rx.auth import Authorizer, KeyMonkey
-from sqlite_rx.backup import SQLiteBackUp, RecurringTimer, is_backup_supported
+from sqlite_rx.backup import (BACKUP_PAGES, BACKUP_SLEEP, SQLiteBackUp, SQLiteSnapshot, RecurringTimer,
+                              is_backup_supported, parse_retention)
+from sqlite_rx.cache import ResultCache, TableTracker
+from sqlite_rx.codec import Codec, LEGACY_PEER, Peer, blob_hook, message_size, pack_columns
+from sqlite_rx.engine import ENGINES, AsyncioStream, new_event_loop
 from sqlite_rx.exception import SQLiteRxBackUpError
+from sqlite_rx.exception import SQLiteRxOverloadedError
+from sqlite_rx.exception import SQLiteRxReplicationError
+from sqlite_rx.exception import SQLiteRxTimeoutError
+from sqlite_rx.exception import SQLiteRxUnknownDatabaseError
+from sqlite_rx.exception import SQLiteRxUnknownStatementError
+from sqlite_rx.exception import SQLiteRxWorkerSetupError
 from sqlite_rx.exception import SQLiteRxZAPSetupError
+from sqlite_rx.metrics import Metrics, NULL_TIMER, PhaseTimer, ScopedMetrics, start_http_endpoint
+from sqlite_rx.query import is_deterministic, is_plain_write, is_read_only_request, statement_id
+from sqlite_rx.querystats import QueryStats
+from sqlite_rx.replication import setup_replication
+from sqlite_rx.slowlog import SlowQueryLog
 from tornado import ioloop, version
 from zmq.auth.asyncio import AsyncioAuthenticator
 from zmq.eventloop import zmqstream
@@ -30,6 +52,124 @@ LOG = logging.getLogger(__name__)
 
 __all__ = ['SQLiteServer']
 
+# Server-side cursors opened by streaming requests
+MAX_OPEN_CURSORS = 64
+CURSOR_IDLE_TIMEOUT = 300
+
+# Prepared statements remembered per connection. sqlite3's statement cache is sized to match
+# so that every registered statement stays compiled.
+MAX_PREPARED_STATEMENTS = 256
+
+# Requests which are not a plain statement execution. Their replies are never cached
+# and they are never part of a group commit.
+SPECIAL_REQUESTS = ('admin', 'batch', 'batch_size', 'cursor_id', 'prepare')
+
+# Maximum number of write requests committed together by default
+GROUP_COMMIT_SIZE = 64
+
+# sqlite virtual machine instructions between two checks of a request's deadline
+PROGRESS_STEPS = 1000
+
+# Requests queued per pool of executor threads by default
+EXECUTOR_QUEUE_SIZE = 1024
+
+# Weight of the latest request in the moving average of the time executor threads take per request
+SERVICE_TIME_WEIGHT = 0.1
+
+# Authorizer actions creating objects which only exist on the connection running the statement
+LOCAL_OBJECT_ACTIONS = frozenset((sqlite3.SQLITE_CREATE_TEMP_INDEX,
+                                  sqlite3.SQLITE_CREATE_TEMP_TABLE,
+                                  sqlite3.SQLITE_CREATE_TEMP_TRIGGER,
+                                  sqlite3.SQLITE_CREATE_TEMP_VIEW,
+                                  sqlite3.SQLITE_ATTACH))
+
+# First frame of the writer worker's replies: whether its connection pins the reads, see QueryStreamHandler.pins_reads
+UNPINNED, PINNED = b'\x00', b'\x01'
+
+# Databases of a database directory with an open connection by default
+MAX_OPEN_DATABASES = 64
+
+# Names of the databases of a database directory: a file name, excluding hidden files and sqlite's own files
+DATABASE_NAME = re.compile(r"^\w[\w.-]*$")
+SQLITE_SIDE_FILES = ('-wal', '-shm', '-journal')
+
+
+def split_message(message: List):
+    """Split a multipart message received by the server into its envelope, the request body and
+    the out-of-band blobs following the body.
+
+    On a `zmq.ROUTER` socket the envelope holds the client identity, any frames the client put
+    before the empty delimiter frame (e.g. a request id) and the delimiter itself. The envelope
+    is sent back unchanged with the reply. On a `zmq.REP` socket the envelope has already been
+    stripped by zmq and the message starts with the body.
+
+    The parts may be ``bytes`` or, when received with ``copy=False``, ``zmq.Frame`` objects.
+
+    Returns:
+        A tuple ``(envelope, body, blobs)`` where envelope and blobs are lists of frames
+
+    """
+    for index, part in enumerate(message):
+        if len(part) == 0:
+            return message[:index + 1], message[index + 1], message[index + 2:]
+    return [], message[0], message[1:]
+
+
+def _buffer(part):
+    """A view of a frame received with ``copy=False``, or the part itself if it is already bytes"""
+    return part.buffer if isinstance(part, zmq.Frame) else part
+
+
+def decode_request(message: List, codec: Codec):
+    """Decode the request of a multipart message received by the server, leaving its out-of-band blobs aside.
+
+    Returns:
+        A tuple ``(request, peer)`` where peer is the :class: `sqlite_rx.codec.Peer` to reply to
+
+    """
+    _, body, _ = split_message(message)
+    payload, peer = codec.decode(_buffer(body))
+    request = msgpack.loads(payload, raw=False)
+    return request, codec.negotiate(peer, request)
+
+
+def is_reader_request(request: dict) -> bool:
+    """Returns True if a request can be served by a reader connection.
+
+    Fetches must reach the connection holding the cursor, so streaming requests stick to the writer.
+
+    """
+    return 'batch_size' not in request and 'cursor_id' not in request and is_read_only_request(request)
+
+
+def error_reply(codec: Codec, peer: Peer, error: Exception, **fields) -> List:
+    """The frames of a reply carrying ``error``, for a request which is not handed to a connection"""
+    error = {"type": "{}.{}".format(type(error).__module__, type(error).__name__), "message": str(error)}
+    return [codec.encode(msgpack.dumps(dict({"items": [], "error": error}, **fields)), peer)]
+
+
+def overloaded_reply(codec: Codec, peer: Peer, retry_after: int) -> List:
+    """The frames of the reply turning away a request, asking the client to retry after ``retry_after`` ms"""
+    error = SQLiteRxOverloadedError("The server is overloaded, retry after {} ms".format(retry_after))
+    return error_reply(codec, peer, error, retry_after=retry_after)
+
+
+def request_kind(message: dict) -> str:
+    """The kind of a request, as labelled in the metrics"""
+    for key, kind in (('admin', 'admin'),
+                      ('cursor_id', 'fetch'),
+                      ('batch', 'batch'),
+                      ('prepare', 'prepare'),
+                      ('statement_id', 'prepared'),
+                      ('batch_size', 'stream')):
+        if key in message:
+            return kind
+    if message.get('execute_script'):
+        return 'script'
+    if message.get('execute_many'):
+        return 'many'
+    return 'query'
+
 
 class SQLiteZMQProcess(multiprocessing.Process):
 
@@ -43,14 +183,38 @@ class SQLiteZMQProcess(multiprocessing.Process):
         self.loop = None
         self.socket = None
         self.auth = None
+        self.engine = 'tornado'
 
     def setup(self):
         LOG.info("Python Platform %s", platform.python_implementation())
         LOG.info("libzmq version %s", zmq.zmq_version())
         LOG.info("pyzmq version %s", zmq.__version__)
-        LOG.info("tornado version %s", version)
         self.context = zmq.Context()
-        self.loop = ioloop.IOLoop()
+        if self.engine == 'asyncio':
+            self.loop = new_event_loop()
+            asyncio.set_event_loop(self.loop)
+        else:
+            LOG.info("tornado version %s", version)
+            self.loop = ioloop.IOLoop()
+
+    def add_callback(self, callback: Callable, *args):
+        """Call ``callback`` once the loop runs. It may be called from any thread."""
+        if self.engine == 'asyncio':
+            self.loop.call_soon_threadsafe(callback, *args)
+        else:
+            self.loop.add_callback(callback, *args)
+
+    def start_loop(self):
+        if self.engine == 'asyncio':
+            self.loop.run_forever()
+        else:
+            self.loop.start()
+
+    def make_stream(self, sock: zmq.Socket):
+        """A stream of ``sock`` on the loop of the engine"""
+        if self.engine == 'asyncio':
+            return AsyncioStream(sock)
+        return zmqstream.ZMQStream(sock, self.loop)
 
     def stream(self,
                sock_type,
@@ -59,12 +223,13 @@ class SQLiteZMQProcess(multiprocessing.Process):
                use_encryption: bool = False,
                server_curve_id: str = None,
                curve_dir: str = None,
-               use_zap: bool = False):
+               use_zap: bool = False,
+               high_water_mark: int = None):
         """
 
         Method used to setup a ZMQ stream which will be bound to a ZMQ.REP socket.
         On this REP stream we register a callback to execute client queries as they arrive.
-        The stream is used in conjunction with `tornado` eventloop
+        The stream runs on the `tornado` IOLoop or, with the ``asyncio`` engine, on the asyncio loop
 
         Args:
             sock_type: ZMQ Socket type. For e.g. zmq.REP
@@ -74,12 +239,17 @@ class SQLiteZMQProcess(multiprocessing.Process):
             server_curve_id: Server curve id. Defaults to "id_server_{}_curve".format(socket.gethostname())
             curve_dir: Curve key files directory. Defaults to `~/.curve`
             use_zap: True if you want ZAP authentication to be enabled.
+            high_water_mark: Messages queued by zmq per client, in each direction, before it stops
+                receiving from the client or drops replies to it. None keeps the zmq default of 1000.
 
         Raises:
             sqlite_rx.exception.SQLiteRxZAPSetupError: If ZAP is enabled without CurveZMQ
         """
 
         self.socket = self.context.socket(sock_type)
+        if high_water_mark is not None:
+            self.socket.setsockopt(zmq.RCVHWM, high_water_mark)
+            self.socket.setsockopt(zmq.SNDHWM, high_water_mark)
 
         if use_encryption or use_zap:
 
@@ -101,7 +271,7 @@ class SQLiteZMQProcess(multiprocessing.Process):
 
         self.socket.bind(address)
 
-        stream = zmqstream.ZMQStream(self.socket, self.loop)
+        stream = self.make_stream(self.socket)
         if callback:
             stream.on_recv(callback)
         return stream
@@ -119,6 +289,37 @@ class SQLiteServer(SQLiteZMQProcess):
                  use_zap_auth: bool = False,
                  backup_database: Union[bytes, str] = None,
                  backup_interval: int = 4,
+                 backup_pages: int = BACKUP_PAGES,
+                 backup_sleep: float = BACKUP_SLEEP,
+                 snapshot_dir: str = None,
+                 snapshot_interval: float = 3600,
+                 snapshot_retention: str = None,
+                 snapshot_compress: bool = False,
+                 read_workers: int = 0,
+                 codec: Codec = None,
+                 cache_size: int = 0,
+                 group_commit_window: float = 0,
+                 group_commit_size: int = GROUP_COMMIT_SIZE,
+                 metrics: bool = False,
+                 metrics_address: str = None,
+                 slow_query_threshold: float = None,
+                 slow_query_log: str = None,
+                 redact_params: bool = False,
+                 query_stats: int = 0,
+                 replication_address: str = None,
+                 follow: str = None,
+                 bootstrap_database: Union[bytes, str] = None,
+                 engine: str = 'tornado',
+                 executor: bool = False,
+                 read_threads: int = 0,
+                 queue_size: int = EXECUTOR_QUEUE_SIZE,
+                 high_water_mark: int = None,
+                 rate_limit: float = None,
+                 rate_burst: int = None,
+                 database_dir: str = None,
+                 max_databases: int = MAX_OPEN_DATABASES,
+                 max_database_memory: int = None,
+                 create_databases: bool = False,
                  *args, **kwargs):
         """
         SQLiteServer runs as an isolated python process.
@@ -130,6 +331,86 @@ class SQLiteServer(SQLiteZMQProcess):
             auth_config : A dictionary describing what actions are authorized, denied or ignored.
             use_encryption : True means use `CurveZMQ` encryption. False means don't
             use_zap_auth : True means use `ZAP` authentication. False means don't
+            backup_database: Path of the database to which ``database`` is backed up every ``backup_interval``
+                seconds. A backup is skipped when nothing was committed since the previous one.
+            backup_interval: Seconds between two backups
+            backup_pages: Pages copied per step of a backup. -1 copies the whole database in one step.
+            backup_sleep: Seconds slept between two steps of a backup, leaving the database to the clients
+            snapshot_dir: Directory to which compacted, timestamped snapshots of ``database`` are written
+                every ``snapshot_interval`` seconds with ``VACUUM INTO``, see :class: `sqlite_rx.backup.SQLiteSnapshot`
+            snapshot_interval: Seconds between two snapshots
+            snapshot_retention: Snapshots to keep, as a number of snapshots, hours or both, e.g. ``10``,
+                ``24h`` or ``10,24h``. None, the default, keeps all the snapshots.
+            snapshot_compress: True to gzip the snapshots
+            read_workers: Number of reader processes. When greater than 0 a `zmq.ROUTER` front end
+                dispatches read-only statements to ``read_workers`` processes, each holding its own
+                WAL reader connection, while all other requests go to a single writer process.
+            codec: The :class: `sqlite_rx.codec.Codec` deciding how replies are compressed.
+                Defaults to zlib for payloads of 512 bytes or more.
+            cache_size: Size in bytes of the result cache of read-only queries. 0, the default, disables it.
+                The cache keeps the encoded replies and a write to a table evicts the results which read it.
+                With read workers every worker process has a cache of its own.
+            group_commit_window: Seconds during which write requests are collected and then committed
+                in a single transaction. 0, the default, commits every request on its own.
+            group_commit_size: A group is committed as soon as it holds this many write requests.
+            metrics: True to keep request counters and latency histograms, reported by the ``metrics``
+                admin request. With read workers every worker process keeps metrics of its own.
+            metrics_address: ``host:port`` on which to serve the metrics in the Prometheus text format
+                at ``/metrics``. Implies ``metrics``. With read workers the endpoint reports how requests
+                are dispatched to the workers, e.g. the number of requests in flight per backend.
+            slow_query_threshold: Queries running longer than this many seconds are logged along with
+                their ``EXPLAIN QUERY PLAN``. None, the default, disables the slow query log.
+            slow_query_log: Path of the rotating slow query log. Defaults to the ``sqlite_rx.slowlog``
+                logger. With read workers every worker process writes to a file of its own, suffixed
+                with its PID.
+            redact_params: True to leave the query parameters out of the slow query log
+            query_stats: Number of query fingerprints for which calls, time, rows and bytes are aggregated,
+                reported by the ``query_stats`` admin request. 0, the default, disables query statistics.
+            replication_address: Address of the `zmq.PUB` socket on which the server publishes every committed
+                write to its followers, e.g. ``tcp://0.0.0.0:5001``. See :class: `sqlite_rx.replication.ReplicationLog`
+            follow: Client address of a primary server, e.g. ``tcp://primary:5000``. The server then applies
+                the writes published by the primary to ``database`` and serves reads only.
+                See :class: `sqlite_rx.replication.Follower`
+            bootstrap_database: A backup of the primary's database, e.g. its ``backup_database``, from which
+                a follower restores ``database`` when it is too far behind the primary.
+            engine: The event loop of the server and worker processes. ``tornado``, the default, or ``asyncio``
+                which receives and sends on the asyncio loop directly, using `uvloop` when it is installed.
+                Replication and the metrics endpoint run on the same loop in both cases.
+            executor: True to execute the requests on a writer thread, leaving the event loop to receive
+                requests and send replies, so that a slow query doesn't hold up the other clients' messages.
+                See :class: `sqlite_rx.server.QueryExecutor`
+            read_threads: Number of reader threads of the executor, each holding its own WAL reader connection.
+                Read-only statements are spread over them and everything else goes to the writer thread.
+                Implies ``executor``.
+            queue_size: Requests queued per pool of executor threads, served by priority: reads, then writes,
+                then scripts, ``execute_many`` and batches. A request shed by a full queue is replied to with
+                a :class: `sqlite_rx.exception.SQLiteRxOverloadedError` and the time after which to retry.
+                None leaves the queues unbounded.
+            high_water_mark: Messages zmq queues per client on the server socket, in each direction.
+                None keeps the zmq default of 1000.
+            rate_limit: Requests per second admitted from every client id, enforced with a token bucket.
+                The other requests are replied to with a :class: `sqlite_rx.exception.SQLiteRxOverloadedError`.
+                None, the default, disables rate limits.
+            rate_burst: Requests a client may send at once after being idle. Defaults to ``rate_limit``.
+            database_dir: A directory of databases served along with ``database``. A request names its database
+                with the name of a file in the directory, e.g. ``SQLiteClient(address, database='tenant1.db')``,
+                and requests naming none are served from ``database``. See :class: `sqlite_rx.server.DatabasePool`
+            max_databases: Maximum number of databases of ``database_dir`` with an open connection.
+                With the executor every thread keeps as many connections.
+            max_database_memory: Bytes the open connections of ``database_dir`` may hold in their page caches and
+                result caches. None, the default, only limits their number.
+            create_databases: True to create the databases of ``database_dir`` on their first request. False
+                replies to requests for missing databases with a :class: `sqlite_rx.exception.SQLiteRxUnknownDatabaseError`
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxWorkerSetupError: If ``read_workers`` or ``read_threads`` is used with an
+                in-memory database, or if read workers are combined with the executor or ``database_dir``
+            sqlite_rx.exception.SQLiteRxBackUpError: If backups or snapshots are not supported, or
+                snapshots are requested for an in-memory database
+            ValueError: If ``snapshot_retention``, ``engine`` or ``rate_limit`` is invalid, or ``database_dir``
+                is not a directory
+            sqlite_rx.exception.SQLiteRxReplicationError: If the server both follows and publishes, follows
+                with an in-memory database, or replicates while serving ``database_dir``
 
         """
         super(SQLiteServer, self).__init__(*args, *kwargs)
@@ -142,32 +423,256 @@ class SQLiteServer(SQLiteZMQProcess):
         self.curve_dir = curve_dir
         self.rep_stream = None
         self.back_up_recurring_thread = None
+        self.snapshot_recurring_thread = None
+        self._read_workers = read_workers
+        self._codec = codec or Codec()
+        self._cache_size = cache_size
+        self._group_commit_window = group_commit_window
+        self._group_commit_size = group_commit_size
+        self._metrics_enabled = metrics or bool(metrics_address)
+        self._metrics_address = metrics_address
+        self._slow_query_threshold = slow_query_threshold
+        self._slow_query_log = slow_query_log
+        self._redact_params = redact_params
+        self._query_stats = query_stats
+        self._replication_address = replication_address
+        self._follow = follow
+        self._bootstrap_database = bootstrap_database
+        self._executor = executor or read_threads > 0
+        self._read_threads = read_threads
+        self._queue_size = queue_size
+        self._high_water_mark = high_water_mark
+        self._rate_limit = rate_limit
+        self._rate_burst = rate_burst
+        self._database_dir = database_dir
+        self._max_databases = max_databases
+        self._max_database_memory = max_database_memory
+        self._create_databases = create_databases
+        self.metrics = None
+        self.workers = []
+        self.threads = []
+
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine {}. Choose from {}".format(engine, ENGINES))
+        if rate_limit is not None and rate_limit <= 0:
+            raise ValueError("rate_limit should be a positive number of requests per second")
+        self.engine = engine
+
+        if follow and replication_address:
+            raise SQLiteRxReplicationError("A follower can't publish writes of its own")
+        if follow and (not database or database == ':memory:'):
+            raise SQLiteRxReplicationError("A follower needs an on-disk database")
+
+        if read_workers and (not database or database == ':memory:'):
+            raise SQLiteRxWorkerSetupError("Read workers need an on-disk database shared by all the worker processes")
+        if read_threads and (not database or database == ':memory:'):
+            raise SQLiteRxWorkerSetupError("Read threads need an on-disk database shared by all the threads")
+        if read_workers and self._executor:
+            raise SQLiteRxWorkerSetupError("The executor threads can't be combined with read workers")
+        if database_dir is not None:
+            if not os.path.isdir(database_dir):
+                raise ValueError("{} is not a directory".format(database_dir))
+            if read_workers:
+                raise SQLiteRxWorkerSetupError("Read workers can't serve a database directory")
+            if follow or replication_address:
+                raise SQLiteRxReplicationError("The databases of a database directory are not replicated")
 
         if backup_database is not None:
             if not is_backup_supported():
                 raise SQLiteRxBackUpError(f"SQLite backup is not supported on {sys.platform} or {platform.python_implementation()}")
 
-            sqlite_backup = SQLiteBackUp(src=database, target=backup_database)
+            sqlite_backup = SQLiteBackUp(src=database, target=backup_database, pages=backup_pages, sleep=backup_sleep)
             self.back_up_recurring_thread = RecurringTimer(function=sqlite_backup, interval=backup_interval)
             self.back_up_recurring_thread.daemon = True
 
+        if snapshot_dir is not None:
+            if not database or database == ':memory:':
+                raise SQLiteRxBackUpError("Snapshots need an on-disk database")
+            retention_count, retention_hours = parse_retention(snapshot_retention)
+            snapshot = SQLiteSnapshot(src=database,
+                                      directory=snapshot_dir,
+                                      retention_count=retention_count,
+                                      retention_hours=retention_hours,
+                                      compress=snapshot_compress)
+            self.snapshot_recurring_thread = RecurringTimer(function=snapshot, interval=snapshot_interval)
+            self.snapshot_recurring_thread.daemon = True
+
     def setup(self):
         """
-        Start a zmq.REP socket stream and register a callback :class: `sqlite_rx.server.QueryStreamHandler`
+        Start a zmq.ROUTER socket stream and register a callback :class: `sqlite_rx.server.QueryStreamHandler`
+
+        With read workers enabled the callback is a :class: `sqlite_rx.server.QueryRouter` and with
+        the executor enabled it is a :class: `sqlite_rx.server.QueryExecutor`. Rate limits put an
+        :class: `sqlite_rx.server.AdmissionControl` in front of the callback.
+
+        The ROUTER socket serves `zmq.REQ` clients as well as `zmq.DEALER` clients which keep
+        several requests in flight and correlate replies using the request envelope.
 
         """
         super().setup()
+        if self._metrics_enabled:
+            self.metrics = Metrics()
+        if self._metrics_address:
+            self.add_callback(start_http_endpoint, self.metrics, self._metrics_address)
         # Depending on the initialization parameters either get a plain stream or secure stream.
-        self.rep_stream = self.stream(zmq.REP,
+        self.rep_stream = self.stream(zmq.ROUTER,
                                       self._bind_address,
                                       use_encryption=self._encrypt,
                                       use_zap=self._zap_auth,
                                       server_curve_id=self.server_curve_id,
-                                      curve_dir=self.curve_dir)
+                                      curve_dir=self.curve_dir,
+                                      high_water_mark=self._high_water_mark)
         # Register the callback.
-        self.rep_stream.on_recv(QueryStreamHandler(self.rep_stream,
-                                                   self._database,
-                                                   self._auth_config))
+        if self._read_workers:
+            callback = self.start_workers()
+        else:
+            replication = setup_replication(self.context,
+                                            self._database,
+                                            replication_address=self._replication_address,
+                                            follow=self._follow,
+                                            bootstrap_database=self._bootstrap_database)
+            if self._executor:
+                callback = self.start_threads(replication)
+            else:
+                if replication is not None:
+                    self.add_callback(replication.start)
+                callback = self.query_handler(self.rep_stream, replication=replication)
+        if self._rate_limit is not None:
+            callback = AdmissionControl(callback,
+                                        self.rep_stream,
+                                        RateLimiter(self._rate_limit, self._rate_burst),
+                                        self._codec,
+                                        metrics=self.metrics)
+        self.rep_stream.on_recv(callback, copy=False)
+
+    def query_handler(self, rep_stream, read_only: bool = False, replication=None) -> Callable:
+        """The :class: `sqlite_rx.server.QueryStreamHandler` executing requests in the server process, or the
+        :class: `sqlite_rx.server.DatabasePool` when the server hosts a database directory"""
+        if self._database_dir is None:
+            return self.database_handler(rep_stream, self._database, read_only=read_only, replication=replication)
+        return DatabasePool(rep_stream,
+                            self._database_dir,
+                            lambda path, scope: self.database_handler(rep_stream, path, read_only=read_only, metrics=scope),
+                            default=self.database_handler(rep_stream, self._database, read_only=read_only),
+                            max_databases=self._max_databases,
+                            max_memory=self._max_database_memory,
+                            create=self._create_databases and not read_only,
+                            codec=self._codec,
+                            metrics=self.metrics)
+
+    def database_handler(self,
+                         rep_stream,
+                         database: Union[bytes, str],
+                         read_only: bool = False,
+                         metrics: Union[Metrics, ScopedMetrics] = None,
+                         replication=None) -> 'QueryStreamHandler':
+        """The :class: `sqlite_rx.server.QueryStreamHandler` of ``database``, recording in ``metrics`` if given"""
+        return QueryStreamHandler(rep_stream,
+                                  database,
+                                  self._auth_config,
+                                  read_only=read_only or bool(self._follow),
+                                  codec=self._codec,
+                                  cache_size=self._cache_size,
+                                  group_commit_window=0 if read_only else self._group_commit_window,
+                                  group_commit_size=self._group_commit_size,
+                                  metrics=metrics if metrics is not None else self.metrics,
+                                  slow_query_threshold=self._slow_query_threshold,
+                                  slow_query_log=self._slow_query_log,
+                                  redact_params=self._redact_params,
+                                  query_stats=self._query_stats,
+                                  replication=replication)
+
+    def start_threads(self, replication=None) -> 'QueryExecutor':
+        """
+        Start the executor's writer thread and reader threads, each with a connection of its own, and
+        return the :class: `sqlite_rx.server.QueryExecutor` which hands them the client requests.
+
+        The writer thread also runs the replication, which publishes or applies the writes committed
+        on its connection.
+
+        """
+        # Replies are sent by the event loop, which owns the socket.
+        stream = LoopStream(self.rep_stream, self.add_callback)
+        # The writer switches the database to WAL before the readers open their connections.
+        writer = HandlerThread('sqlite-rx-writer', partial(self.query_handler, stream, replication=replication))
+        writer.start()
+        if replication is not None:
+            writer.submit(replication.start)
+        readers = [HandlerThread('sqlite-rx-reader-{}'.format(index),
+                                 partial(self.query_handler, stream, read_only=True))
+                   for index in range(self._read_threads)]
+        for reader in readers:
+            reader.start()
+        self.threads = [writer] + readers
+        LOG.info("Started 1 writer and %s reader executor threads", self._read_threads)
+        return QueryExecutor(writer,
+                             readers,
+                             self._codec,
+                             metrics=self.metrics,
+                             rep_stream=self.rep_stream,
+                             add_callback=self.add_callback,
+                             queue_size=self._queue_size)
+
+    def stop_threads(self):
+        for thread in self.threads:
+            thread.stop()
+        for thread in self.threads:
+            thread.join(timeout=1)
+        self.threads = []
+
+    def start_workers(self):
+        """
+        Bind one backend `zmq.DEALER` stream for the writer and one for the readers, start the
+        worker processes connected to them and return the :class: `sqlite_rx.server.QueryRouter`
+        which dispatches client requests between the two.
+
+        """
+        # Switch to WAL once, before the workers open their connections.
+        connection = sqlite3.connect(self._database)
+        connection.execute('pragma journal_mode=wal')
+        connection.close()
+
+        backends = []
+        for count, read_only in ((1, False), (self._read_workers, True)):
+            backend = self.context.socket(zmq.DEALER)
+            port = backend.bind_to_random_port('tcp://127.0.0.1')
+            backends.append(self.make_stream(backend))
+            for _ in range(count):
+                worker = SQLiteWorker(connect_address="tcp://127.0.0.1:{}".format(port),
+                                      database=self._database,
+                                      auth_config=self._auth_config,
+                                      read_only=read_only or bool(self._follow),
+                                      codec=self._codec,
+                                      cache_size=self._cache_size,
+                                      group_commit_window=self._group_commit_window,
+                                      group_commit_size=self._group_commit_size,
+                                      metrics=self._metrics_enabled,
+                                      slow_query_threshold=self._slow_query_threshold,
+                                      slow_query_log=self._slow_query_log,
+                                      redact_params=self._redact_params,
+                                      query_stats=self._query_stats,
+                                      # The writer process publishes or applies the replicated writes
+                                      replication_address=None if read_only else self._replication_address,
+                                      follow=None if read_only else self._follow,
+                                      bootstrap_database=self._bootstrap_database,
+                                      engine=self.engine)
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+        LOG.info("Started 1 writer and %s reader worker processes", self._read_workers)
+        writer, readers = backends
+        router = QueryRouter(writer, readers, self._codec, metrics=self.metrics)
+        # Replies carry the client envelope so they can be routed back as they are.
+        writer.on_recv(partial(router.reply, 'writer', self.rep_stream), copy=False)
+        readers.on_recv(partial(router.reply, 'reader', self.rep_stream), copy=False)
+        return router
+
+    def stop_workers(self):
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
 
     def handle_signal(self, signum, frame):
         LOG.info("SQLiteServer %s PID %s received %r", self, self.pid, signum)
@@ -176,9 +681,13 @@ class SQLiteServer(SQLiteZMQProcess):
         self.rep_stream.close()
         self.socket.close()
         self.loop.stop()
-        
+        self.stop_workers()
+        self.stop_threads()
+
         if self.back_up_recurring_thread:
             self.back_up_recurring_thread.cancel()
+        if self.snapshot_recurring_thread:
+            self.snapshot_recurring_thread.cancel()
         raise SystemExit()
 
     def run(self):
@@ -190,14 +699,582 @@ class SQLiteServer(SQLiteZMQProcess):
         self.setup()
 
         LOG.info("SQLiteServer version %s", get_version())
-        LOG.info("SQLiteServer (Tornado) i/o loop started..")
+        LOG.info("SQLiteServer (%s) i/o loop started..", self.engine)
         LOG.info("Backup thread %s", self.back_up_recurring_thread)
 
         if self.back_up_recurring_thread and not self.back_up_recurring_thread.is_alive():
             self.back_up_recurring_thread.start()
 
+        if self.snapshot_recurring_thread and not self.snapshot_recurring_thread.is_alive():
+            self.snapshot_recurring_thread.start()
+
         LOG.info("Ready to accept client connections on %s", self._bind_address)
-        self.loop.start()
+        self.start_loop()
+
+
+class SQLiteWorker(SQLiteZMQProcess):
+
+    def __init__(self,
+                 connect_address: str,
+                 database: Union[bytes, str],
+                 auth_config: dict = None,
+                 read_only: bool = False,
+                 codec: Codec = None,
+                 cache_size: int = 0,
+                 group_commit_window: float = 0,
+                 group_commit_size: int = GROUP_COMMIT_SIZE,
+                 metrics: bool = False,
+                 slow_query_threshold: float = None,
+                 slow_query_log: str = None,
+                 redact_params: bool = False,
+                 query_stats: int = 0,
+                 replication_address: str = None,
+                 follow: str = None,
+                 bootstrap_database: Union[bytes, str] = None,
+                 engine: str = 'tornado',
+                 *args, **kwargs):
+        """
+        A worker process started by :class: `sqlite_rx.server.SQLiteServer` when read workers are enabled.
+        It connects a `zmq.ROUTER` socket to one of the server's backend streams and executes the
+        requests it receives on its own connection.
+
+        Args:
+            connect_address: The address of the backend stream to connect to.
+            database: A path like object giving the on-disk database shared by all workers.
+            auth_config: A dictionary describing what actions are authorized, denied or ignored.
+            read_only: True for a reader. Its connection is opened with ``pragma query_only``
+            codec: The :class: `sqlite_rx.codec.Codec` of the server
+            cache_size: Size in bytes of the worker's result cache
+            group_commit_window: Seconds during which the writer collects write requests to commit together
+            group_commit_size: Maximum number of write requests committed together
+            metrics: True to keep the worker's request counters and latency histograms
+            slow_query_threshold: Duration in seconds above which queries are logged
+            slow_query_log: Path of the slow query log. The worker's PID is appended to it.
+            redact_params: True to leave the query parameters out of the slow query log
+            query_stats: Number of query fingerprints aggregated by the worker
+            replication_address: Address on which the writer publishes the committed writes
+            follow: Client address of the primary whose writes the writer applies
+            bootstrap_database: A backup of the primary's database
+            engine: The event loop of the worker, ``tornado`` or ``asyncio``
+
+        """
+        super(SQLiteWorker, self).__init__(*args, **kwargs)
+        self._connect_address = connect_address
+        self._database = database
+        self._auth_config = auth_config
+        self._read_only = read_only
+        self._codec = codec
+        self._cache_size = cache_size
+        self._group_commit_window = group_commit_window
+        self._group_commit_size = group_commit_size
+        self._metrics_enabled = metrics
+        self._slow_query_threshold = slow_query_threshold
+        self._slow_query_log = slow_query_log
+        self._redact_params = redact_params
+        self._query_stats = query_stats
+        self._replication_address = replication_address
+        self._follow = follow
+        self._bootstrap_database = bootstrap_database
+        self.engine = engine
+        self.rep_stream = None
+
+    def setup(self):
+        super().setup()
+        replication = setup_replication(self.context,
+                                        self._database,
+                                        replication_address=self._replication_address,
+                                        follow=self._follow,
+                                        bootstrap_database=self._bootstrap_database)
+        if replication is not None:
+            self.add_callback(replication.start)
+        # A ROUTER socket, unlike REP, receives the next request before the previous one is
+        # replied to, which lets the writer collect write requests for a group commit.
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.connect(self._connect_address)
+        self.rep_stream = self.make_stream(self.socket)
+        # The writer tells the router when reads must stay on its connection
+        reply_stream = self.rep_stream if self._read_only else SessionStream(self.rep_stream)
+        handler = QueryStreamHandler(reply_stream,
+                                     self._database,
+                                     self._auth_config,
+                                     read_only=self._read_only,
+                                     codec=self._codec,
+                                     cache_size=self._cache_size,
+                                     group_commit_window=0 if self._read_only else self._group_commit_window,
+                                     group_commit_size=self._group_commit_size,
+                                     metrics=Metrics() if self._metrics_enabled else None,
+                                     slow_query_threshold=self._slow_query_threshold,
+                                     slow_query_log="{}.{}".format(self._slow_query_log, os.getpid())
+                                     if self._slow_query_log else None,
+                                     redact_params=self._redact_params,
+                                     query_stats=self._query_stats,
+                                     replication=replication)
+        if reply_stream is not self.rep_stream:
+            reply_stream.handler = handler
+        self.rep_stream.on_recv(handler, copy=False)
+
+    def handle_signal(self, signum, frame):
+        LOG.info("SQLiteWorker %s PID %s received %r", self, self.pid, signum)
+        self.rep_stream.close()
+        self.socket.close()
+        self.loop.stop()
+        raise SystemExit()
+
+    def run(self):
+        signal(SIGTERM, self.handle_signal)
+        signal(SIGINT, self.handle_signal)
+        self.setup()
+        LOG.info("SQLiteWorker (%s) connected to %s",
+                 "reader" if self._read_only else "writer", self._connect_address)
+        self.start_loop()
+
+
+class QueryRouter:
+
+    def __init__(self, writer_stream, reader_stream, codec: Codec = None, metrics: Metrics = None):
+        """
+        Dispatches client requests arriving on the `zmq.ROUTER` front end. Read-only statements go to the
+        reader workers and everything else goes to the single writer worker. The client envelope
+        is forwarded untouched so that replies can be routed back to the client.
+
+        Args:
+            writer_stream: The `zmq.DEALER` stream connected to the writer process
+            reader_stream: The `zmq.DEALER` stream connected to the reader processes
+            codec: The :class: `sqlite_rx.codec.Codec` of the server
+            metrics: The :class: `sqlite_rx.metrics.Metrics` counting the requests dispatched per backend
+
+        """
+        self._writer_stream = writer_stream
+        self._reader_stream = reader_stream
+        self._codec = codec or Codec()
+        self._metrics = metrics
+        self._in_flight = {"writer": 0, "reader": 0}
+        # Set by the writer's replies while its connection holds a transaction or connection-local objects
+        self.pinned = False
+        if metrics is not None:
+            metrics.gauge('in_flight', lambda: {"backend": dict(self._in_flight)})
+
+    def __call__(self, message: List):
+        try:
+            read_only = not self.pinned and is_reader_request(decode_request(message, self._codec)[0])
+        except Exception:
+            # Let the writer reply with a proper error.
+            LOG.exception("exception while routing request")
+            read_only = False
+        backend = 'reader' if read_only else 'writer'
+        if self._metrics is not None:
+            self._metrics.inc('routed_total', backend=backend)
+            self._in_flight[backend] += 1
+        if read_only:
+            self._reader_stream.send_multipart(message)
+        else:
+            self._writer_stream.send_multipart(message)
+
+    def reply(self, backend: str, rep_stream, message: List):
+        """Forward a worker's reply to the client. The writer's replies start with its
+        :class: `sqlite_rx.server.SessionStream` frame, which is taken off."""
+        if backend == 'writer':
+            self.pinned = message[0].bytes == PINNED
+            message = message[1:]
+        if self._metrics is not None:
+            self._in_flight[backend] = max(0, self._in_flight[backend] - 1)
+        rep_stream.send_multipart(message)
+
+
+class SessionStream:
+
+    def __init__(self, stream):
+        """Sends the replies of the writer worker on ``stream``, each preceded by a frame telling the
+        :class: `sqlite_rx.server.QueryRouter` whether the writer's connection pins the reads.
+
+        The frame follows the identity of the router's backend socket, so that the router receives it first.
+
+        Args:
+            stream: The stream of the worker's `zmq.ROUTER` socket
+
+        """
+        self._stream = stream
+        # The :class: `sqlite_rx.server.QueryStreamHandler` of the writer
+        self.handler = None
+
+    def send_multipart(self, message: List, flags: int = 0, copy: bool = True):
+        state = PINNED if self.handler is not None and self.handler.pins_reads else UNPINNED
+        self._stream.send_multipart(message[:1] + [state] + message[1:], flags, copy=copy)
+
+
+class LoopStream:
+
+    def __init__(self, stream, add_callback: Callable):
+        """Sends the replies of the executor threads on ``stream``, from the thread of its event loop.
+
+        Args:
+            stream: The stream of the server's `zmq.ROUTER` socket
+            add_callback: Schedules a callback on the loop of ``stream`` from any thread
+
+        """
+        self._stream = stream
+        self._add_callback = add_callback
+
+    def send_multipart(self, message: List, flags: int = 0, copy: bool = True):
+        self._add_callback(self._stream.send_multipart, message, flags, copy)
+
+
+class HandlerThread(threading.Thread):
+
+    def __init__(self, name: str, factory: Callable[[], Callable]):
+        """An executor thread calling its handler with the messages it is submitted, one at a time.
+
+        The handler is created by ``factory`` in the thread itself, which runs an asyncio loop of its
+        own so that the handler's timers, e.g. the group commit window, fire in the thread.
+
+        Args:
+            name: Name of the thread
+            factory: Returns the handler, e.g. a :class: `sqlite_rx.server.QueryStreamHandler`
+
+        """
+        super(HandlerThread, self).__init__(name=name, daemon=True)
+        self._factory = factory
+        self._ready = threading.Event()
+        self._error = None
+        self.loop = None
+        self.handler = None
+        # Messages submitted to the thread, counted by the loop, and messages the thread handled
+        self.submitted = 0
+        self.finished = 0
+
+    @property
+    def pending(self) -> int:
+        """Messages waiting for the thread or being handled"""
+        return self.submitted - self.finished
+
+    def run(self):
+        self.loop = new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.handler = self._factory()
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def start(self):
+        """Start the thread and wait for its handler
+
+        Raises:
+            Exception: The exception raised while creating the handler
+
+        """
+        super(HandlerThread, self).start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, callback: Callable, *args):
+        """Call ``callback`` in the thread. It may be called from any thread."""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class QueryExecutor:
+
+    def __init__(self,
+                 writer: HandlerThread,
+                 readers: List[HandlerThread] = None,
+                 codec: Codec = None,
+                 metrics: Metrics = None,
+                 rep_stream=None,
+                 add_callback: Callable = None,
+                 queue_size: int = EXECUTOR_QUEUE_SIZE):
+        """
+        Queues the client requests arriving on the `zmq.ROUTER` socket for a bounded pool of executor threads,
+        so that the event loop keeps receiving requests and sending replies while queries run.
+        Read-only statements are served by the reader threads and everything else by the single writer thread.
+
+        Every pool has a :class: `sqlite_rx.admission.RequestQueue` of its own. Interactive reads are served
+        before writes and writes before bulk requests, except that the requests of a client connection are
+        served in the order they arrived, e.g. a pipelined ``BEGIN``, ``execute_many`` and ``COMMIT``.
+        A thread takes the next request once it is done with the previous one. The requests shed by a full queue get a reply asking the client to retry later.
+
+        sqlite3 releases the GIL while sqlite executes a statement, so the readers run their queries in
+        parallel with each other and with the writer on their own WAL connections.
+
+        Args:
+            writer: The :class: `sqlite_rx.server.HandlerThread` holding the read-write connection
+            readers: The threads holding the read-only connections. None sends every request to the writer.
+            codec: The :class: `sqlite_rx.codec.Codec` of the server
+            metrics: The :class: `sqlite_rx.metrics.Metrics` timing how long requests wait for a thread
+            rep_stream: The stream of the `zmq.ROUTER` socket, on which shed requests are replied to
+            add_callback: Schedules a callback on the event loop from any thread
+            queue_size: Requests queued per pool. None leaves the queues unbounded.
+
+        """
+        self._pools = {"writer": [writer], "reader": readers or []}
+        self._queues = {pool: RequestQueue(queue_size) for pool in self._pools}
+        # Moving average of the seconds a thread of the pool takes per request
+        self._service_times = {pool: 0.0 for pool in self._pools}
+        self._codec = codec or Codec()
+        self._metrics = metrics
+        self._rep_stream = rep_stream
+        self._add_callback = add_callback
+        if metrics is not None:
+            metrics.gauge('executor_queue', lambda: {"pool": self.queued()})
+
+    def queued(self) -> dict:
+        """Requests waiting for a thread, per pool"""
+        return {pool: len(queue) for pool, queue in self._queues.items()}
+
+    def __call__(self, message: List):
+        try:
+            request, peer = decode_request(message, self._codec)
+            pool = 'reader' if self._pools['reader'] and not self.writer_pins_reads() and is_reader_request(request) \
+                else 'writer'
+            priority = request_priority(request)
+            envelope, _, _ = split_message(message)
+            # The identity of the client connection on the ROUTER socket
+            client = bytes(envelope[0]) if envelope else None
+        except Exception:
+            # Let the writer reply with a proper error.
+            LOG.exception("exception while routing request")
+            pool, priority, peer, client = 'writer', WRITE, LEGACY_PEER, None
+        shed = self._queues[pool].put((message, peer, time.monotonic()), priority, key=client)
+        if shed is not None:
+            self.shed(pool, *shed)
+        self.dispatch(pool)
+
+    def writer_pins_reads(self) -> bool:
+        """True while the writer's connection holds a transaction or connection-local objects, see
+        :attr: `sqlite_rx.server.QueryStreamHandler.pins_reads`. Reads are then served by the writer too."""
+        handler = self._pools['writer'][0].handler
+        return handler is not None and handler.pins_reads
+
+    def shed(self, pool: str, message: List, peer: Peer, queued_at: float):
+        """Reply to a request shed by a full queue with the time in which the pool should have caught up"""
+        threads = self._pools[pool]
+        retry_after = retry_after_ms(self._service_times[pool] * len(self._queues[pool]) / len(threads))
+        LOG.warning("The %s queue is full, asking a client to retry after %s ms", pool, retry_after)
+        if self._metrics is not None:
+            self._metrics.inc('rejected_total', reason='queue_full')
+        envelope, _, _ = split_message(message)
+        self._rep_stream.send_multipart(envelope + overloaded_reply(self._codec, peer, retry_after), copy=False)
+
+    def dispatch(self, pool: str):
+        """Hand the next queued requests to the idle threads of ``pool``"""
+        queue = self._queues[pool]
+        for thread in self._pools[pool]:
+            if not queue:
+                return
+            if thread.pending == 0:
+                message, _, queued_at = queue.get()
+                thread.submitted += 1
+                thread.submit(self.run, thread, pool, message, queued_at)
+
+    def run(self, thread: HandlerThread, pool: str, message: List, queued_at: float):
+        """Execute a request in ``thread``. Its deadline runs from the time it was queued."""
+        started = time.monotonic()
+        if self._metrics is not None:
+            self._metrics.observe('executor_queue_seconds', started - queued_at, pool=pool)
+        try:
+            thread.handler(message, queued_at)
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_times[pool] += (elapsed - self._service_times[pool]) * SERVICE_TIME_WEIGHT
+            thread.finished += 1
+            self._add_callback(self.dispatch, pool)
+
+
+class AdmissionControl:
+
+    def __init__(self, target: Callable, rep_stream, limiter: RateLimiter, codec: Codec = None, metrics: Metrics = None):
+        """
+        Applies the per client rate limits of the server in front of ``target``. The requests of a client
+        which exceeds its rate are turned away with a reply asking it to retry once it has a token again.
+
+        Args:
+            target: The callback handling the admitted messages, e.g. a :class: `sqlite_rx.server.QueryStreamHandler`
+            rep_stream: The stream of the `zmq.ROUTER` socket, on which turned away requests are replied to
+            limiter: The :class: `sqlite_rx.admission.RateLimiter` holding a token bucket per client id
+            codec: The :class: `sqlite_rx.codec.Codec` of the server
+            metrics: The :class: `sqlite_rx.metrics.Metrics` counting the requests turned away
+
+        """
+        self._target = target
+        self._rep_stream = rep_stream
+        self._limiter = limiter
+        self._codec = codec or Codec()
+        self._metrics = metrics
+
+    def __call__(self, message: List):
+        try:
+            request, peer = decode_request(message, self._codec)
+        except Exception:
+            # Let the target reply with a proper error.
+            self._target(message)
+            return
+        wait = self._limiter.take(request.get('client_id'))
+        if not wait:
+            self._target(message)
+            return
+        if self._metrics is not None:
+            self._metrics.inc('rejected_total', reason='rate_limit')
+        envelope, _, _ = split_message(message)
+        self._rep_stream.send_multipart(envelope + overloaded_reply(self._codec, peer, retry_after_ms(wait)),
+                                        copy=False)
+
+
+class DatabasePool:
+
+    def __init__(self,
+                 rep_stream,
+                 directory: str,
+                 factory: Callable[[str, ScopedMetrics], 'QueryStreamHandler'],
+                 default: 'QueryStreamHandler' = None,
+                 max_databases: int = MAX_OPEN_DATABASES,
+                 max_memory: int = None,
+                 create: bool = False,
+                 codec: Codec = None,
+                 metrics: Metrics = None):
+        """
+        Hosts the databases of a directory. A request names its database with ``database``, the name of a
+        file in ``directory``, and requests which name none are served by ``default``.
+
+        Every database gets a :class: `sqlite_rx.server.QueryStreamHandler` of its own when it is first
+        requested, whose connection is in WAL mode with the authorizer already set. The handlers are kept in
+        an LRU bounded by their number and by the memory their connections may hold. The least recently used
+        database without an open cursor or transaction is closed first.
+
+        Args:
+            rep_stream: The stream on which the handlers reply, and on which requests for unknown databases are replied to
+            directory: The directory holding the databases
+            factory: Returns the handler of a database given its path and the metrics to record in, if any
+            default: The handler of the requests which name no database. None replies to them with an error.
+            max_databases: Maximum number of open databases
+            max_memory: Maximum number of bytes the open databases may hold, see
+                :meth: `sqlite_rx.server.QueryStreamHandler.memory_estimate`. None, the default, disables the limit.
+            create: True to create the databases which don't exist yet. False replies to their requests with an error.
+            codec: The :class: `sqlite_rx.codec.Codec` of the server
+            metrics: The :class: `sqlite_rx.metrics.Metrics` in which every database records its requests under a
+                ``database`` label
+
+        """
+        self._rep_stream = rep_stream
+        self._directory = directory
+        self._factory = factory
+        self._default = default
+        self._max_databases = max_databases
+        self._max_memory = max_memory
+        self._create = create
+        self._codec = codec or Codec()
+        self._metrics = metrics
+        self._handlers = OrderedDict()
+        self._scopes = {}
+        # Memory estimated when a database was last opened
+        self._memory = 0
+        if metrics is not None:
+            metrics.gauge('open_databases', lambda: len(self._handlers))
+            metrics.gauge('open_databases_bytes', lambda: self._memory)
+
+    def path(self, name) -> str:
+        """The path of the database called ``name``
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxUnknownDatabaseError: If ``name`` is not the name of a database file
+
+        """
+        if not isinstance(name, str) or not DATABASE_NAME.match(name) or name.endswith(SQLITE_SIDE_FILES):
+            raise SQLiteRxUnknownDatabaseError("Invalid database name {!r}".format(name))
+        return os.path.join(self._directory, name)
+
+    def open(self, name: str) -> 'QueryStreamHandler':
+        """The handler of the database called ``name``, opening the database if needed
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxUnknownDatabaseError: If there is no such database and databases aren't created
+
+        """
+        handler = self._handlers.get(name)
+        if handler is not None:
+            self._handlers.move_to_end(name)
+            return handler
+        path = self.path(name)
+        if not self._create and not os.path.isfile(path):
+            raise SQLiteRxUnknownDatabaseError("No database named {!r}".format(name))
+        LOG.info("Opening database %s", path)
+        scope = self._metrics.scoped('database', name) if self._metrics is not None else None
+        try:
+            handler = self._factory(path, scope)
+        except Exception:
+            if scope is not None:
+                scope.close()
+            raise
+        self._handlers[name] = handler
+        self._scopes[name] = scope
+        self.evict()
+        return handler
+
+    def evict(self):
+        """Close the least recently used databases until the open databases are within the limits"""
+        estimates = {name: handler.memory_estimate() for name, handler in self._handlers.items()}
+        memory = sum(estimates.values())
+        # The database just opened is the most recently used and stays open
+        candidates = [name for name in list(self._handlers)[:-1] if not self._handlers[name].busy]
+        while len(self._handlers) > self._max_databases or (self._max_memory is not None and memory > self._max_memory):
+            if not candidates:
+                LOG.warning("All the %s open databases are in use, exceeding the limits", len(self._handlers))
+                break
+            name = candidates.pop(0)
+            memory -= estimates.get(name, 0)
+            self.close(name)
+            if self._metrics is not None:
+                self._metrics.inc('database_evictions_total')
+        self._memory = memory
+
+    @property
+    def pins_reads(self) -> bool:
+        """True if the default database or an open database pins the reads to this thread"""
+        return any(handler.pins_reads for handler in self._handlers.values()) or \
+            (self._default is not None and self._default.pins_reads)
+
+    def close(self, name: str):
+        LOG.info("Closing database %s", name)
+        handler = self._handlers.pop(name)
+        scope = self._scopes.pop(name)
+        try:
+            handler.close()
+        finally:
+            if scope is not None:
+                scope.close()
+
+    def close_all(self):
+        for name in list(self._handlers):
+            self.close(name)
+
+    def __call__(self, message: List, received_at: float = None):
+        try:
+            request, peer = decode_request(message, self._codec)
+        except Exception:
+            request, peer = {}, LEGACY_PEER
+        name = request.get('database')
+        try:
+            if name is not None:
+                handler = self.open(name)
+            elif self._default is not None:
+                handler = self._default
+            else:
+                raise SQLiteRxUnknownDatabaseError("The request names no database")
+        except (SQLiteRxUnknownDatabaseError, sqlite3.Error) as e:
+            LOG.warning("Can't serve database %r: %s", name, e)
+            envelope, _, _ = split_message(message)
+            self._rep_stream.send_multipart(envelope + error_reply(self._codec, peer, e), copy=False)
+            return
+        handler(message, received_at)
 
 
 class QueryStreamHandler:
@@ -205,7 +1282,18 @@ class QueryStreamHandler:
     def __init__(self,
                  rep_stream,
                  database: Union[bytes, str],
-                 auth_config: dict = None):
+                 auth_config: dict = None,
+                 read_only: bool = False,
+                 codec: Codec = None,
+                 cache_size: int = 0,
+                 group_commit_window: float = 0,
+                 group_commit_size: int = GROUP_COMMIT_SIZE,
+                 metrics: Metrics = None,
+                 slow_query_threshold: float = None,
+                 slow_query_log: str = None,
+                 redact_params: bool = False,
+                 query_stats: int = 0,
+                 replication=None):
         """
         Executes SQL queries and send results back on the `zmq.REP` stream
 
@@ -213,75 +1301,821 @@ class QueryStreamHandler:
              rep_stream: The zmq.REP socket stream on which to send replies.
              database: A path like object or the string ":memory:" for in-memory database.
              auth_config: A dictionary describing what actions are authorized, denied or ignored.
+             read_only: True if the connection should refuse to modify the database.
+             codec: The :class: `sqlite_rx.codec.Codec` used to decode requests and encode replies.
+             cache_size: Size in bytes of the result cache. 0 disables the cache.
+             group_commit_window: Seconds during which single write statements are collected and then
+                executed in one transaction, each inside a savepoint of its own. 0 disables group commit.
+             group_commit_size: Maximum number of write requests committed together.
+             metrics: The :class: `sqlite_rx.metrics.Metrics` in which to count requests and time the phases
+                of their handling. None, the default, disables metrics.
+             slow_query_threshold: Duration in seconds above which queries are logged with their query plan.
+                None disables the slow query log.
+             slow_query_log: Path of the rotating slow query log. Defaults to the ``sqlite_rx.slowlog`` logger.
+             redact_params: True to leave the query parameters out of the slow query log.
+             query_stats: Number of query fingerprints in the :class: `sqlite_rx.querystats.QueryStats`. 0 disables it.
+             replication: The :class: `sqlite_rx.replication.ReplicationLog` publishing the writes of a primary,
+                or the :class: `sqlite_rx.replication.Follower` of a follower. None disables replication.
 
         """
         self._connection = sqlite3.connect(database=database,
                                            isolation_level=None,
-                                           check_same_thread=False)
+                                           check_same_thread=False,
+                                           cached_statements=MAX_PREPARED_STATEMENTS)
         self._connection.execute('pragma journal_mode=wal')
-        self._connection.set_authorizer(Authorizer(config=auth_config))
+        if read_only:
+            self._connection.execute('pragma query_only=ON')
+        self._database = database
+        # Read before the authorizer, which ignores pragmas, is set. A negative cache_size is in KiB.
+        page_size = self._connection.execute('pragma page_size').fetchone()[0]
+        page_cache = self._connection.execute('pragma cache_size').fetchone()[0]
+        self._page_cache = -page_cache * 1024 if page_cache < 0 else page_cache * page_size
+        authorizer = Authorizer(config=auth_config)
+        self._tracker = None
+        self._cache = None
+        if cache_size:
+            self._tracker = TableTracker(authorizer)
+            self._cache = ResultCache(cache_size)
+            authorizer = self._tracker
+        self._replication = replication
+        if replication is not None:
+            authorizer = replication.attach(self._connection, authorizer)
+        self._local_objects = False
+        self._connection.set_authorizer(self.watch_local_objects(authorizer))
         self._cursor = self._connection.cursor()
+        self._cursors = OrderedDict()
+        self._statements = OrderedDict()
+        self._statement_hits = 0
+        self._statement_misses = 0
         self._rep_stream = rep_stream
+        self._codec = codec or Codec()
+        self._group_commit_window = group_commit_window
+        self._group_commit_size = group_commit_size
+        self._pending_writes = []
+        self._group_timer = None
+        self._groups = 0
+        self._grouped_writes = 0
+        self._deadline = None
+        self._metrics = metrics
+        self._timer = NULL_TIMER
+        self._query_stats = QueryStats(query_stats) if query_stats else None
+        self._slow_log = None
+        if slow_query_threshold is not None:
+            self._slow_log = SlowQueryLog(database,
+                                          slow_query_threshold,
+                                          path=slow_query_log,
+                                          redact_params=redact_params,
+                                          connection=self._connection)
+        if metrics is not None:
+            metrics.gauge('open_cursors', lambda: len(self._cursors))
+            metrics.gauge('prepared_statements', lambda: len(self._statements))
+            if group_commit_window:
+                metrics.gauge('pending_writes', lambda: len(self._pending_writes))
+            if self._cache is not None:
+                metrics.gauge('result_cache_bytes', lambda: self._cache.size)
 
-    @staticmethod
-    def capture_exception():
+    def capture_exception(self):
         exc_type, exc_value, exc_tb = sys.exc_info()
+        if self.is_interrupted(exc_value):
+            exc_type, exc_value = SQLiteRxTimeoutError, self.timeout_error()
+            if self._metrics is not None:
+                self._metrics.inc('deadline_exceeded_total', stage='executing')
         exc_type_string = "%s.%s" % (exc_type.__module__, exc_type.__name__)
         error = {"type": exc_type_string, "message": traceback.format_exception_only(exc_type, exc_value)[-1].strip()}
         return error
 
-    def __call__(self, message: List):
+    @staticmethod
+    def timeout_error() -> SQLiteRxTimeoutError:
+        return SQLiteRxTimeoutError("The request exceeded its deadline and was cancelled by the server")
+
+    def is_interrupted(self, exception: BaseException) -> bool:
+        """Returns True if ``exception`` was raised by sqlite interrupting a statement past the request's deadline"""
+        return (isinstance(exception, sqlite3.OperationalError)
+                and str(exception) == 'interrupted'
+                and self._deadline is not None
+                and time.monotonic() >= self._deadline)
+
+    @staticmethod
+    def deadline(message: dict, received_at: float = None):
+        """The `time.monotonic` time by which a request must be replied to, or None if it has no deadline.
+
+        Clients send their ``timeout`` in ms, which runs from the time the server received the request.
+
+        """
+        timeout = message.get('timeout')
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            return None
+        return (received_at if received_at is not None else time.monotonic()) + timeout / 1000
+
+    def set_deadline(self, deadline):
+        """Interrupt the statements of the connection once ``deadline`` has passed. None removes the deadline."""
+        if deadline is None and self._deadline is None:
+            return
+        self._deadline = deadline
+        if deadline is None:
+            self._connection.set_progress_handler(None, PROGRESS_STEPS)
+        else:
+            self._connection.set_progress_handler(self._past_deadline, PROGRESS_STEPS)
+
+    def _past_deadline(self) -> bool:
+        # A true value makes sqlite interrupt the running statement
+        return time.monotonic() >= self._deadline
+
+    def time_out(self, envelope: List, peer: Peer, kind: str):
+        """Reply to a request whose deadline passed before it was executed"""
+        LOG.warning("Skipping a %s request past its deadline", kind)
+        if self._metrics is not None:
+            self._metrics.inc('deadline_exceeded_total', stage='queued')
+        error = {"type": "{}.{}".format(SQLiteRxTimeoutError.__module__, SQLiteRxTimeoutError.__name__),
+                 "message": str(self.timeout_error())}
+        self.send(envelope, self.encode_reply({"items": [], "error": error}, peer, kind))
+
+    def __call__(self, message: List, received_at: float = None):
+        """Handle a multipart message received by the server.
+
+        Args:
+            message: The frames of the message
+            received_at: The `time.monotonic` time at which the server received the message, from which
+                the request's deadline runs. Defaults to now.
+
+        """
+        envelope, body, blobs = split_message(message)
+        body = _buffer(body)
+        peer = LEGACY_PEER
+        kind = 'unknown'
+        timer = self._timer = PhaseTimer(self._metrics) if self._metrics is not None else NULL_TIMER
         try:
-            message = message[-1]
-            message = msgpack.loads(zlib.decompress(message), raw=False)
-            self._rep_stream.send(self.execute(message))
+            payload, peer = self._codec.decode(body)
+            timer.lap('decompress')
+            # Out-of-band blobs are bound as views of the frames they were received in
+            message = msgpack.loads(payload, raw=False, ext_hook=blob_hook([_buffer(blob) for blob in blobs]))
+            timer.lap('unpack')
+            if self._metrics is not None:
+                kind = request_kind(message)
+                self._metrics.inc('requests_total', kind=kind)
+                self._metrics.inc('received_bytes_total', len(body))
+                self._metrics.inc('received_payload_bytes_total', len(payload))
+            peer = self._codec.negotiate(peer, message)
+            deadline = self.deadline(message, received_at)
+            if deadline is not None and time.monotonic() >= deadline:
+                # It waited in a queue for longer than the client waits for the reply
+                self.time_out(envelope, peer, kind)
+                return
+            if self._group_commit_window:
+                if self.is_groupable(message):
+                    self.defer_write(envelope, message, peer, deadline)
+                    return
+                # Pending writes are committed first so that requests are served in order.
+                self.flush_writes()
+            key = self.cache_key(message, peer)
+            if key is not None:
+                reply = self._cache.get(key)
+                if reply is not None:
+                    LOG.debug("Serving query from the result cache")
+                    if self._query_stats is not None:
+                        self._query_stats.cache_hit(key[0], len(reply))
+                    self.send(envelope, [reply])
+                    return
+            if self._tracker is not None:
+                self._tracker.begin()
+            self.set_deadline(deadline)
+            try:
+                result = self.execute(message)
+            finally:
+                self.set_deadline(None)
+            if self._replication is not None:
+                # Publish the writes of a transaction which ended with this request
+                self._replication.flush()
+            reply = self.encode_reply(result, peer, kind)
+            if self._query_stats is not None and isinstance(message.get('query'), str):
+                self._query_stats.add_bytes(message['query'], message_size(reply))
+            if self._tracker is not None:
+                # Replies with out-of-band blobs are not cached
+                self.update_cache(key if len(reply) == 1 else None, reply[0])
+            self.send(envelope, reply)
         except Exception:
             LOG.exception("exception while preparing response")
             error = self.capture_exception()
             result = {"items": [],
                       "error": error}
-            self._rep_stream.send(zlib.compress(msgpack.dumps(result)))
+            self.send(envelope, self.encode_reply(result, peer, kind))
+
+    def encode_reply(self, result: dict, peer: Peer, kind: str) -> List:
+        """Serialize and compress the reply to a request of the given kind.
+
+        Returns:
+            The frames of the reply: the message, followed by the blobs sent out-of-band when the peer reads them
+
+        """
+        blobs = []
+        if self._codec.out_of_band(peer):
+            result = self.detach(result, blobs)
+        payload = msgpack.dumps(result)
+        self._timer.lap('pack')
+        reply = [self._codec.encode(payload, peer)] + blobs
+        self._timer.lap('compress')
+        if self._metrics is not None:
+            # Replies served from the result cache are accounted for by the cache statistics.
+            self._metrics.inc('sent_payload_bytes_total', len(payload))
+            self._metrics.inc('sent_bytes_total', message_size(reply))
+            if result.get('error'):
+                self._metrics.inc('errors_total', kind=kind)
+        return reply
+
+    def detach(self, result: dict, blobs: List) -> dict:
+        """Move the large blobs of the rows, or the columns, of a result to ``blobs``"""
+        detach = self._codec.detach
+        if result.get('items'):
+            result = dict(result, items=[detach(row, blobs) for row in result['items']])
+        if result.get('data'):
+            result = dict(result, data=[detach(column, blobs) if isinstance(column, list) else column
+                                        for column in result['data']])
+        if result.get('results'):
+            result = dict(result, results=[self.detach(statement, blobs) for statement in result['results']])
+        return result
+
+    def send(self, envelope: List, reply: List):
+        # Blobs are handed to zmq without copying them
+        self._rep_stream.send_multipart(envelope + reply, copy=False)
+        self._timer.lap('send')
+
+    def is_groupable(self, message: dict) -> bool:
+        """Returns True if the request is a single write statement which can join a group commit"""
+        if message.get('execute_script') or any(key in message for key in SPECIAL_REQUESTS):
+            return False
+        query = message.get('query')
+        if query is None and 'statement_id' in message:
+            query = self._statements.get(message['statement_id'])
+        if not isinstance(query, str) or not is_plain_write(query):
+            return False
+        # A transaction opened by a client with BEGIN can't be mixed with the group's transaction.
+        return not self._connection.in_transaction
+
+    def defer_write(self, envelope: List, message: dict, peer: Peer, deadline: float = None):
+        """Add a write request to the pending group, which is committed when it is full or when the window closes"""
+        self._pending_writes.append((envelope, message, peer, deadline))
+        if len(self._pending_writes) >= self._group_commit_size:
+            self.flush_writes()
+        elif self._group_timer is None:
+            self._group_timer = asyncio.get_event_loop().call_later(self._group_commit_window, self.flush_writes)
+
+    def flush_writes(self):
+        """Commit the pending write requests together and send every client its own reply"""
+        if self._group_timer is not None:
+            self._group_timer.cancel()
+            self._group_timer = None
+        pending, self._pending_writes = self._pending_writes, []
+        now = time.monotonic()
+        for envelope, message, peer, deadline in pending:
+            if deadline is not None and now >= deadline:
+                self.time_out(envelope, peer, request_kind(message))
+        pending = [write for write in pending if write[3] is None or now < write[3]]
+        if not pending:
+            return
+
+        self._timer = PhaseTimer(self._metrics) if self._metrics is not None else NULL_TIMER
+        if self._tracker is not None:
+            self._tracker.begin()
+        results = self.execute_group([message for _, message, _, _ in pending],
+                                     [deadline for _, _, _, deadline in pending])
+        if self._replication is not None:
+            self._replication.flush()
+        self._timer.lap('execute')
+        if self._tracker is not None:
+            self.update_cache(None, b'')
+
+        for (envelope, message, peer, _), result in zip(pending, results):
+            kind = request_kind(message)
+            try:
+                reply = self.encode_reply(result, peer, kind)
+            except Exception:
+                LOG.exception("exception while preparing response")
+                reply = self.encode_reply({"items": [], "error": self.capture_exception()}, peer, kind)
+            self.send(envelope, reply)
+
+    def track(self, query: str):
+        """Record the tables read and written by ``query`` when the result cache is enabled"""
+        if self._tracker is None:
+            return nullcontext()
+        return self._tracker.track(query)
+
+    def replicate(self, query: str, params, mode: str):
+        """Record ``query`` for the followers when it is a write executed successfully on a primary"""
+        if self._replication is None:
+            return nullcontext()
+        return self._replication.write(query, params, mode)
+
+    def cache_key(self, message: dict, peer: Peer):
+        """Returns the result cache key of a request, or None if its reply can't be cached.
+
+        Only single statements are cached. The key holds the SQL, the parameters, the result format
+        and the codec capabilities of the client, since the cached reply is already encoded. Inside an
+        explicit transaction the cache is bypassed, since what the transaction reads may be rolled back.
+
+        """
+        if self._cache is None or self._connection.in_transaction:
+            return None
+        if message.get('execute_many') or message.get('execute_script'):
+            return None
+        if any(key in message for key in SPECIAL_REQUESTS):
+            return None
+        query = message.get('query')
+        if query is None and 'statement_id' in message:
+            query = self._statements.get(message['statement_id'])
+        if not isinstance(query, str) or not is_deterministic(query):
+            return None
+
+        self._tracker.internal = True
+        try:
+            data_version = self._connection.execute('pragma data_version').fetchone()[0]
+        finally:
+            self._tracker.internal = False
+        self._cache.check_data_version(data_version)
+        return query, msgpack.dumps(message.get('params')), message.get('result_format'), peer
+
+    def update_cache(self, key, reply: bytes):
+        """Invalidate the results which read a table written by the request, or cache the reply of a read"""
+        tracker = self._tracker
+        if tracker.writes:
+            self._cache.invalidate(tracker.writes)
+        elif key is not None and tracker.complete and tracker.reads and not tracker.failed \
+                and not self._connection.in_transaction:
+            self._cache.put(key, reply, tracker.reads)
+
+    def execute(self, message: dict, *args, **kwargs) -> dict:
+        if 'admin' in message:
+            return self.admin(message)
+
+        if 'cursor_id' in message:
+            return self.fetch(message)
+
+        if 'batch' in message:
+            return self.execute_batch(message)
+
+        if 'prepare' in message or 'statement_id' in message:
+            try:
+                message['query'] = self.resolve_statement(message)
+            except Exception:
+                LOG.exception("Exception while resolving prepared statement")
+                return {"items": [], "error": self.capture_exception()}
+            if 'prepare' in message:
+                result = {"items": [], "error": None, "statement_id": statement_id(message['query'])}
+                return result
 
-    def execute(self, message: dict, *args, **kwargs):
         execute_many = message['execute_many']
         execute_script = message['execute_script']
+        batch_size = message.get('batch_size')
+        # Streaming requests get a cursor of their own which stays open between fetches.
+        cursor = self._connection.cursor() if batch_size else self._cursor
         error = None
+        started = time.perf_counter()
+        if execute_script:
+            mode = 'script'
+        elif execute_many and message['params']:
+            mode = 'many'
+        elif message['params']:
+            mode = 'params'
+        else:
+            mode = 'plain'
         try:
-            if execute_script:
-                LOG.debug("Query Mode: Execute Script")
-                self._cursor.executescript(message['query'])
-            elif execute_many and message['params']:
-                LOG.debug("Query Mode: Execute Many")
-                self._cursor.executemany(message['query'], message['params'])
-            elif message['params']:
-                LOG.debug("Query Mode: Conditional Params")
-                self._cursor.execute(message['query'], message['params'])
-            else:
-                LOG.debug("Query Mode: Default No params")
-                self._cursor.execute(message['query'])
+            with self.track(message['query']), self.replicate(message['query'], message['params'], mode):
+                if mode == 'script':
+                    LOG.debug("Query Mode: Execute Script")
+                    cursor.executescript(message['query'])
+                elif mode == 'many':
+                    LOG.debug("Query Mode: Execute Many")
+                    cursor.executemany(message['query'], message['params'])
+                elif mode == 'params':
+                    LOG.debug("Query Mode: Conditional Params")
+                    cursor.execute(message['query'], message['params'])
+                else:
+                    LOG.debug("Query Mode: Default No params")
+                    cursor.execute(message['query'])
+            self._timer.lap('execute')
         except Exception:
             LOG.exception("Exception while executing query %s", message['query'])
             error = self.capture_exception()
+            if self._query_stats is not None:
+                self._query_stats.record(message['query'], time.perf_counter() - started, error=True)
 
         result = {
             "items": [],
             "error": error
         }
         if error:
-            return zlib.compress(msgpack.dumps(result))
+            return result
 
         try:
-            result['items'] = list(self._cursor.fetchall())
-            # If rowcount attribute is set on the cursor object include it in the response
-            if self._cursor.rowcount > -1:
-                result['rowcount'] = self._cursor.rowcount
-            # If lastrowid attribute is set on the cursor include it in the response
-            if self._cursor.lastrowid:
-                result['lastrowid'] = self._cursor.lastrowid
-
-            return zlib.compress(msgpack.dumps(result))
+            if batch_size:
+                self.open_cursor(cursor, batch_size, result)
+                rows = len(result['items'])
+            else:
+                self.collect(cursor, result)
+                rows = len(result['items']) or result.get('rowcount', 0)
+                if message.get('result_format') == 'columnar':
+                    self.to_columns(cursor, result)
+            self._timer.lap('fetch')
+            duration = time.perf_counter() - started
+            if self._metrics is not None:
+                self._metrics.observe('query_seconds', duration, mode=mode)
+            if self._query_stats is not None:
+                self._query_stats.record(message['query'], duration, rows)
+            if self._slow_log is not None:
+                self._slow_log.check(duration, message, message['query'], message['params'], mode, rows)
+            return result
 
         except Exception:
             LOG.exception("Exception while collecting rows")
             result['error'] = self.capture_exception()
-            return zlib.compress(msgpack.dumps(result))
+            return result
+
+    @staticmethod
+    def collect(cursor: sqlite3.Cursor, result: dict):
+        result['items'] = list(cursor.fetchall())
+        # If rowcount attribute is set on the cursor object include it in the response
+        if cursor.rowcount > -1:
+            result['rowcount'] = cursor.rowcount
+        # If lastrowid attribute is set on the cursor include it in the response
+        if cursor.lastrowid:
+            result['lastrowid'] = cursor.lastrowid
+
+    @staticmethod
+    def to_columns(cursor: sqlite3.Cursor, result: dict):
+        """Replace the rows in ``result`` with the column names and one packed array or list per column"""
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+        result['columns'] = columns
+        result['data'] = pack_columns(len(columns), result['items'])
+        result['items'] = []
+
+    def execute_batch(self, message: dict) -> dict:
+        """Execute a list of ``[query, params]`` statements and reply with one result per statement.
+
+        A transactional batch runs inside a single ``BEGIN``/``COMMIT`` and is rolled back on the
+        first error. Otherwise every statement is committed on its own and the batch stops at
+        the first error. In both cases ``failed_statement`` is the index of the statement in error.
+
+        """
+        transactional = message.get('transactional', True)
+        results = []
+        result = {
+            "items": [],
+            "error": None,
+            "results": results
+        }
+        try:
+            if transactional:
+                self._cursor.execute('BEGIN')
+        except Exception:
+            LOG.exception("Exception while starting the batch transaction")
+            result['error'] = self.capture_exception()
+            return result
+
+        for index, (query, params) in enumerate(message['batch']):
+            statement_result = {"items": []}
+            try:
+                started = time.perf_counter()
+                with self.track(query), self.replicate(query, params, 'params' if params else 'plain'):
+                    self._cursor.execute(query, params or ())
+                self.collect(self._cursor, statement_result)
+                self.account(message, query, params, 'params', time.perf_counter() - started,
+                             len(statement_result['items']) or statement_result.get('rowcount', 0))
+            except Exception:
+                LOG.exception("Exception while executing batch statement %s", query)
+                if self._query_stats is not None:
+                    self._query_stats.record(query, time.perf_counter() - started, error=True)
+                result['error'] = self.capture_exception()
+                result['failed_statement'] = index
+                break
+            results.append(statement_result)
+
+        try:
+            if transactional and result['error']:
+                self._cursor.execute('ROLLBACK')
+                results.clear()
+            elif transactional:
+                self._cursor.execute('COMMIT')
+        except Exception:
+            LOG.exception("Exception while ending the batch transaction")
+            if self._connection.in_transaction:
+                self._cursor.execute('ROLLBACK')
+            results.clear()
+            result['error'] = self.capture_exception()
+        return result
+
+    def execute_group(self, messages: List[dict], deadlines: List[float] = None) -> List[dict]:
+        """Execute single write statements in one transaction and return one result per statement.
+
+        Every statement runs inside a savepoint which is rolled back if the statement fails, so
+        a failing statement has no effect on the others. A statement is interrupted once its
+        deadline in ``deadlines`` has passed. If the commit fails all of them fail.
+
+        """
+        self._groups += 1
+        self._grouped_writes += len(messages)
+        LOG.debug("Group commit of %s write requests", len(messages))
+        return self.run_group(messages, deadlines if deadlines is not None else [None] * len(messages))
+
+    def run_group(self, messages: List[dict], deadlines: List[float]) -> List[dict]:
+        """Execute ``messages`` in one transaction, see :meth: `execute_group`"""
+        try:
+            self._cursor.execute('BEGIN')
+        except Exception:
+            LOG.exception("Exception while starting the group transaction")
+            error = self.capture_exception()
+            return [{"items": [], "error": error} for _ in messages]
+
+        results = []
+        # The statements are accounted for once committed, since a rolled back group runs again
+        executed = []
+        for index, (message, deadline) in enumerate(zip(messages, deadlines)):
+            result = self.execute_grouped(message, deadline, executed)
+            if result['error'] is not None and not self._connection.in_transaction:
+                # sqlite rolls back the whole transaction when a write is interrupted, which undoes
+                # the statements before this one. The group runs again without this statement.
+                LOG.warning("Group transaction rolled back, executing the other %s write requests again",
+                            len(messages) - 1)
+                others = self.run_group(messages[:index] + messages[index + 1:],
+                                        deadlines[:index] + deadlines[index + 1:])
+                return others[:index] + [result] + others[index:]
+            results.append(result)
+
+        try:
+            self._cursor.execute('COMMIT')
+        except Exception:
+            LOG.exception("Exception while committing the group transaction")
+            if self._connection.in_transaction:
+                self._cursor.execute('ROLLBACK')
+            error = self.capture_exception()
+            return [{"items": [], "error": error} for _ in messages]
+        for statement in executed:
+            self.account(*statement)
+        return results
+
+    def execute_grouped(self, message: dict, deadline: float, executed: List) -> dict:
+        """Execute a statement of a group commit in a savepoint, which is rolled back if the statement fails.
+        The arguments of :meth: `account` for the statement are added to ``executed`` if it succeeds."""
+        result = {"items": [], "error": None}
+        try:
+            query = self.resolve_statement(message) if 'statement_id' in message else message['query']
+            params = message.get('params')
+            self._cursor.execute('SAVEPOINT group_write')
+            self.set_deadline(deadline)
+            try:
+                started = time.perf_counter()
+                if message.get('execute_many') and params:
+                    mode = 'many'
+                elif params:
+                    mode = 'params'
+                else:
+                    mode = 'plain'
+                with self.track(query), self.replicate(query, params, mode):
+                    if mode == 'many':
+                        self._cursor.executemany(query, params)
+                    elif mode == 'params':
+                        self._cursor.execute(query, params)
+                    else:
+                        self._cursor.execute(query)
+                self.collect(self._cursor, result)
+                executed.append((message, query, params, mode, time.perf_counter() - started,
+                                 result.get('rowcount', 0)))
+            except Exception:
+                if self._connection.in_transaction:
+                    self._cursor.execute('ROLLBACK TO group_write')
+                raise
+            finally:
+                if self._connection.in_transaction:
+                    self._cursor.execute('RELEASE group_write')
+        except Exception:
+            LOG.exception("Exception while executing grouped query %s", message.get('query'))
+            result['items'] = []
+            # Captured before the deadline is removed, which tells an interrupted statement
+            result['error'] = self.capture_exception()
+        finally:
+            self.set_deadline(None)
+        return result
+
+    def account(self, message: dict, query: str, params, mode: str, duration: float, rows: int):
+        """Add a statement executed as part of a batch or a group commit to the query statistics and
+        to the slow query log"""
+        if self._query_stats is not None:
+            self._query_stats.record(query, duration, rows)
+        if self._slow_log is not None:
+            self._slow_log.check(duration, message, query, params, mode, rows)
+
+    def resolve_statement(self, message: dict) -> str:
+        """Returns the SQL of a prepared statement request.
+
+        A request carrying the SQL (``prepare`` or a re-sent ``query``) registers the statement
+        in the LRU of prepared statements. A request carrying only the ``statement_id`` is looked
+        up in it. Statements are compiled and cached by sqlite3 under their SQL text, and sqlite
+        recompiles them by itself after a schema change.
+
+        Raises:
+            sqlite_rx.exception.SQLiteRxUnknownStatementError: If the statement is not (or no longer) registered.
+            The client then sends the request again along with the SQL.
+
+        """
+        query = message.get('prepare', message.get('query'))
+        if query is not None:
+            self._statement_misses += 1
+            key = statement_id(query)
+            self._statements[key] = query
+            self._statements.move_to_end(key)
+            if len(self._statements) > MAX_PREPARED_STATEMENTS:
+                self._statements.popitem(last=False)
+            return query
+
+        key = message['statement_id']
+        query = self._statements.get(key)
+        if query is None:
+            raise SQLiteRxUnknownStatementError("Unknown prepared statement {}".format(key))
+        self._statement_hits += 1
+        self._statements.move_to_end(key)
+        return query
+
+    def admin(self, message: dict) -> dict:
+        """Serve an administrative request: ``stats``, ``metrics``, ``slow_queries``, ``query_stats``,
+        ``reset_query_stats`` or ``replication``"""
+        result = {"items": [], "error": None}
+        try:
+            command = message['admin']
+            if command == 'stats':
+                result['stats'] = self.stats()
+            elif command == 'metrics':
+                result['metrics'] = self._metrics.snapshot() if self._metrics is not None else None
+            elif command == 'slow_queries':
+                result['slow_queries'] = list(self._slow_log.recent) if self._slow_log is not None else None
+            elif command == 'query_stats':
+                if self._query_stats is not None:
+                    statements = self._query_stats.top(order_by=message.get('order_by', 'total_time'),
+                                                       limit=message.get('limit', 20))
+                    result['query_stats'] = dict(self._query_stats.stats(), statements=statements)
+                else:
+                    result['query_stats'] = None
+            elif command == 'reset_query_stats':
+                if self._query_stats is not None:
+                    self._query_stats.reset()
+            elif command == 'replication':
+                result['replication'] = self._replication.status(message) if self._replication is not None else None
+            else:
+                raise ValueError("Unknown admin command {}".format(command))
+        except Exception:
+            LOG.exception("Exception while serving admin request")
+            result['error'] = self.capture_exception()
+        return result
+
+    def watch_local_objects(self, authorizer: Callable) -> Callable:
+        """Wraps ``authorizer`` to notice the creation of TEMP objects and the attachment of databases"""
+        def authorize(action, arg1, arg2, dbname, source):
+            if action in LOCAL_OBJECT_ACTIONS:
+                self._local_objects = True
+            return authorizer(action, arg1, arg2, dbname, source)
+        return authorize
+
+    @property
+    def pins_reads(self) -> bool:
+        """True if reads must be served by this connection rather than by a reader: it is in a transaction,
+        whose changes only it sees, or it has created TEMP objects or attached databases, which other
+        connections don't have"""
+        return self._connection.in_transaction or self._local_objects
+
+    @property
+    def busy(self) -> bool:
+        """True while the connection holds state between requests: an open cursor or a transaction"""
+        return bool(self._cursors) or self._connection.in_transaction
+
+    def memory_estimate(self) -> int:
+        """Bytes the connection may hold: its page cache, which can't outgrow the database and its WAL, and the
+        cached replies"""
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(os.fsdecode(self._database) + suffix)
+            except OSError:
+                pass
+        return min(self._page_cache, size) + (self._cache.size if self._cache is not None else 0)
+
+    def close(self):
+        """Commit the pending writes, then close the open cursors and the connections"""
+        self.flush_writes()
+        for cursor_id in list(self._cursors):
+            self.close_cursor(cursor_id)
+        if self._slow_log is not None:
+            self._slow_log.close()
+        self._connection.close()
+
+    def stats(self) -> dict:
+        return {
+            "prepared_statements": {
+                "size": len(self._statements),
+                "hits": self._statement_hits,
+                "misses": self._statement_misses
+            },
+            "open_cursors": len(self._cursors),
+            "result_cache": self._cache.stats() if self._cache is not None else None,
+            "group_commit": {
+                "groups": self._groups,
+                "writes": self._grouped_writes,
+                "pending": len(self._pending_writes)
+            } if self._group_commit_window else None,
+            "slow_queries": self._slow_log.count if self._slow_log is not None else None,
+            "query_stats": self._query_stats.stats() if self._query_stats is not None else None
+        }
+
+    def open_cursor(self, cursor: sqlite3.Cursor, batch_size: int, result: dict):
+        """Collect the first batch of a streaming request into ``result``.
+
+        If more rows may follow, the cursor is kept open under a new ``cursor_id`` which the
+        client passes back to fetch the following batches. A ``cursor_id`` of None means
+        the result set is exhausted.
+
+        """
+        rows = cursor.fetchmany(batch_size)
+        result['items'] = rows
+        result['cursor_id'] = None
+        if len(rows) < batch_size:
+            cursor.close()
+            return
+
+        self._expire_cursors()
+        cursor_id = uuid.uuid4().hex
+        self._cursors[cursor_id] = OpenCursor(cursor, batch_size, rows)
+        result['cursor_id'] = cursor_id
+        LOG.debug("Opened cursor %s", cursor_id)
+
+    def fetch(self, message: dict) -> dict:
+        """Fetch the next batch of rows from an open cursor or close it.
+
+        The request carries the number of rows the client has received so far as ``position``.
+        If it points at the start of the previous batch, the request is a retry and the
+        previous batch is sent again so that no rows are lost.
+
+        """
+        cursor_id = message['cursor_id']
+        result = {
+            "items": [],
+            "error": None,
+            "cursor_id": None
+        }
+        try:
+            state = self._cursors.get(cursor_id)
+            if state is None:
+                raise sqlite3.ProgrammingError("Unknown or expired cursor {}".format(cursor_id))
+
+            if message.get('close'):
+                self.close_cursor(cursor_id)
+                return result
+
+            self._cursors.move_to_end(cursor_id)
+            state.last_access = time.monotonic()
+            position = message.get('position', state.position)
+            if position == state.position:
+                rows = state.cursor.fetchmany(state.batch_size)
+                state.position += len(rows)
+                state.last_batch = rows
+            elif state.last_batch and position == state.position - len(state.last_batch):
+                LOG.debug("Resending last batch of cursor %s", cursor_id)
+                rows = state.last_batch
+            else:
+                raise sqlite3.ProgrammingError("Cursor {} is at row {} but {} was requested".format(cursor_id,
+                                                                                                 state.position,
+                                                                                                 position))
+            result['items'] = rows
+            self._timer.lap('fetch')
+            if len(rows) < state.batch_size:
+                self.close_cursor(cursor_id)
+            else:
+                result['cursor_id'] = cursor_id
+        except Exception:
+            LOG.exception("Exception while fetching from cursor %s", cursor_id)
+            result['error'] = self.capture_exception()
+        return result
+
+    def close_cursor(self, cursor_id: str):
+        state = self._cursors.pop(cursor_id, None)
+        if state is not None:
+            state.cursor.close()
+            LOG.debug("Closed cursor %s", cursor_id)
+
+    def _expire_cursors(self):
+        # Abandoned cursors hold a read transaction open, so they are closed once idle
+        # for too long or when too many are open.
+        now = time.monotonic()
+        for cursor_id, state in list(self._cursors.items()):
+            if len(self._cursors) < MAX_OPEN_CURSORS and now - state.last_access < CURSOR_IDLE_TIMEOUT:
+                break
+            LOG.warning("Expiring cursor %s", cursor_id)
+            self.close_cursor(cursor_id)
+
+
+class OpenCursor:
+
+    __slots__ = ('cursor', 'batch_size', 'position', 'last_batch', 'last_access')
+
+    def __init__(self, cursor: sqlite3.Cursor, batch_size: int, first_batch: list):
+        """State of a server-side cursor held open by :class: `sqlite_rx.server.QueryStreamHandler`"""
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.position = len(first_batch)
+        self.last_batch = first_batch
+        self.last_access = time.monotonic()
@@ -0,0 +1,347 @@
+import bisect
+import hashlib
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence, Tuple, Union
+
+from sqlite_rx.client import DEFAULT_BATCH_SIZE, SQLiteClient, response_error
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['HashRing', 'RangeMap', 'ShardedSQLiteClient']
+
+# Points of every shard on the hash ring. More points spread the keys more evenly.
+DEFAULT_VNODES = 128
+
+
+def _hash(value) -> int:
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+
+    def __init__(self, shards: Iterable[str] = (), vnodes: int = DEFAULT_VNODES):
+        """Consistent hashing of shard keys onto shards.
+
+        Every shard is placed at ``vnodes`` points of a ring of 64 bit hashes and a key belongs to the
+        shard of the first point at or after the hash of the key. Adding a shard only moves the keys
+        which now belong to it, about ``1 / len(shards)`` of them. Keys are hashed by their ``str()``.
+
+        Args:
+            shards: The names of the shards
+            vnodes: Number of points per shard
+
+        """
+        self.vnodes = vnodes
+        self._points = []
+        self._owners = []
+        self.shards = []
+        for shard in shards:
+            self._add(shard)
+
+    def _add(self, shard: str):
+        if shard in self.shards:
+            raise ValueError("Shard {} is already on the ring".format(shard))
+        self.shards.append(shard)
+        for replica in range(self.vnodes):
+            point = _hash("{}#{}".format(shard, replica))
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, shard)
+
+    def with_shard(self, shard: str) -> 'HashRing':
+        """A copy of the ring with ``shard`` added"""
+        return HashRing(self.shards + [shard], vnodes=self.vnodes)
+
+    def without_shard(self, shard: str) -> 'HashRing':
+        """A copy of the ring with ``shard`` removed"""
+        return HashRing([name for name in self.shards if name != shard], vnodes=self.vnodes)
+
+    def shard_for(self, key: Hashable) -> str:
+        if not self._points:
+            raise ValueError("The hash ring has no shards")
+        index = bisect.bisect_left(self._points, _hash(key))
+        return self._owners[index % len(self._points)]
+
+
+class RangeMap:
+
+    def __init__(self, ranges: Sequence[Tuple[Any, str]]):
+        """An explicit map of shard key ranges to shards.
+
+        ``ranges`` lists ``(lower_bound, shard)`` pairs. A key belongs to the shard with the greatest
+        lower bound less than or equal to the key. The first range has no lower bound, which is
+        written ``None``, e.g. ``[(None, 'a'), (1000, 'b'), (5000, 'c')]`` sends the keys below 1000
+        to ``a``, the keys from 1000 to 4999 to ``b`` and the others to ``c``.
+
+        Raises:
+            ValueError: If the first range has a lower bound or the bounds are not increasing
+
+        """
+        if not ranges or ranges[0][0] is not None:
+            raise ValueError("The first range must have no lower bound (None)")
+        bounds = [bound for bound, _ in ranges[1:]]
+        if any(lower >= upper for lower, upper in zip(bounds, bounds[1:])):
+            raise ValueError("The lower bounds of the ranges must be increasing")
+        self.ranges = list(ranges)
+        self._bounds = bounds
+        self._owners = [shard for _, shard in ranges]
+
+    @property
+    def shards(self) -> List[str]:
+        return list(dict.fromkeys(self._owners))
+
+    def with_shard(self, shard: str, lower_bound=None) -> 'RangeMap':
+        """A copy of the map where the keys from ``lower_bound`` up to the next bound belong to ``shard``"""
+        if lower_bound is None:
+            raise ValueError("A lower bound is needed to add a shard to a range map")
+        ranges = [(bound, owner) for bound, owner in self.ranges if bound != lower_bound]
+        ranges.append((lower_bound, shard))
+        return RangeMap([ranges[0]] + sorted(ranges[1:], key=lambda pair: pair[0]))
+
+    def shard_for(self, key) -> str:
+        return self._owners[bisect.bisect_right(self._bounds, key)]
+
+
+class ShardedSQLiteClient:
+
+    def __init__(self,
+                 shards: Dict[str, Union[str, SQLiteClient]],
+                 router: Union[HashRing, RangeMap] = None,
+                 **client_kwargs):
+        """Routes requests to several :class: `sqlite_rx.server.SQLiteServer` instances by shard key.
+
+        Requests on a single shard key, like :meth: `execute`, go to the shard owning the key. Reads
+        spanning all the keys are sent to every shard in parallel with :meth: `execute_all` and
+        :meth: `scatter_gather`, which merges the results.
+
+        Adding a shard with :meth: `add_shard` works as follows:
+
+            1. Create the schema on the new server.
+            2. Call ``add_shard(name, address, tables={"table": "key column"})``. The rows of the given
+               tables whose keys move to the new shard are copied to it, then requests are routed to it.
+               With ``delete=True`` the copied rows are then deleted from the shards they left, which
+               needs an ``auth_config`` allowing ``DELETE`` on the servers.
+            3. Writes to the moving keys made during the copy may have gone to the old shards. Pause
+               them, or call :meth: `rebalance` once more to move any row not on the shard owning it.
+
+        Rows are copied with ``INSERT OR REPLACE`` so tables should have a primary key, which makes
+        copying a row twice harmless. Tables ``WITHOUT ROWID`` are not supported.
+
+        Args:
+            shards: The shard names mapped to the address of their server or to a :class: `SQLiteClient`
+            router: A :class: `HashRing` or a :class: `RangeMap` of the shard names. Defaults to a
+                :class: `HashRing` of the shards.
+            client_kwargs: Keyword arguments of the :class: `SQLiteClient` created for the addresses,
+                e.g. ``use_encryption``
+
+        Raises:
+            ValueError: If the router and the shards do not name the same shards
+
+        """
+        self._client_kwargs = client_kwargs
+        self._clients = {name: self._client(shard) for name, shard in shards.items()}
+        self._router = router if router is not None else HashRing(shards)
+        if set(self._router.shards) - set(self._clients):
+            raise ValueError("No server for shards {}".format(set(self._router.shards) - set(self._clients)))
+        self._executor = None
+
+    def _client(self, shard: Union[str, SQLiteClient]) -> SQLiteClient:
+        return SQLiteClient(connect_address=shard, **self._client_kwargs) if isinstance(shard, str) else shard
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self._clients)
+
+    @property
+    def router(self) -> Union[HashRing, RangeMap]:
+        return self._router
+
+    def shard_for(self, shard_key) -> str:
+        return self._router.shard_for(shard_key)
+
+    def client_for(self, shard_key) -> SQLiteClient:
+        """The client of the shard owning ``shard_key``"""
+        return self._clients[self._router.shard_for(shard_key)]
+
+    def execute(self, query: str, *args, shard_key, **kwargs) -> dict:
+        """:meth: `sqlite_rx.client.SQLiteClient.execute` on the shard owning ``shard_key``"""
+        return self.client_for(shard_key).execute(query, *args, **kwargs)
+
+    def execute_batch(self, statements: List[Union[str, Sequence]], shard_key, transactional: bool = True,
+                      **kwargs) -> dict:
+        """:meth: `sqlite_rx.client.SQLiteClient.execute_batch` on the shard owning ``shard_key``.
+        A transactional batch is atomic since it runs on a single shard."""
+        return self.client_for(shard_key).execute_batch(statements, transactional=transactional, **kwargs)
+
+    def iterate(self, query: str, *args, shard_key, **kwargs):
+        """:meth: `sqlite_rx.client.SQLiteClient.iterate` on the shard owning ``shard_key``"""
+        return self.client_for(shard_key).iterate(query, *args, **kwargs)
+
+    def _map(self, function: Callable[[str, SQLiteClient], Any], shards: Iterable[str] = None) -> Dict[str, Any]:
+        shards = list(shards) if shards is not None else self.shards
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(thread_name_prefix='sqlite-rx-shard')
+        # SQLiteClient is thread local, so every thread of the pool gets sockets of its own
+        futures = {shard: self._executor.submit(function, shard, self._clients[shard]) for shard in shards}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def execute_all(self, query: str, *args, shards: Iterable[str] = None, **kwargs) -> Dict[str, dict]:
+        """Execute ``query`` on every shard, or on ``shards``, in parallel.
+
+        Returns:
+            The response of every shard, by shard name
+
+        """
+        return self._map(lambda shard, client: client.execute(query, *args, **kwargs), shards)
+
+    def scatter_gather(self,
+                       query: str,
+                       *args,
+                       key: Callable = None,
+                       reverse: bool = False,
+                       limit: int = None,
+                       **kwargs) -> dict:
+        """Execute a read on every shard in parallel and merge the rows.
+
+        Without ``key`` the rows are concatenated in the order of the shards. With ``key`` every shard
+        must return its rows sorted by ``key``, e.g. with the matching ``ORDER BY``, and the rows are
+        merged in that order. ``limit`` keeps the first rows only, so a query with ``ORDER BY`` and
+        ``LIMIT n`` gives the global top n when each shard returns its own top n.
+
+        Returns:
+            A response like the one of :meth: `sqlite_rx.client.SQLiteClient.execute`, with the number of
+            rows returned by every shard in ``shards``. If a shard replied with an error, the response has
+            the error of the first one and its name in ``shard``.
+
+        """
+        responses = self.execute_all(query, *args, **kwargs)
+        for shard, response in responses.items():
+            if response.get('error'):
+                return {"items": [], "error": response['error'], "shard": shard}
+        lists = [response['items'] for response in responses.values()]
+        if key is not None:
+            items = heapq.merge(*lists, key=key, reverse=reverse)
+        else:
+            items = (item for items in lists for item in items)
+        items = list(items) if limit is None else [item for _, item in zip(range(limit), items)]
+        return {"items": items, "error": None,
+                "shards": {shard: len(response['items']) for shard, response in responses.items()}}
+
+    def add_shard(self,
+                  name: str,
+                  shard: Union[str, SQLiteClient],
+                  tables: Dict[str, str] = None,
+                  delete: bool = False,
+                  lower_bound=None,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+        """Add a shard, copy the rows it now owns to it and route requests to it.
+
+        Args:
+            name: The name of the new shard
+            shard: The address of its server or a :class: `SQLiteClient`
+            tables: The tables whose rows are moved to the new shard, mapped to their shard key column
+            delete: True to delete the moved rows from the shards they left
+            lower_bound: The lower bound of the range of keys of the new shard, when routing with a :class: `RangeMap`
+            batch_size: Rows read per request while moving rows
+
+        Returns:
+            The number of rows moved per table
+
+        Raises:
+            ValueError: If a shard with this name exists
+            sqlite_rx.exception.SQLiteRxQueryError: If reading or copying rows fails
+
+        """
+        if name in self._clients:
+            raise ValueError("Shard {} already exists".format(name))
+        if isinstance(self._router, RangeMap):
+            router = self._router.with_shard(name, lower_bound)
+        else:
+            router = self._router.with_shard(name)
+        self._clients[name] = self._client(shard)
+        try:
+            moved = self._move(router, tables or {}, delete=False, batch_size=batch_size)
+        except Exception:
+            del self._clients[name]
+            raise
+        self._router = router
+        LOG.info("Added shard %s. Moved rows: %s", name, moved)
+        if delete and tables:
+            self.rebalance(tables, delete=True, batch_size=batch_size)
+        return moved
+
+    def rebalance(self, tables: Dict[str, str], delete: bool = False,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+        """Copy every row of ``tables`` which is not on the shard owning its key to that shard.
+
+        Args:
+            tables: The tables to rebalance, mapped to their shard key column
+            delete: True to delete the copied rows from the shards they were on
+            batch_size: Rows read per request
+
+        Returns:
+            The number of rows copied per table
+
+        """
+        return self._move(self._router, tables, delete=delete, batch_size=batch_size)
+
+    def _move(self, router, tables: Dict[str, str], delete: bool, batch_size: int) -> Dict[str, int]:
+        moved = {}
+        for table, key_column in tables.items():
+            moved[table] = 0
+            # Every shard of the old and the new router: a shard the new router dropped, e.g. when
+            # its only range changes owner, still holds rows to move
+            for shard in self.shards:
+                moved[table] += self._move_rows(router, shard, table, key_column, delete, batch_size)
+        return moved
+
+    def _move_rows(self, router, shard: str, table: str, key_column: str, delete: bool, batch_size: int) -> int:
+        client = self._clients[shard]
+        columns = self._checked(client.execute("SELECT * FROM {} LIMIT 0".format(table),
+                                               result_format='columnar'))['columns']
+        key_index = columns.index(key_column)
+        insert = "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(table, ", ".join(columns),
+                                                                    ", ".join("?" * len(columns)))
+        select = "SELECT rowid, * FROM {} {{}} ORDER BY rowid LIMIT ?".format(table)
+        count = 0
+        # Pages by rowid so every batch is written, then deleted, before the next one is read
+        rows = self._checked(client.execute(select.format(""), batch_size))['items']
+        while rows:
+            outgoing: Dict[str, List] = {}
+            rowids = []
+            for row in rows:
+                owner = router.shard_for(row[1 + key_index])
+                if owner != shard:
+                    outgoing.setdefault(owner, []).append(list(row[1:]))
+                    rowids.append(row[0])
+            for owner, chunk in outgoing.items():
+                self._checked(self._clients[owner].execute(insert, *chunk, execute_many=True))
+                count += len(chunk)
+            if delete and rowids:
+                # One parameter per statement, since sqlite before 3.32 allows at most 999 per statement
+                self._checked(client.execute("DELETE FROM {} WHERE rowid = ?".format(table),
+                                             *[[rowid] for rowid in rowids], execute_many=True))
+            rows = self._checked(client.execute(select.format("WHERE rowid > ?"), rows[-1][0], batch_size))['items']
+        LOG.info("Moved %s rows of %s from shard %s", count, table, shard)
+        return count
+
+    @staticmethod
+    def _checked(response: dict) -> dict:
+        if response.get('error'):
+            raise response_error(response['error'])
+        return response
+
+    def cleanup(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for client in self._clients.values():
+            client.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
@@ -0,0 +1,147 @@
+import json
+import logging
+import logging.handlers
+import sqlite3
+import time
+from collections import deque
+from typing import List, Optional, Union
+
+LOG = logging.getLogger(__name__)
+
+__all__ = ['SlowQueryLog']
+
+# Slow queries kept in memory for the ``slow_queries`` admin request
+RECENT_SLOW_QUERIES = 100
+
+# Longer parameter values are truncated in the log
+MAX_PARAM_LENGTH = 200
+
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+
+def _describe(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "<{} bytes>".format(len(value))
+    if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + "..."
+    if isinstance(value, (list, tuple)):
+        return [_describe(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _describe(item) for key, item in value.items()}
+    return value
+
+
+class SlowQueryLog:
+
+    def __init__(self,
+                 database: Union[bytes, str],
+                 threshold: float,
+                 path: str = None,
+                 redact_params: bool = False,
+                 connection: sqlite3.Connection = None):
+        """Records the queries which take longer than ``threshold`` seconds, along with their query plan.
+
+        Every slow query is written as one JSON object per line to a rotating log file, or to the
+        ``sqlite_rx.slowlog`` logger at WARNING level when no file is given. The last slow
+        queries are also kept in memory.
+
+        The plan is captured with ``EXPLAIN QUERY PLAN`` on a read-only side connection, so
+        explaining does not touch the state of the connection serving the clients. In-memory
+        databases are private to their connection, so their queries are explained on ``connection``.
+
+        Args:
+            database: The database of the server
+            threshold: Duration in seconds above which a query is slow
+            path: The log file. It is rotated when it reaches 10MB and 5 old files are kept.
+            redact_params: True to leave the query parameters out of the log
+            connection: The connection serving the clients
+
+        """
+        self.threshold = threshold
+        self.redact_params = redact_params
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SLOW_QUERIES)
+        self._database = database
+        self._connection = connection
+        self._side_connection = None
+        self._logger = logging.getLogger('sqlite_rx.slowlog')
+        if path:
+            self._logger = logging.getLogger('sqlite_rx.slowlog.{}'.format(path))
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            if not self._logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(path,
+                                                               maxBytes=LOG_FILE_MAX_BYTES,
+                                                               backupCount=LOG_FILE_BACKUP_COUNT)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self._logger.addHandler(handler)
+
+    def _explain_connection(self) -> sqlite3.Connection:
+        if not self._database or self._database == ':memory:':
+            return self._connection
+        if self._side_connection is None:
+            self._side_connection = sqlite3.connect(self._database, check_same_thread=False)
+            self._side_connection.execute('pragma query_only=ON')
+        # EXPLAIN does not check whether the schema changed since the connection last read it,
+        # so the schema is read first to take e.g. new indexes into account.
+        self._side_connection.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        return self._side_connection
+
+    def close(self):
+        """Close the side connection used to explain the queries"""
+        if self._side_connection is not None:
+            self._side_connection.close()
+            self._side_connection = None
+
+    def explain(self, query: str, params=None) -> Optional[List[str]]:
+        """The ``EXPLAIN QUERY PLAN`` of ``query`` as indented lines, or None if it can't be explained"""
+        try:
+            connection = self._explain_connection()
+            if connection is None:
+                return None
+            rows = connection.execute('EXPLAIN QUERY PLAN ' + query, params or ()).fetchall()
+        except Exception as e:
+            LOG.debug("Could not explain query %s: %s", query, e)
+            return None
+        depths = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in rows:
+            depth = depths.get(parent, -1) + 1
+            depths[node_id] = depth
+            plan.append("  " * depth + detail)
+        return plan
+
+    def check(self, duration: float, message: dict, query: str, params, mode: str, rows: int) -> bool:
+        """Log the query if it was slow. Returns True if it was logged."""
+        if duration < self.threshold:
+            return False
+        self.count += 1
+        # Scripts hold several statements and can't be explained. execute_many is explained
+        # with its first set of parameters.
+        if mode == 'script':
+            plan = None
+        elif mode == 'many':
+            plan = self.explain(query, params[0] if params else None)
+        else:
+            plan = self.explain(query, params)
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "duration": duration,
+            "rows": rows,
+            "client_id": message.get('client_id'),
+            "mode": mode,
+            "query": query,
+            "params": None if self.redact_params else _describe(params),
+            "plan": plan,
+            # "SCAN t" reads every row of t while "SCAN t USING INDEX i" at least avoids the table
+            "table_scan": any(line.strip().startswith('SCAN') and 'USING' not in line and 'CONSTANT ROW' not in line
+                              for line in plan or ())
+        }
+        self.recent.append(record)
+        try:
+            self._logger.warning(json.dumps(record, default=repr))
+        except Exception:
+            LOG.exception("Exception while writing the slow query log")
+        return True
+
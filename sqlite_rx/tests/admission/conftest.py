@@ -0,0 +1,52 @@
+import os
+import platform
+import signal
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+admission_clients = namedtuple('admission_clients', ('limited', 'queued'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def admission_client():
+    limited = SQLiteServer(bind_address="tcp://127.0.0.1:5029",
+                           database=":memory:",
+                           rate_limit=5,
+                           rate_burst=2,
+                           high_water_mark=100,
+                           metrics=True)
+    queued = SQLiteServer(bind_address="tcp://127.0.0.1:5033",
+                          database=":memory:",
+                          executor=True,
+                          queue_size=2,
+                          metrics=True)
+    limited.start()
+    queued.start()
+    LOG.info("Started Test SQLiteServers with admission control")
+
+    clients = admission_clients(limited=SQLiteClient(connect_address="tcp://127.0.0.1:5029"),
+                                queued=SQLiteClient(connect_address="tcp://127.0.0.1:5033"))
+    yield clients
+
+    stop(queued)
+    stop(limited)
+    clients.limited.cleanup()
+    clients.queued.cleanup()
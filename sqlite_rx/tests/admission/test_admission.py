@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlite_rx.client import OVERLOADED_ERROR, MultiplexedSQLiteClient, SQLiteClient
+
+# Runs for about a second
+SLOW_QUERY = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 2000000) "
+              "SELECT count(*) FROM c")
+
+
+def test_rate_limit(admission_client):
+    time.sleep(0.5)
+    # The burst of 2 requests is admitted and the next one is turned away
+    responses = [admission_client.limited.execute("SELECT 1", retries=1) for _ in range(3)]
+    assert [response['error'] for response in responses[:2]] == [None, None]
+    assert responses[2]['error']['type'] == OVERLOADED_ERROR
+    assert 0 < responses[2]['retry_after'] <= 200
+
+
+def test_client_backs_off(admission_client):
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5029") as client:
+        started = time.monotonic()
+        responses = [client.execute("SELECT 1") for _ in range(5)]
+        assert all(response['items'] == [[1]] for response in responses)
+        # The rate of 5 requests per second holds once the burst is spent
+        assert time.monotonic() - started > 0.4
+    assert admission_client.limited.metrics(retries=10)['counters']['rejected_total']['rate_limit'] >= 2
+
+
+def test_rate_limit_is_per_client(admission_client):
+    # The client id of a SQLiteClient names the host and the thread
+    barrier = threading.Barrier(2)
+
+    def burst():
+        barrier.wait()
+        with SQLiteClient(connect_address="tcp://127.0.0.1:5029") as client:
+            return [client.execute("SELECT 1", retries=1)['error'] for _ in range(2)]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(burst) for _ in range(2)]
+        assert [future.result() for future in futures] == [[None, None]] * 2
+
+
+def test_priorities_and_shedding(admission_client):
+    assert admission_client.queued.execute("CREATE TABLE stocks (symbol TEXT, qty INTEGER)")['error'] is None
+    # Requests of a client connection keep their order, so every class is sent by a client of its own
+    clients = [MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5033") for _ in range(4)]
+    with clients[0], clients[1], clients[2], clients[3]:
+        slow = clients[0].submit(SLOW_QUERY)
+        time.sleep(0.05)
+        # Queued behind the slow query on the writer thread
+        script = clients[1].submit("INSERT INTO stocks VALUES ('IBM', 1);", execute_script=True, retries=1)
+        time.sleep(0.05)
+        write = clients[2].submit("INSERT INTO stocks VALUES ('MSFT', 2)")
+        time.sleep(0.05)
+        # The queue is full: the read takes the place of the bulk script
+        read = clients[3].submit("SELECT count(*) FROM stocks")
+        assert script.result()['error']['type'] == OVERLOADED_ERROR
+        assert slow.result()['items'] == [[2000000]]
+        # The read is served before the write which was queued first
+        assert read.result()['items'] == [[0]]
+        assert write.result()['error'] is None
+    metrics = admission_client.queued.metrics()
+    assert metrics['counters']['rejected_total'] == {'queue_full': 1}
+    assert metrics['gauges']['executor_queue'] == {'writer': 0, 'reader': 0}
@@ -0,0 +1,27 @@
+import os
+import platform
+import signal
+import pytest
+
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+
+@pytest.fixture(scope="module")
+def server_address():
+    server = SQLiteServer(bind_address="tcp://127.0.0.1:5007",
+                          database=":memory:")
+    server.start()
+    LOG.info("Started Test SQLiteServer")
+    yield "tcp://127.0.0.1:5007"
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from sqlite_rx.client import AsyncSQLiteClient, SQLiteClient
+from sqlite_rx.exception import SQLiteRxConnectionError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_execute(server_address):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            await client.execute('CREATE TABLE numbers (n integer)')
+            result = await client.execute('INSERT INTO numbers VALUES (?)', *[(n,) for n in range(10)],
+                                          execute_many=True)
+            assert result == {'error': None, 'items': [], 'rowcount': 10}
+            return await client.execute('SELECT SUM(n) FROM numbers')
+
+    assert run(main())['items'] == [[45]]
+
+
+def test_many_requests_in_flight(server_address):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            return await asyncio.gather(*[client.execute('SELECT ?', n) for n in range(200)])
+
+    results = run(main())
+    assert [result['items'] for result in results] == [[[n]] for n in range(200)]
+
+
+def test_sync_client_still_served(server_address):
+    client = SQLiteClient(connect_address=server_address)
+    assert client.execute('SELECT COUNT(*) FROM numbers')['items'] == [[10]]
+    client.cleanup()
+
+
+def test_error_reply(server_address):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            return await client.execute('SELECT * FROM IDOLS')
+
+    result = run(main())
+    assert result['error']['type'] == 'sqlite3.OperationalError'
+
+
+def test_connection_error():
+    async def main():
+        async with AsyncSQLiteClient(connect_address="tcp://127.0.0.1:5008") as client:
+            await client.execute('SELECT 1', retries=2, request_timeout=10)
+
+    with pytest.raises(SQLiteRxConnectionError):
+        run(main())
@@ -18,7 +18,7 @@ logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
 
 LOG = logging.getLogger(__file__)
 
-backup_event = namedtuple('backup_event', ('client', 'backup_database', 'main_database'))
+backup_event = namedtuple('backup_event', ('client', 'backup_database', 'main_database', 'snapshot_dir'))
 
 
 @pytest.fixture(scope="module")
@@ -33,13 +33,18 @@ def plain_client():
 
         main_db_file = os.path.join(base_dir, 'main.db')
         backup_db_file = os.path.join(base_dir, 'backup.db')
+        snapshot_dir = os.path.join(base_dir, 'snapshots')
 
         if is_backup_supported():
             server = SQLiteServer(bind_address="tcp://127.0.0.1:5003",
                                   database=main_db_file,
                                   auth_config=auth_config,
                                   backup_database=backup_db_file,
-                                  backup_interval=1)
+                                  backup_interval=1,
+                                  snapshot_dir=snapshot_dir,
+                                  snapshot_interval=0.5,
+                                  snapshot_retention='2',
+                                  snapshot_compress=True)
         else:
             server = SQLiteServer(bind_address="tcp://127.0.0.1:5003",
                                   database=main_db_file,
@@ -47,7 +52,8 @@ def plain_client():
         
         client = SQLiteClient(connect_address="tcp://127.0.0.1:5003")
 
-        event = backup_event(client=client, backup_database=backup_db_file, main_database=main_db_file)
+        event = backup_event(client=client, backup_database=backup_db_file, main_database=main_db_file,
+                             snapshot_dir=snapshot_dir)
 
         server.start()
 
@@ -1,6 +1,7 @@
 import sys
 import platform
 import sqlite3
+import json
 import os
 import time
 
@@ -72,4 +73,9 @@ def test_table_rows_insertion(plain_client):
         assert os.path.exists(backup_database) is True
         result = backup_connection.execute("SELECT * FROM stocks").fetchall()
         assert len(result) == 27
+
+        with open(os.path.join(plain_client.snapshot_dir, 'manifest.json')) as f:
+            snapshots = json.load(f)['snapshots']
+        assert 1 <= len(snapshots) <= 2
+        assert all(snapshot['compressed'] for snapshot in snapshots)
     
\ No newline at end of file
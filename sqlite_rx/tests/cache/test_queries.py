@@ -0,0 +1,85 @@
+def cache_stats(client):
+    return client.stats()['result_cache']
+
+
+def test_setup_tables(cache_client):
+    cache_client.execute_batch(['CREATE TABLE config (k text, v text)',
+                                'CREATE TABLE events (id integer)',
+                                "INSERT INTO config VALUES ('theme', 'dark')"])
+
+
+def test_repeated_reads_hit_the_cache(cache_client):
+    before = cache_stats(cache_client)
+    for _ in range(5):
+        assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'theme')['items'] == [['dark']]
+    after = cache_stats(cache_client)
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 4
+    assert after['entries'] == before['entries'] + 1
+
+
+def test_parameters_are_part_of_the_key(cache_client):
+    assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'missing')['items'] == []
+    assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'theme')['items'] == [['dark']]
+
+
+def test_write_to_unrelated_table_keeps_entries(cache_client):
+    before = cache_stats(cache_client)
+    cache_client.execute('INSERT INTO events VALUES (1)')
+    assert cache_stats(cache_client)['invalidations'] == before['invalidations']
+    assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'theme')['items'] == [['dark']]
+    assert cache_stats(cache_client)['hits'] == before['hits'] + 1
+
+
+def test_write_invalidates_readers_of_the_table(cache_client):
+    cache_client.execute("UPDATE config SET v = 'light' WHERE k = 'theme'")
+    assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'theme')['items'] == [['light']]
+    # The statement is compiled and cached by sqlite3 now; writes are still tracked.
+    cache_client.execute("UPDATE config SET v = 'blue' WHERE k = 'theme'")
+    assert cache_client.execute('SELECT v FROM config WHERE k = ?', 'theme')['items'] == [['blue']]
+
+
+def test_count_without_columns_is_invalidated(cache_client):
+    assert cache_client.execute('SELECT COUNT(*) FROM events')['items'] == [[1]]
+    cache_client.execute('DELETE FROM events')
+    assert cache_client.execute('SELECT COUNT(*) FROM events')['items'] == [[0]]
+
+
+def test_schema_change_clears_the_cache(cache_client):
+    cache_client.execute('SELECT v FROM config')
+    cache_client.execute('CREATE TABLE other (x integer)')
+    assert cache_stats(cache_client)['entries'] == 0
+
+
+def test_non_deterministic_queries_not_cached(cache_client):
+    before = cache_stats(cache_client)
+    cache_client.execute('SELECT random()')
+    cache_client.execute('SELECT random()')
+    after = cache_stats(cache_client)
+    assert after['hits'] == before['hits']
+    assert after['misses'] == before['misses']
+
+
+def test_prepared_statements_are_cached(cache_client):
+    select = cache_client.prepare('SELECT k FROM config')
+    before = cache_stats(cache_client)
+    for _ in range(3):
+        assert cache_client.execute_prepared(select)['items'] == [['theme']]
+    assert cache_stats(cache_client)['hits'] == before['hits'] + 2
+
+
+def test_errors_not_cached(cache_client):
+    cache_client.execute('SELECT * FROM IDOLS')
+    result = cache_client.execute('SELECT * FROM IDOLS')
+    assert result['error']['type'] == 'sqlite3.OperationalError'
+
+
+def test_reads_inside_a_transaction_not_cached(cache_client):
+    cache_client.execute('CREATE TABLE ledger (x integer)')
+    cache_client.execute('INSERT INTO ledger VALUES (1)')
+    assert cache_client.execute('BEGIN')['error'] is None
+    cache_client.execute('INSERT INTO ledger VALUES (2)')
+    assert cache_client.execute('SELECT COUNT(*) FROM ledger')['items'] == [[2]]
+    assert cache_client.execute('ROLLBACK')['error'] is None
+    assert cache_client.execute('SELECT COUNT(*) FROM ledger')['items'] == [[1]]
+    assert cache_client.execute('SELECT COUNT(*) FROM ledger')['items'] == [[1]]
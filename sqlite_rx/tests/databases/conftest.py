@@ -0,0 +1,65 @@
+import os
+import platform
+import signal
+import sqlite3
+import tempfile
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+database_servers = namedtuple('database_servers', ('created', 'existing', 'directory'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def database_server():
+    with tempfile.TemporaryDirectory() as base_dir:
+        directory = os.path.join(base_dir, 'tenants')
+        os.mkdir(directory)
+        for name in ('a.db', 'b.db'):
+            with sqlite3.connect(os.path.join(directory, name)) as connection:
+                connection.execute("CREATE TABLE tenant (name TEXT)")
+                connection.execute("INSERT INTO tenant VALUES (?)", (name,))
+            connection.close()
+        created = SQLiteServer(bind_address="tcp://127.0.0.1:5034",
+                               database=os.path.join(base_dir, 'main.db'),
+                               database_dir=directory,
+                               max_databases=2,
+                               create_databases=True,
+                               metrics=True)
+        existing = SQLiteServer(bind_address="tcp://127.0.0.1:5035",
+                                database=os.path.join(base_dir, 'existing.db'),
+                                database_dir=directory,
+                                max_database_memory=1,
+                                read_threads=1,
+                                engine="asyncio",
+                                metrics=True)
+        created.start()
+        existing.start()
+        LOG.info("Started Test SQLiteServers hosting a database directory")
+
+        servers = database_servers(created=SQLiteClient(connect_address="tcp://127.0.0.1:5034"),
+                                   existing=SQLiteClient(connect_address="tcp://127.0.0.1:5035"),
+                                   directory=directory)
+        yield servers
+
+        stop(existing)
+        stop(created)
+        servers.created.cleanup()
+        servers.existing.cleanup()
@@ -0,0 +1,70 @@
+import os
+
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.exception import SQLiteRxUnknownDatabaseError
+
+UNKNOWN_DATABASE_ERROR = "{}.{}".format(SQLiteRxUnknownDatabaseError.__module__,
+                                        SQLiteRxUnknownDatabaseError.__name__)
+
+
+def test_requests_are_routed_by_database(database_server):
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database='a.db') as a, \
+            SQLiteClient(connect_address="tcp://127.0.0.1:5034", database='b.db') as b:
+        assert a.execute("SELECT name FROM tenant")['items'] == [['a.db']]
+        assert b.execute("SELECT name FROM tenant")['items'] == [['b.db']]
+    # Requests naming no database are served from the server's own database
+    response = database_server.created.execute("SELECT name FROM tenant")
+    assert response['error']['type'] == 'sqlite3.OperationalError'
+
+
+def test_databases_are_created(database_server):
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database='new.db') as client:
+        assert client.execute("CREATE TABLE events (id INTEGER)")['error'] is None
+        assert client.execute("INSERT INTO events VALUES (1)")['error'] is None
+        assert client.execute("SELECT count(*) FROM events")['items'] == [[1]]
+    assert os.path.isfile(os.path.join(database_server.directory, 'new.db'))
+
+
+def test_unknown_databases(database_server):
+    for name in ('../a.db', 'a.db-wal', '.hidden'):
+        with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database=name) as client:
+            assert client.execute("SELECT 1")['error']['type'] == UNKNOWN_DATABASE_ERROR
+    # Without create_databases the database must exist
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5035", database='missing.db') as client:
+        assert client.execute("SELECT 1")['error']['type'] == UNKNOWN_DATABASE_ERROR
+    assert not os.path.exists(os.path.join(database_server.directory, 'missing.db'))
+
+
+def test_least_recently_used_databases_are_closed(database_server):
+    for name in ('a.db', 'b.db', 'c.db', 'a.db'):
+        with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database=name) as client:
+            assert client.execute("SELECT 1")['error'] is None
+    metrics = database_server.created.metrics()
+    assert metrics['gauges']['open_databases'] == {'all': 2}
+    assert metrics['counters']['database_evictions_total']['all'] >= 2
+    # Every database records its requests under its name
+    assert metrics['counters']['requests_total']['c.db,query'] >= 1
+    assert metrics['counters']['requests_total']['a.db,query'] >= 2
+
+
+def test_busy_databases_stay_open(database_server):
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database='a.db') as client:
+        rows = client.iterate("SELECT name FROM tenant", batch_size=1)
+        assert next(rows) == ['a.db']
+        # a.db holds an open cursor while the other databases are opened
+        for name in ('b.db', 'c.db', 'new.db'):
+            with SQLiteClient(connect_address="tcp://127.0.0.1:5034", database=name) as other:
+                assert other.execute("SELECT 1")['error'] is None
+        assert list(rows) == []
+
+
+def test_memory_limit(database_server):
+    # With a limit of a byte, only the database just opened stays open on every executor thread
+    for name in ('a.db', 'b.db'):
+        with SQLiteClient(connect_address="tcp://127.0.0.1:5035", database=name) as client:
+            assert client.execute("SELECT name FROM tenant")['items'] == [[name]]
+            assert client.execute("INSERT INTO tenant VALUES ('x')")['error'] is None
+    metrics = database_server.existing.metrics()
+    assert metrics['gauges']['open_databases']['all'] <= 2
+    assert metrics['counters']['database_evictions_total']['all'] >= 1
+    assert metrics['gauges']['open_databases_bytes']['all'] > 0
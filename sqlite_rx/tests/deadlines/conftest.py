@@ -0,0 +1,51 @@
+import os
+import platform
+import signal
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+deadline_clients = namedtuple('deadline_clients', ('loop', 'executor'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def deadline_client():
+    loop = SQLiteServer(bind_address="tcp://127.0.0.1:5027",
+                        database=":memory:",
+                        metrics=True)
+    executor = SQLiteServer(bind_address="tcp://127.0.0.1:5028",
+                            database=":memory:",
+                            executor=True,
+                            metrics=True)
+    loop.start()
+    executor.start()
+    LOG.info("Started Test SQLiteServers enforcing deadlines")
+
+    clients = deadline_clients(loop=SQLiteClient(connect_address="tcp://127.0.0.1:5027"),
+                               executor=SQLiteClient(connect_address="tcp://127.0.0.1:5028"))
+    # Deadlines run from the time the server receives a request, so wait for the servers to be up
+    for client in clients:
+        client.execute("SELECT 1")
+    yield clients
+
+    stop(executor)
+    stop(loop)
+    clients.loop.cleanup()
+    clients.executor.cleanup()
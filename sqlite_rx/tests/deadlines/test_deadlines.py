@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from sqlite_rx.client import TIMEOUT_ERROR, MultiplexedSQLiteClient
+from sqlite_rx.exception import SQLiteRxConnectionError, SQLiteRxTimeoutError
+
+# Runs for about a second
+SLOW_QUERY = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 2000000) "
+              "SELECT count(*) FROM c")
+
+
+def test_slow_query_is_interrupted(deadline_client):
+    for client in deadline_client:
+        started = time.monotonic()
+        response = client.execute(SLOW_QUERY, request_timeout=300, retries=1)
+        assert time.monotonic() - started < 0.9
+        assert response['error']['type'] == TIMEOUT_ERROR
+        # The connection serves the next requests as usual
+        assert client.execute("SELECT 1")['items'] == [[1]]
+        assert client.metrics()['counters']['deadline_exceeded_total'] == {'executing': 1}
+
+
+def test_iterate_raises_timeout_error(deadline_client):
+    with pytest.raises(SQLiteRxTimeoutError):
+        list(deadline_client.loop.iterate(SLOW_QUERY, request_timeout=300, retries=1))
+
+
+def test_queries_within_deadline(deadline_client):
+    response = deadline_client.loop.execute(SLOW_QUERY, request_timeout=5000)
+    assert response['error'] is None
+    assert response['items'] == [[2000000]]
+
+
+def test_expired_requests_are_skipped(deadline_client):
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5028") as client:
+        slow = client.submit(SLOW_QUERY, request_timeout=5000)
+        # Queued behind the slow query on the writer thread for longer than the client waits
+        expired = client.submit("SELECT 1", request_timeout=300, retries=1)
+        with pytest.raises(SQLiteRxConnectionError):
+            expired.result()
+        assert slow.result()['items'] == [[2000000]]
+    counters = deadline_client.executor.metrics()['counters']
+    assert counters['deadline_exceeded_total']['queued'] == 1
+
+
+def test_requests_without_a_timeout_have_no_deadline(deadline_client):
+    # Runs for longer than the default request timeout, which is not sent as a deadline
+    script = ";".join([SLOW_QUERY] * 3)
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5028") as client:
+        response = client.submit(script, execute_script=True).result()
+    assert response['error'] is None
@@ -0,0 +1,52 @@
+import os
+import platform
+import signal
+import tempfile
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+asyncio_clients = namedtuple('asyncio_clients', ('single', 'workers'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def asyncio_client():
+    with tempfile.TemporaryDirectory() as base_dir:
+        single = SQLiteServer(bind_address="tcp://127.0.0.1:5023",
+                              database=":memory:",
+                              group_commit_window=0.005,
+                              metrics=True,
+                              engine="asyncio")
+        workers = SQLiteServer(bind_address="tcp://127.0.0.1:5024",
+                               database=os.path.join(base_dir, 'main.db'),
+                               read_workers=2,
+                               engine="asyncio")
+        single.start()
+        workers.start()
+        LOG.info("Started Test SQLiteServers on the asyncio engine")
+
+        clients = asyncio_clients(single=SQLiteClient(connect_address="tcp://127.0.0.1:5023"),
+                                  workers=SQLiteClient(connect_address="tcp://127.0.0.1:5024"))
+        yield clients
+
+        stop(workers)
+        stop(single)
+        clients.single.cleanup()
+        clients.workers.cleanup()
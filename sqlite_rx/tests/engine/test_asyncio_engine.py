@@ -0,0 +1,45 @@
+import asyncio
+import os
+
+import pytest
+
+from sqlite_rx.client import AsyncSQLiteClient, MultiplexedSQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        SQLiteServer(bind_address="tcp://127.0.0.1:5999", database=":memory:", engine="gevent")
+
+
+def test_queries(asyncio_client):
+    for client in asyncio_client:
+        assert client.execute("CREATE TABLE stocks (symbol TEXT, qty INTEGER, data BLOB)")['error'] is None
+        response = client.execute("INSERT INTO stocks VALUES (?, ?, ?)", ['IBM', 1000, b''], ['MSFT', 500, b''],
+                                  execute_many=True)
+        assert response['error'] is None
+        assert client.execute("SELECT symbol FROM stocks ORDER BY qty")['items'] == [['MSFT'], ['IBM']]
+        assert list(client.iterate("SELECT qty FROM stocks ORDER BY qty", batch_size=1)) == [[500], [1000]]
+        assert client.execute("SELECT * FROM missing")['error']['type'] == 'sqlite3.OperationalError'
+
+
+def test_large_blobs(asyncio_client):
+    blob = os.urandom(128 * 1024)
+    for client in asyncio_client:
+        assert client.execute("SELECT ?", blob)['items'][0][0] == blob
+
+
+def test_group_commit(asyncio_client):
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5023") as client:
+        futures = [client.submit("INSERT INTO stocks VALUES (?, ?, ?)", 'XOM', qty, b'') for qty in range(20)]
+        assert all(future.result()['error'] is None for future in futures)
+    assert asyncio_client.single.execute("SELECT count(*) FROM stocks WHERE symbol = 'XOM'")['items'] == [[20]]
+    assert asyncio_client.single.stats()['group_commit']['groups'] < 20
+
+
+def test_concurrent_async_requests(asyncio_client):
+    async def main():
+        async with AsyncSQLiteClient(connect_address="tcp://127.0.0.1:5024") as client:
+            return await asyncio.gather(*[client.execute("SELECT count(*) FROM stocks") for _ in range(50)])
+
+    assert [result['items'] for result in asyncio.run(main())] == [[[2]]] * 50
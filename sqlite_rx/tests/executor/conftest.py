@@ -0,0 +1,52 @@
+import os
+import platform
+import signal
+import tempfile
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+executor_clients = namedtuple('executor_clients', ('threads', 'writer'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def executor_client():
+    with tempfile.TemporaryDirectory() as base_dir:
+        threads = SQLiteServer(bind_address="tcp://127.0.0.1:5025",
+                               database=os.path.join(base_dir, 'main.db'),
+                               read_threads=2,
+                               group_commit_window=0.005,
+                               metrics=True)
+        writer = SQLiteServer(bind_address="tcp://127.0.0.1:5026",
+                              database=":memory:",
+                              executor=True,
+                              engine="asyncio")
+        threads.start()
+        writer.start()
+        LOG.info("Started Test SQLiteServers with executor threads")
+
+        clients = executor_clients(threads=SQLiteClient(connect_address="tcp://127.0.0.1:5025"),
+                                   writer=SQLiteClient(connect_address="tcp://127.0.0.1:5026"))
+        yield clients
+
+        stop(writer)
+        stop(threads)
+        clients.threads.cleanup()
+        clients.writer.cleanup()
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from sqlite_rx.client import MultiplexedSQLiteClient
+from sqlite_rx.exception import SQLiteRxWorkerSetupError
+from sqlite_rx.server import SQLiteServer
+
+# Runs for about a second
+SLOW_QUERY = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 2000000) "
+              "SELECT count(*) FROM c")
+
+
+def test_setup_errors():
+    with pytest.raises(SQLiteRxWorkerSetupError):
+        SQLiteServer(bind_address="tcp://127.0.0.1:5999", database=":memory:", read_threads=2)
+    with pytest.raises(SQLiteRxWorkerSetupError):
+        SQLiteServer(bind_address="tcp://127.0.0.1:5999", database="main.db", read_workers=2, executor=True)
+
+
+def test_queries(executor_client):
+    for client in executor_client:
+        assert client.execute("CREATE TABLE stocks (symbol TEXT, qty INTEGER, data BLOB)")['error'] is None
+        response = client.execute("INSERT INTO stocks VALUES (?, ?, ?)", ['IBM', 1000, b''], ['MSFT', 500, b''],
+                                  execute_many=True)
+        assert response['error'] is None
+        assert client.execute("SELECT symbol FROM stocks ORDER BY qty")['items'] == [['MSFT'], ['IBM']]
+        assert list(client.iterate("SELECT qty FROM stocks ORDER BY qty", batch_size=1)) == [[500], [1000]]
+        assert client.execute("SELECT * FROM missing")['error']['type'] == 'sqlite3.OperationalError'
+
+
+def test_large_blobs(executor_client):
+    blob = os.urandom(128 * 1024)
+    for client in executor_client:
+        assert client.execute("SELECT ?", blob)['items'][0][0] == blob
+
+
+def test_slow_query_does_not_stall_others(executor_client):
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5025") as client:
+        slow = client.submit(SLOW_QUERY)
+        read = client.submit("SELECT count(*) FROM stocks")
+        write = client.submit("INSERT INTO stocks VALUES (?, ?, ?)", 'XOM', 10, b'')
+        assert read.result()['error'] is None
+        assert write.result()['error'] is None
+        assert not slow.done()
+        assert slow.result()['items'] == [[2000000]]
+
+
+def test_group_commit(executor_client):
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5025") as client:
+        futures = [client.submit("INSERT INTO stocks VALUES (?, ?, ?)", 'GE', qty, b'') for qty in range(20)]
+        assert all(future.result()['error'] is None for future in futures)
+    assert executor_client.threads.execute("SELECT count(*) FROM stocks WHERE symbol = 'GE'")['items'] == [[20]]
+    assert executor_client.threads.stats()['group_commit']['groups'] < 20
+
+
+def test_queue_metrics(executor_client):
+    metrics = executor_client.threads.metrics()
+    waits = metrics['histograms']['executor_queue_seconds']
+    assert waits['reader']['count'] > 0
+    assert waits['writer']['count'] > 0
+    assert metrics['gauges']['executor_queue'] == {"writer": 0, "reader": 0}
+
+
+def test_reads_inside_a_transaction_go_to_writer(executor_client):
+    client = executor_client.threads
+    assert client.execute("BEGIN")['error'] is None
+    assert client.execute("INSERT INTO stocks VALUES ('AAPL', 1, x'')")['error'] is None
+    # The reader threads don't see the uncommitted row
+    assert client.execute("SELECT count(*) FROM stocks WHERE symbol = 'AAPL'")['items'] == [[1]]
+    assert client.execute("ROLLBACK")['error'] is None
+    assert client.execute("SELECT count(*) FROM stocks WHERE symbol = 'AAPL'")['items'] == [[0]]
+
+
+def test_pipelined_requests_keep_their_order(executor_client):
+    assert executor_client.writer.execute("CREATE TABLE events (id INTEGER)")['error'] is None
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5026") as client:
+        # The writer is busy, so the next requests wait in its queue
+        slow = client.submit(SLOW_QUERY)
+        begin = client.submit("BEGIN")
+        insert = client.submit("INSERT INTO events VALUES (?)", *[[n] for n in range(10)], execute_many=True)
+        rollback = client.submit("ROLLBACK")
+        assert [future.result()['error'] for future in (slow, begin, insert, rollback)] == [None] * 4
+    # The bulk insert was not served after the ROLLBACK queued behind it
+    assert executor_client.writer.execute("SELECT count(*) FROM events")['items'] == [[0]]
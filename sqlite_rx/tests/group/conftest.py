@@ -0,0 +1,40 @@
+import os
+import platform
+import signal
+import pytest
+
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+ADDRESS = "tcp://127.0.0.1:5011"
+
+
+@pytest.fixture(scope="module")
+def server_address():
+    server = SQLiteServer(bind_address=ADDRESS,
+                          database=":memory:",
+                          group_commit_window=0.05,
+                          group_commit_size=16,
+                          query_stats=100)
+    server.start()
+    LOG.info("Started Test SQLiteServer with group commit")
+    yield ADDRESS
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def group_client(server_address):
+    client = SQLiteClient(connect_address=server_address)
+    yield client
+    client.cleanup()
@@ -0,0 +1,96 @@
+import asyncio
+
+from sqlite_rx.client import TIMEOUT_ERROR, AsyncSQLiteClient
+
+
+def group_stats(client):
+    return client.stats()['group_commit']
+
+
+def test_setup(group_client):
+    result = group_client.execute('CREATE TABLE events (id integer PRIMARY KEY, name text)')
+    assert result['error'] is None
+    assert group_stats(group_client) == {'groups': 0, 'writes': 0, 'pending': 0}
+
+
+def test_single_write(group_client):
+    result = group_client.execute('INSERT INTO events VALUES (?, ?)', 1, 'start')
+    assert result == {'error': None, 'items': [], 'rowcount': 1, 'lastrowid': 1}
+    assert group_client.execute('SELECT name FROM events')['items'] == [['start']]
+    assert group_stats(group_client)['groups'] == 1
+
+
+def test_concurrent_writes_share_a_commit(server_address, group_client):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            return await asyncio.gather(*[client.execute('INSERT INTO events VALUES (?, ?)', n, 'event')
+                                          for n in range(100, 140)])
+
+    before = group_stats(group_client)
+    results = asyncio.run(main())
+    assert all(result['error'] is None and result['rowcount'] == 1 for result in results)
+    after = group_stats(group_client)
+    assert after['writes'] - before['writes'] == 40
+    assert after['groups'] - before['groups'] < 40
+    assert group_client.execute('SELECT COUNT(*) FROM events WHERE id >= 100')['items'] == [[40]]
+
+
+def test_failing_write_does_not_affect_the_group(server_address, group_client):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            return await asyncio.gather(client.execute('INSERT INTO events VALUES (?, ?)', 200, 'a'),
+                                        client.execute('INSERT INTO events VALUES (?, ?)', 1, 'duplicate'),
+                                        client.execute('UPDATE events SET name = ? WHERE id = ?', 'b', 200),
+                                        client.execute('INSERT INTO missing VALUES (1)'))
+
+    ok, duplicate, update, missing = asyncio.run(main())
+    assert ok['error'] is None
+    assert duplicate['error']['type'] == 'sqlite3.IntegrityError'
+    assert update['error'] is None and update['rowcount'] == 1
+    assert missing['error']['type'] == 'sqlite3.OperationalError'
+    assert group_client.execute('SELECT id, name FROM events WHERE id IN (1, 200) ORDER BY id')['items'] == \
+        [[1, 'start'], [200, 'b']]
+
+
+def test_pipelined_read_sees_pending_writes(server_address):
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            write = asyncio.ensure_future(client.execute("UPDATE events SET name = 'done' WHERE id >= 100"))
+            await asyncio.sleep(0.01)
+            read = await client.execute("SELECT COUNT(*) FROM events WHERE name = 'done'")
+            return await write, read
+
+    write, read = asyncio.run(main())
+    assert write['rowcount'] == 41
+    assert read['items'] == [[41]]
+
+
+def test_explicit_transactions_are_not_grouped(group_client):
+    assert group_client.execute('BEGIN')['error'] is None
+    group_client.execute('INSERT INTO events VALUES (?, ?)', 2, 'in transaction')
+    assert group_client.execute('ROLLBACK')['error'] is None
+    assert group_client.execute('SELECT COUNT(*) FROM events WHERE id = 2')['items'] == [[0]]
+
+
+def test_write_past_its_deadline_does_not_affect_the_group(server_address, group_client):
+    slow_insert = ("INSERT INTO events (name) WITH RECURSIVE c(x) AS "
+                   "(SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 5000000) SELECT 'slow' FROM c")
+
+    group_client.reset_query_stats()
+
+    async def main():
+        async with AsyncSQLiteClient(connect_address=server_address) as client:
+            return await asyncio.gather(client.execute('INSERT INTO events VALUES (?, ?)', 300, 'before'),
+                                        client.execute(slow_insert, request_timeout=300, retries=1),
+                                        client.execute('INSERT INTO events VALUES (?, ?)', 301, 'after'))
+
+    before, slow, after = asyncio.run(main())
+    assert before == {'error': None, 'items': [], 'rowcount': 1, 'lastrowid': 300}
+    assert slow['error']['type'] == TIMEOUT_ERROR
+    assert after == {'error': None, 'items': [], 'rowcount': 1, 'lastrowid': 301}
+    assert group_client.execute("SELECT id FROM events WHERE id IN (300, 301) OR name = 'slow'")['items'] == \
+        [[300], [301]]
+    # The write before the interrupted one ran twice, as the group ran again, but is accounted for once
+    statements = {statement['query']: statement for statement in group_client.query_stats()['statements']}
+    assert statements['INSERT INTO events VALUES (?, ?)']['calls'] == 2
+    assert len(statements) == 2
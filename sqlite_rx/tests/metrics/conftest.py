@@ -0,0 +1,36 @@
+import os
+import platform
+import signal
+import pytest
+
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+METRICS_ADDRESS = "127.0.0.1:5014"
+
+
+@pytest.fixture(scope="module")
+def metrics_client():
+    server = SQLiteServer(bind_address="tcp://127.0.0.1:5013",
+                          database=":memory:",
+                          metrics_address=METRICS_ADDRESS,
+                          query_stats=100)
+
+    client = SQLiteClient(connect_address="tcp://127.0.0.1:5013")
+
+    server.start()
+    LOG.info("Started Test SQLiteServer with metrics")
+    yield client
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+    client.cleanup()
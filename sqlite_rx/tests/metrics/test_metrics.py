@@ -0,0 +1,39 @@
+import urllib.request
+
+from sqlite_rx.tests.metrics.conftest import METRICS_ADDRESS
+
+
+def test_requests_are_counted(metrics_client):
+    metrics_client.execute('CREATE TABLE numbers (n integer)')
+    metrics_client.execute('INSERT INTO numbers VALUES (?)', *[(n,) for n in range(100)], execute_many=True)
+    metrics_client.execute('SELECT * FROM numbers WHERE n > ?', 10)
+    metrics_client.execute('SELECT * FROM missing')
+
+    metrics = metrics_client.metrics()
+    counters = metrics['counters']
+    assert counters['requests_total'] == {'query': 3, 'many': 1, 'admin': 1}
+    assert counters['errors_total'] == {'query': 1}
+    assert counters['received_bytes_total']['all'] > 0
+    assert metrics['gauges']['open_cursors'] == {'all': 0}
+    assert metrics['compression_ratio']['replies'] > 0
+
+
+def test_latency_histograms(metrics_client):
+    histograms = metrics_client.metrics()['histograms']
+    assert set(histograms['query_seconds']) == {'plain', 'many', 'params'}
+    assert histograms['query_seconds']['plain']['count'] == 1
+    for phase in ('decompress', 'unpack', 'execute', 'fetch', 'pack', 'compress', 'send'):
+        summary = histograms['phase_seconds'][phase]
+        assert summary['count'] > 0
+        assert 0 <= summary['p50'] <= summary['p99'] <= summary['max']
+
+
+def test_prometheus_endpoint(metrics_client):
+    with urllib.request.urlopen("http://{}/metrics".format(METRICS_ADDRESS), timeout=5) as response:
+        assert response.headers['Content-Type'].startswith('text/plain')
+        text = response.read().decode()
+    assert '# TYPE sqlite_rx_requests_total counter' in text
+    assert 'sqlite_rx_requests_total{kind="query"}' in text
+    assert '# TYPE sqlite_rx_phase_seconds histogram' in text
+    assert 'sqlite_rx_phase_seconds_bucket{phase="execute",le="+Inf"}' in text
+    assert 'sqlite_rx_open_cursors 0' in text
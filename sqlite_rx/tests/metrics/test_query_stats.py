@@ -0,0 +1,36 @@
+def statements_by_query(client, **kwargs):
+    return {statement['query']: statement for statement in client.query_stats(**kwargs)['statements']}
+
+
+def test_executions_are_aggregated_per_fingerprint(metrics_client):
+    metrics_client.reset_query_stats()
+    metrics_client.execute('CREATE TABLE items (id integer, name text)')
+    for n in range(5):
+        metrics_client.execute('INSERT INTO items VALUES ({}, {!r})'.format(n, 'item {}'.format(n)))
+    metrics_client.execute('SELECT * FROM items WHERE id IN (1, 2, 3)')
+    metrics_client.execute('SELECT * FROM items WHERE id IN (4,  0)')
+    metrics_client.execute('SELECT * FROM missing')
+
+    statements = statements_by_query(metrics_client, limit=0)
+    insert = statements['INSERT INTO items VALUES (?, ?)']
+    assert insert['calls'] == 5
+    assert insert['rows'] == 5
+    select = statements['SELECT * FROM items WHERE id IN (...)']
+    assert select['calls'] == 2
+    assert select['rows'] == 5
+    assert select['bytes'] > 0
+    assert 0 < select['min_time'] <= select['mean_time'] <= select['max_time']
+    assert select['total_time'] == select['mean_time'] * 2
+    assert statements['SELECT * FROM missing']['errors'] == 1
+
+
+def test_order_and_limit(metrics_client):
+    statements = metrics_client.query_stats(order_by='calls', limit=1)['statements']
+    assert [statement['query'] for statement in statements] == ['INSERT INTO items VALUES (?, ?)']
+
+
+def test_reset(metrics_client):
+    metrics_client.reset_query_stats()
+    stats = metrics_client.query_stats()
+    assert stats['statements'] == []
+    assert stats['entries'] == 0
@@ -0,0 +1,96 @@
+import pytest
+
+from sqlite_rx.admission import (BULK, INTERACTIVE, MAX_RETRY_AFTER, MIN_RETRY_AFTER, OLDEST_FIRST_INTERVAL, WRITE,
+                                 RateLimiter, RequestQueue, TokenBucket, request_priority, retry_after_ms)
+from sqlite_rx.client import MAX_BACKOFF, OVERLOADED_ERROR, backoff_delay, is_overloaded, response_error
+from sqlite_rx.exception import SQLiteRxOverloadedError
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2, now=0.0)
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) == pytest.approx(0.1)
+    assert bucket.take(0.05) == pytest.approx(0.05)
+    assert bucket.take(0.1) == 0
+    # Idle time refills the bucket up to its capacity only
+    assert [bucket.take(10.0) for _ in range(3)][:2] == [0, 0]
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=1, max_clients=2)
+    assert limiter.burst == 1
+    assert limiter.take('a', now=0.0) == 0
+    assert limiter.take('a', now=0.0) == pytest.approx(1)
+    assert limiter.take('b', now=0.0) == 0
+    limiter.take('c', now=0.0)
+    assert len(limiter) == 2
+    # 'a' was forgotten and starts with a full bucket
+    assert limiter.take('a', now=0.0) == 0
+
+
+def test_request_queue():
+    queue = RequestQueue(max_size=3)
+    assert queue.put('script', BULK) is None
+    assert queue.put('write', WRITE) is None
+    assert queue.put('many', BULK) is None
+    # The newest request of the lowest class makes room for a higher class
+    assert queue.put('read', INTERACTIVE) == 'many'
+    # A request of the lowest class queued is shed itself
+    assert queue.put('batch', BULK) == 'batch'
+    assert queue.sizes() == {'interactive': 1, 'write': 1, 'bulk': 1}
+    assert [queue.get() for _ in range(len(queue))] == ['read', 'write', 'script']
+    with pytest.raises(IndexError):
+        queue.get()
+
+
+def test_request_queue_keeps_the_order_of_a_key():
+    queue = RequestQueue()
+    queue.put('begin', WRITE, key='a')
+    queue.put('many', BULK, key='a')
+    queue.put('commit', WRITE, key='a')
+    queue.put('write', WRITE, key='b')
+    queue.put('read', INTERACTIVE, key='a')
+    assert [queue.get() for _ in range(len(queue))] == ['begin', 'write', 'many', 'commit', 'read']
+
+
+def test_request_queue_serves_the_oldest_request_regularly():
+    queue = RequestQueue()
+    queue.put('script', BULK)
+    served = []
+    for index in range(OLDEST_FIRST_INTERVAL):
+        queue.put(index, WRITE)
+        served.append(queue.get())
+    assert served == list(range(OLDEST_FIRST_INTERVAL - 1)) + ['script']
+
+
+def test_unbounded_request_queue():
+    queue = RequestQueue()
+    assert all(queue.put(index, BULK) is None for index in range(10000))
+    assert len(queue) == 10000
+
+
+def test_request_priority():
+    assert request_priority({"query": "SELECT 1", "params": []}) == INTERACTIVE
+    assert request_priority({"admin": "stats"}) == INTERACTIVE
+    assert request_priority({"cursor_id": "abc", "position": 10}) == INTERACTIVE
+    assert request_priority({"query": "INSERT INTO t VALUES (1)", "params": []}) == WRITE
+    assert request_priority({"query": "INSERT INTO t VALUES (?)", "params": [[1]], "execute_many": True}) == BULK
+    assert request_priority({"query": "SELECT 1;", "execute_script": True}) == BULK
+    assert request_priority({"batch": [["SELECT 1", []]]}) == BULK
+
+
+def test_retry_after():
+    assert retry_after_ms(0) == MIN_RETRY_AFTER
+    assert retry_after_ms(0.1234) == 124
+    assert retry_after_ms(3600) == MAX_RETRY_AFTER
+
+
+def test_backoff():
+    response = {"items": [], "error": {"type": OVERLOADED_ERROR, "message": "overloaded"}, "retry_after": 100}
+    assert is_overloaded(response)
+    assert not is_overloaded({"items": [], "error": None})
+    assert 0.1 <= backoff_delay(response, 0) <= 0.15
+    assert 0.4 <= backoff_delay(response, 2) <= 0.6
+    assert backoff_delay(response, 20) <= MAX_BACKOFF * 1.5 / 1000
+    assert isinstance(response_error(response['error']), SQLiteRxOverloadedError)
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from sqlite_rx.auth import DEFAULT_AUTH_CONFIG, Authorizer
+from sqlite_rx.exception import SQLiteRxAuthConfigError
+
+
+def connect(config):
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE orders (id, amount)")
+    connection.execute("CREATE TABLE secrets (name, ssn)")
+    connection.execute("INSERT INTO secrets VALUES ('a', '123')")
+    connection.set_authorizer(Authorizer(config))
+    return connection
+
+
+def test_default_config():
+    authorizer = Authorizer()
+    for permission, actions in DEFAULT_AUTH_CONFIG.items():
+        for action in actions:
+            assert authorizer(action, None, None, None, None) == permission
+    assert authorizer(sqlite3.SQLITE_FUNCTION, None, 'abs', None, None) == sqlite3.SQLITE_OK
+    assert authorizer(1000) == sqlite3.SQLITE_OK
+
+
+def test_first_permission_wins():
+    authorizer = Authorizer({sqlite3.SQLITE_DENY: {sqlite3.SQLITE_INSERT},
+                             sqlite3.SQLITE_OK: {sqlite3.SQLITE_INSERT}})
+    assert authorizer(sqlite3.SQLITE_INSERT, 't', None, 'main', None) == sqlite3.SQLITE_DENY
+
+
+def test_column_rule():
+    connection = connect({sqlite3.SQLITE_OK: {sqlite3.SQLITE_READ, sqlite3.SQLITE_SELECT},
+                          sqlite3.SQLITE_DENY: {(sqlite3.SQLITE_READ, 'Secrets', 'SSN')}})
+    assert connection.execute("SELECT name FROM secrets").fetchall() == [('a',)]
+    with pytest.raises(sqlite3.DatabaseError):
+        connection.execute("SELECT ssn FROM secrets")
+    with pytest.raises(sqlite3.DatabaseError):
+        connection.execute("SELECT * FROM secrets")
+
+
+def test_ignore_column():
+    connection = connect({sqlite3.SQLITE_IGNORE: {(sqlite3.SQLITE_READ, 'secrets', 'ssn')}})
+    assert connection.execute("SELECT name, ssn FROM secrets").fetchall() == [('a', None)]
+
+
+def test_table_rule():
+    connection = connect({sqlite3.SQLITE_DENY: {sqlite3.SQLITE_READ},
+                          sqlite3.SQLITE_OK: {(sqlite3.SQLITE_READ, 'orders'), sqlite3.SQLITE_INSERT}})
+    assert connection.execute("SELECT id FROM orders").fetchall() == []
+    with pytest.raises(sqlite3.DatabaseError):
+        connection.execute("SELECT name FROM secrets")
+
+
+def test_column_rule_overrides_table_rule():
+    authorizer = Authorizer({sqlite3.SQLITE_OK: {(sqlite3.SQLITE_UPDATE, 'orders', 'amount')},
+                             sqlite3.SQLITE_DENY: {(sqlite3.SQLITE_UPDATE, 'orders')}})
+    assert authorizer(sqlite3.SQLITE_UPDATE, 'orders', 'amount', 'main', None) == sqlite3.SQLITE_OK
+    assert authorizer(sqlite3.SQLITE_UPDATE, 'orders', 'id', 'main', None) == sqlite3.SQLITE_DENY
+    assert authorizer(sqlite3.SQLITE_UPDATE, 'other', 'id', 'main', None) == sqlite3.SQLITE_OK
+
+
+@pytest.mark.parametrize('rule', ['read', (sqlite3.SQLITE_READ,), (sqlite3.SQLITE_READ, 1),
+                                  (sqlite3.SQLITE_READ, 't', 'c', 'x')])
+def test_invalid_rules(rule):
+    with pytest.raises(SQLiteRxAuthConfigError):
+        Authorizer({sqlite3.SQLITE_DENY: {rule}})
+
+
+def test_actions_of_later_sqlite_versions():
+    authorizer = Authorizer({sqlite3.SQLITE_DENY: {1000}})
+    assert authorizer(1000, None, None, None, None) == sqlite3.SQLITE_DENY
+    assert authorizer(1001, None, None, None, None) == sqlite3.SQLITE_OK
+
+
+def test_invalid_permission():
+    with pytest.raises(SQLiteRxAuthConfigError):
+        Authorizer({5: {sqlite3.SQLITE_READ}})
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+
+from sqlite_rx.backup import SQLiteBackUp, SQLiteSnapshot, is_backup_supported, parse_retention
+
+pytestmark = pytest.mark.skipif(not is_backup_supported(), reason="sqlite backup is not supported")
+
+
+@pytest.fixture
+def databases():
+    with tempfile.TemporaryDirectory() as base_dir:
+        source = os.path.join(base_dir, 'source.db')
+        connection = sqlite3.connect(source)
+        connection.execute("CREATE TABLE t (x BLOB)")
+        connection.executemany("INSERT INTO t VALUES (?)", [(b'x' * 1000,)] * 500)
+        connection.commit()
+        yield connection, source, os.path.join(base_dir, 'backup.db')
+        connection.close()
+
+
+def count(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT count(*) FROM t").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_backup_in_steps(databases):
+    connection, source, target = databases
+    backup = SQLiteBackUp(source, target, pages=10, sleep=0)
+    report = backup()
+    page_size = connection.execute('pragma page_size').fetchone()[0]
+    page_count = connection.execute('pragma page_count').fetchone()[0]
+    assert report['pages'] == page_count
+    assert report['bytes'] == page_count * page_size
+    assert report['steps'] == -(-page_count // 10)
+    assert report['duration'] > 0
+    assert backup.last_report is report
+    assert count(target) == 500
+
+
+def test_backup_restarted_by_writes(databases):
+    _, source, target = databases
+    stop = threading.Event()
+
+    def write():
+        writer = sqlite3.connect(source, timeout=10)
+        while not stop.is_set():
+            writer.execute("INSERT INTO t VALUES (1)")
+            writer.commit()
+        writer.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        # Every step restarts the backup, which completes in a single step after 2 restarts
+        report = SQLiteBackUp(source, target, pages=1, sleep=0.005, restarts=2)()
+    finally:
+        stop.set()
+        thread.join()
+    assert report is not None
+    assert report['restarts'] == 3
+    assert count(target) >= 500
+
+
+def test_skip_unchanged(databases):
+    connection, source, target = databases
+    backup = SQLiteBackUp(source, target)
+    assert backup() is not None
+    assert backup() is None
+    assert (backup.runs, backup.skipped) == (1, 1)
+
+    connection.execute("INSERT INTO t VALUES (1)")
+    connection.commit()
+    assert backup() is not None
+    assert count(target) == 501
+
+    os.remove(target)
+    assert backup() is not None
+    assert count(target) == 501
+    assert (backup.runs, backup.skipped) == (3, 1)
+
+
+def test_parse_retention():
+    assert parse_retention(None) == (None, None)
+    assert parse_retention('10') == (10, None)
+    assert parse_retention('24h') == (None, 24.0)
+    assert parse_retention('10, 1.5h') == (10, 1.5)
+    with pytest.raises(ValueError):
+        parse_retention('10d')
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_snapshot(databases, compress):
+    connection, source, _ = databases
+    connection.execute("DELETE FROM t WHERE rowid > 10")
+    connection.commit()
+    directory = os.path.join(os.path.dirname(source), 'snapshots')
+    snapshot = SQLiteSnapshot(source, directory, compress=compress)
+    entry = snapshot()
+    assert snapshot() is None
+    path = os.path.join(directory, entry['file'])
+    with open(path, 'rb') as f:
+        content = f.read()
+    assert entry['size'] == len(content)
+    assert entry['sha256'] == hashlib.sha256(content).hexdigest()
+    assert entry['compressed'] is compress
+    # The snapshot is compacted, without the free pages of the source
+    assert entry['database_size'] < os.path.getsize(source)
+    if compress:
+        assert entry['file'].endswith('.db.gz')
+        restored = os.path.join(directory, 'restored.db')
+        with gzip.open(path) as f, open(restored, 'wb') as target:
+            target.write(f.read())
+        path = restored
+    assert count(path) == 10
+    assert snapshot.manifest() == [entry]
+    assert sorted(os.listdir(directory)) == sorted([entry['file'], 'manifest.json'] + (['restored.db'] if compress else []))
+
+
+def test_snapshot_retention(databases):
+    connection, source, _ = databases
+    directory = os.path.join(os.path.dirname(source), 'snapshots')
+    snapshot = SQLiteSnapshot(source, directory, retention_count=2)
+    files = []
+    for _ in range(3):
+        connection.execute("INSERT INTO t VALUES (1)")
+        connection.commit()
+        files.append(snapshot()['file'])
+    assert [entry['file'] for entry in snapshot.manifest()] == files[1:]
+    assert sorted(os.listdir(directory)) == sorted(files[1:] + ['manifest.json'])
+
+    snapshot.retention_count = None
+    snapshot.retention_hours = 1
+    entries = snapshot.manifest()
+    entries[0]['time'] -= 7200
+    entries[1]['time'] -= 7200
+    # The newest snapshot is kept whatever its age
+    assert snapshot.expire(entries) == entries[1:]
+    assert os.listdir(directory).count(files[1]) == 0
@@ -0,0 +1,60 @@
+import pytest
+
+from sqlite_rx.benchmarks import compare, percentile, run_scenarios, scenarios
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 0.999) == 100
+    assert percentile([], 0.5) == 0.0
+
+
+def test_scenarios():
+    runs = scenarios(modes=['plain', 'zap'], clients=[1, 4], batch_sizes=[1, 10])
+    assert len(runs) == 8
+    assert runs[0].name == 'plain-c1-p64-r0.8-b1'
+    with pytest.raises(ValueError):
+        scenarios(modes=['tls'])
+
+
+def result(name, ops_per_sec, p50, p99):
+    return {"name": name, "ops_per_sec": ops_per_sec, "latency_ms": {"p50": p50, "p99": p99}}
+
+
+def test_compare():
+    baseline = {"results": [result('a', 1000, 1.0, 2.0), result('b', 1000, 1.0, 2.0)]}
+    current = {"results": [result('a', 950, 1.05, 2.1), result('b', 800, 1.0, 3.0), result('c', 1, 1, 1)]}
+    regressions = compare(baseline, current, threshold=0.1)
+    assert [(regression['name'], regression['metric']) for regression in regressions] == \
+        [('b', 'ops_per_sec'), ('b', 'latency_ms.p99')]
+    assert regressions[0]['change'] == pytest.approx(-0.2)
+
+
+def test_run_scenarios():
+    results = run_scenarios(scenarios(clients=[2], read_ratios=[0.5], batch_sizes=[5], operations=20))
+    assert len(results) == 1
+    assert results[0]['ops'] == 20
+    assert results[0]['errors'] == 0
+    assert results[0]['ops_per_sec'] > 0
+    assert set(results[0]['latency_ms']) == {'mean', 'p50', 'p95', 'p99', 'p999', 'max'}
+
+
+def test_authorizer_benchmark():
+    from sqlite_rx.benchmarks.authorizer import run
+    results = run(columns=10, statements=5)
+    assert set(results) == {'none', 'loop', 'compiled', 'rules'}
+    assert results['none']['calls_per_statement'] == 0
+    assert results['compiled']['calls_per_statement'] == results['loop']['calls_per_statement'] > 10
+
+
+def test_engine_scenarios():
+    runs = scenarios(engines=['tornado', 'asyncio'])
+    assert [run.name for run in runs] == ['plain-c1-p64-r0.8-b1', 'plain-c1-p64-r0.8-b1-asyncio']
+    with pytest.raises(ValueError):
+        scenarios(engines=['gevent'])
+
+    results = run_scenarios(scenarios(engines=['asyncio'], operations=20))
+    assert results[0]['engine'] == 'asyncio'
+    assert results[0]['errors'] == 0
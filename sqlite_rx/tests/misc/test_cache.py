@@ -0,0 +1,42 @@
+from sqlite_rx.cache import ResultCache
+
+
+def test_lru_eviction_by_size():
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', b'x' * 40, ['t1'])
+    cache.put('b', b'x' * 40, ['t2'])
+    assert cache.get('a') is not None
+    cache.put('c', b'x' * 40, ['t3'])
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.size == 80
+
+
+def test_oversized_reply_not_cached():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', b'x' * 11, ['t1'])
+    assert cache.get('a') is None
+
+
+def test_invalidation_by_table():
+    cache = ResultCache(max_bytes=1000)
+    cache.put('a', b'1', ['t1', 't2'])
+    cache.put('b', b'2', ['t2'])
+    cache.put('c', b'3', ['t3'])
+    cache.invalidate(['t2'])
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.get('c') == b'3'
+    cache.invalidate(['*'])
+    assert cache.get('c') is None
+    assert cache.size == 0
+
+
+def test_data_version_change_clears():
+    cache = ResultCache(max_bytes=1000)
+    cache.check_data_version(1)
+    cache.put('a', b'1', ['t1'])
+    cache.check_data_version(1)
+    assert cache.get('a') == b'1'
+    cache.check_data_version(2)
+    assert cache.get('a') is None
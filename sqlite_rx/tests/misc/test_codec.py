@@ -0,0 +1,91 @@
+import zlib
+
+import msgpack
+import pytest
+
+from sqlite_rx.codec import Codec, LEGACY_PEER, available_compressions, blob_hook, build_dictionary, message_size
+from sqlite_rx.exception import SQLiteRxCompressionError
+
+
+PAYLOAD = msgpack.dumps({"items": [[n, 'row {}'.format(n)] for n in range(100)], "error": None})
+
+
+def test_legacy_messages():
+    codec = Codec()
+    data = codec.encode(PAYLOAD, LEGACY_PEER)
+    assert zlib.decompress(data) == PAYLOAD
+    assert codec.decode(zlib.compress(PAYLOAD)) == (PAYLOAD, LEGACY_PEER)
+
+
+def test_small_payload_not_compressed():
+    codec = Codec(threshold=512)
+    small = msgpack.dumps({"query": "SELECT 1"})
+    framed_peer = codec.negotiate(LEGACY_PEER, {"codec": codec.announcement()})
+    data = codec.encode(small, framed_peer)
+    assert data.endswith(small)
+    assert codec.decode(data)[0] == small
+
+
+def test_round_trip_and_negotiation():
+    server, client = Codec(), Codec()
+    peer = server.negotiate(LEGACY_PEER, {"codec": client.announcement()})
+    assert not peer.legacy
+    payload, server_peer = client.decode(server.encode(PAYLOAD, peer))
+    assert payload == PAYLOAD
+    assert not server_peer.legacy
+    assert server.decode(client.encode(PAYLOAD, server_peer))[0] == PAYLOAD
+
+
+def test_preset_dictionary():
+    zdict = build_dictionary([PAYLOAD])
+    server, client = Codec(zdict=zdict), Codec(zdict=zdict)
+    peer = server.negotiate(LEGACY_PEER, {"codec": client.announcement()})
+    with_dict = server.encode(PAYLOAD, peer)
+    without_dict = Codec().encode(PAYLOAD, peer)
+    assert len(with_dict) < len(without_dict)
+    assert client.decode(with_dict)[0] == PAYLOAD
+
+
+def test_dictionary_only_used_when_shared():
+    server, client = Codec(zdict=b'some dictionary' * 10), Codec()
+    peer = server.negotiate(LEGACY_PEER, {"codec": client.announcement()})
+    assert client.decode(server.encode(PAYLOAD, peer))[0] == PAYLOAD
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        Codec(compression='brotli')
+
+
+def test_corrupted_message():
+    with pytest.raises(SQLiteRxCompressionError):
+        Codec().decode(b'not compressed')
+
+
+@pytest.mark.parametrize("compression", [name for name in available_compressions() if name != 'zlib'])
+def test_other_compressions(compression):
+    server, client = Codec(compression=compression), Codec()
+    peer = server.negotiate(LEGACY_PEER, {"codec": client.announcement()})
+    assert client.decode(server.encode(PAYLOAD, peer))[0] == PAYLOAD
+
+
+def test_out_of_band_blobs():
+    server, client = Codec(frame_threshold=1024), Codec(frame_threshold=1024)
+    peer = server.negotiate(LEGACY_PEER, {"codec": client.announcement()})
+    assert server.out_of_band(peer)
+    assert not server.out_of_band(LEGACY_PEER)
+    assert not Codec(frame_threshold=0).out_of_band(peer)
+
+    blob = bytes(range(256)) * 8
+    row = [1, b'small', blob]
+    frames = []
+    detached = server.detach(row, frames)
+    assert frames == [blob]
+    assert detached[:2] == row[:2] and detached[2] is not blob
+    assert server.detach([1, b'small'], frames) == [1, b'small']
+
+    payload = msgpack.dumps({"items": [detached]})
+    views = [memoryview(frame) for frame in frames]
+    result = msgpack.loads(payload, raw=False, ext_hook=blob_hook(views))
+    assert result["items"][0][2] is views[0]
+    assert message_size([payload] + frames) == len(payload) + len(blob)
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from sqlite_rx.exception import SQLiteRxUnknownDatabaseError
+from sqlite_rx.metrics import Metrics
+from sqlite_rx.server import DatabasePool, QueryStreamHandler
+
+
+def database_pool(directory, metrics=None, **kwargs) -> DatabasePool:
+    return DatabasePool(None,
+                        str(directory),
+                        lambda path, scope: QueryStreamHandler(None, path, metrics=scope),
+                        metrics=metrics,
+                        **kwargs)
+
+
+def test_scoped_metrics():
+    metrics = Metrics()
+    scoped = metrics.scoped('database', 'a.db')
+    scoped.inc('requests_total', kind='query')
+    scoped.gauge('open_cursors', lambda: 2)
+    metrics.gauge('open_cursors', lambda: 1)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['requests_total'] == {'a.db,query': 1}
+    assert snapshot['gauges']['open_cursors'] == {'all': 1, 'a.db': 2}
+    assert 'sqlite_rx_requests_total{database="a.db",kind="query"} 1' in metrics.prometheus()
+    scoped.close()
+    assert metrics.snapshot()['gauges']['open_cursors'] == {'all': 1}
+
+
+def test_database_names(tmp_path):
+    pool = database_pool(tmp_path)
+    assert pool.path('tenant_1.db') == str(tmp_path / 'tenant_1.db')
+    for name in ('../a.db', 'a/b.db', '.a.db', '', 'a.db-wal', 'a.db-journal', None, 1):
+        with pytest.raises(SQLiteRxUnknownDatabaseError):
+            pool.path(name)
+    # Databases are not created by default
+    with pytest.raises(SQLiteRxUnknownDatabaseError):
+        pool.open('a.db')
+    assert not (tmp_path / 'a.db').exists()
+
+
+def test_least_recently_used_databases_are_closed(tmp_path):
+    metrics = Metrics()
+    pool = database_pool(tmp_path, metrics, max_databases=2, create=True)
+    first = pool.open('a.db')
+    pool.open('b.db')
+    assert pool.open('a.db') is first
+    pool.open('c.db')
+    assert list(pool._handlers) == ['a.db', 'c.db']
+    # A database in a transaction is not closed
+    first._connection.execute('BEGIN')
+    pool.open('d.db')
+    assert list(pool._handlers) == ['a.db', 'd.db']
+    first._connection.execute('COMMIT')
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['database_evictions_total'] == {'all': 2}
+    assert snapshot['gauges']['open_databases'] == {'all': 2}
+    pool.close_all()
+    assert metrics.snapshot()['gauges']['open_databases'] == {'all': 0}
+
+
+def test_memory_limit(tmp_path):
+    pool = database_pool(tmp_path, max_memory=1, create=True)
+    handler = pool.open('a.db')
+    handler._connection.execute('CREATE TABLE t (x)')
+    assert handler.memory_estimate() > 0
+    pool.open('b.db')
+    assert list(pool._handlers) == ['b.db']
+    pool.close_all()
+
+
+def test_closed_databases_close_the_slow_query_log(tmp_path):
+    pool = DatabasePool(None, str(tmp_path),
+                        lambda path, scope: QueryStreamHandler(None, path, slow_query_threshold=0),
+                        max_databases=1, create=True)
+    handler = pool.open('a.db')
+    handler._slow_log.explain('SELECT 1')
+    side_connection = handler._slow_log._side_connection
+    pool.open('b.db')
+    with pytest.raises(sqlite3.ProgrammingError):
+        side_connection.execute('SELECT 1')
+    pool.close_all()
@@ -0,0 +1,20 @@
+from sqlite_rx.client import TIMEOUT_ERROR, response_error
+from sqlite_rx.exception import SQLiteRxQueryError, SQLiteRxTimeoutError
+from sqlite_rx.server import QueryStreamHandler
+
+
+def test_deadline():
+    assert QueryStreamHandler.deadline({"query": "SELECT 1"}) is None
+    assert QueryStreamHandler.deadline({"timeout": 0}, received_at=10.0) is None
+    assert QueryStreamHandler.deadline({"timeout": True}, received_at=10.0) is None
+    assert QueryStreamHandler.deadline({"timeout": 2500}, received_at=10.0) == 12.5
+
+
+def test_response_error():
+    error = response_error({"type": TIMEOUT_ERROR, "message": "cancelled"})
+    assert isinstance(error, SQLiteRxTimeoutError)
+    # Existing handlers of query errors catch timeouts too
+    assert isinstance(error, SQLiteRxQueryError)
+    error = response_error({"type": "sqlite3.OperationalError", "message": "no such table: missing"})
+    assert type(error) is SQLiteRxQueryError
+    assert str(error) == "sqlite3.OperationalError: no such table: missing"
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from sqlite_rx.metrics import Histogram, Metrics, bucket_bounds, bucket_index
+
+
+def test_buckets_cover_every_value():
+    for value in list(range(0, 2000)) + [12345, 10 ** 6, 10 ** 9]:
+        low, high = bucket_bounds(bucket_index(value))
+        assert low <= value < high
+        assert (high - low) <= max(1, low / 8)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for micros in range(1, 1001):
+        histogram.record(micros / 1e6)
+    assert histogram.count == 1000
+    assert histogram.quantile(0.5) == pytest.approx(500e-6, rel=0.125)
+    assert histogram.quantile(0.99) == pytest.approx(990e-6, rel=0.125)
+    assert histogram.quantile(1.0) == pytest.approx(1000e-6)
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_cumulative_buckets():
+    histogram = Histogram()
+    for micros in (1, 3, 5, 100, 3000):
+        histogram.record(micros / 1e6)
+    assert histogram.cumulative([2, 4, 8, 128, 4096]) == [1, 2, 3, 4, 5]
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.inc('requests_total', kind='query')
+    metrics.inc('requests_total', kind='query')
+    metrics.gauge('open_cursors', lambda: 3)
+    metrics.gauge('in_flight', lambda: {"backend": {"reader": 1, "writer": 0}})
+    metrics.observe('phase_seconds', 0.002, phase='execute')
+    text = metrics.prometheus()
+    assert 'sqlite_rx_requests_total{kind="query"} 2' in text
+    assert 'sqlite_rx_open_cursors 3' in text
+    assert 'sqlite_rx_in_flight{backend="reader"} 1' in text
+    assert 'sqlite_rx_phase_seconds_count{phase="execute"} 1' in text
+    assert 'sqlite_rx_phase_seconds_bucket{phase="execute",le="+Inf"} 1' in text
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['requests_total'] == {'query': 2}
+    assert snapshot['gauges']['in_flight'] == {'reader': 1, 'writer': 0}
+
+
+def test_gauges_of_several_handlers_add_up():
+    metrics = Metrics()
+    metrics.gauge('open_cursors', lambda: 3)
+    metrics.gauge('open_cursors', lambda: 2)
+    metrics.gauge('executor_queue', lambda: {"pool": {"reader": 1, "writer": 0}})
+    metrics.gauge('executor_queue', lambda: {"pool": {"reader": 2}})
+    snapshot = metrics.snapshot()
+    assert snapshot['gauges']['open_cursors'] == {'all': 5}
+    assert snapshot['gauges']['executor_queue'] == {'reader': 3, 'writer': 0}
+    assert 'sqlite_rx_executor_queue{pool="reader"} 3' in metrics.prometheus()
+
+
+def test_concurrent_recording():
+    metrics = Metrics()
+
+    def record():
+        for _ in range(1000):
+            metrics.inc('requests_total', kind='query')
+            metrics.observe('executor_queue_seconds', 0.001, pool='reader')
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['requests_total'] == {'query': 4000}
+    assert snapshot['histograms']['executor_queue_seconds']['reader']['count'] == 4000
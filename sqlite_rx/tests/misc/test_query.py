@@ -0,0 +1,41 @@
+import pytest
+
+from sqlite_rx.query import is_plain_write, is_read_only, is_read_only_request
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM stocks",
+    "  select count(*) from stocks where symbol = 'update'",
+    "/* report */ SELECT 1",
+    "WITH t AS (SELECT 1) SELECT * FROM t",
+    "VALUES (1), (2)",
+])
+def test_read_only_queries(query):
+    assert is_read_only(query)
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT INTO stocks VALUES (1)",
+    "UPDATE stocks SET price = 1",
+    "WITH t AS (SELECT 1) DELETE FROM stocks",
+    "PRAGMA journal_mode",
+    "-- only a comment",
+    "",
+])
+def test_write_queries(query):
+    assert not is_read_only(query)
+
+
+def test_read_only_request():
+    assert is_read_only_request({'query': 'SELECT 1', 'execute_many': False, 'execute_script': False})
+    assert not is_read_only_request({'query': 'SELECT 1', 'execute_many': False, 'execute_script': True})
+
+
+def test_is_plain_write():
+    assert is_plain_write("INSERT INTO t VALUES (1)")
+    assert is_plain_write("  -- comment\n replace into t values (1)")
+    assert is_plain_write("UPDATE t SET x = 1")
+    assert not is_plain_write("BEGIN")
+    assert not is_plain_write("VACUUM")
+    assert not is_plain_write("CREATE TABLE t (x)")
+    assert not is_plain_write("SELECT 1")
@@ -0,0 +1,32 @@
+import pytest
+
+from sqlite_rx.query import fingerprint
+from sqlite_rx.querystats import QueryStats
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'", "SELECT * FROM t WHERE id IN (...) AND name = ?"),
+    ("select  a1,b from t2 where x > 5.5e3 -- comment\n and y=:name;", "select a1, b from t2 where x > ? and y=?"),
+    ("INSERT INTO t VALUES (1,'a'),(2,'b'), (3, X'ff')", "INSERT INTO t VALUES (?, ?)"),
+    ("SELECT '--', 'it''s' /* comment */ FROM t where z in (?,?)", "SELECT ?, ? FROM t where z in (...)"),
+    ("select ?1, @a, $b from t limit 10 offset 0x1F", "select ?, ?, ? from t limit ? offset ?"),
+])
+def test_fingerprint(query, expected):
+    assert fingerprint(query) == expected
+
+
+def test_eviction_of_least_called():
+    stats = QueryStats(max_entries=10)
+    for n in range(10):
+        for _ in range(n + 1):
+            stats.record('SELECT {} FROM t{}'.format(n, n), 0.001)
+    stats.record('SELECT 1 FROM new_table', 0.001)
+    queries = {statement['query'] for statement in stats.top(limit=0)}
+    assert 'SELECT ? FROM t0' not in queries
+    assert 'SELECT ? FROM new_table' in queries
+    assert stats.evicted == 1
+
+
+def test_unknown_order():
+    with pytest.raises(ValueError):
+        QueryStats().top(order_by='name')
@@ -0,0 +1,167 @@
+import itertools
+import os
+import sqlite3
+import tempfile
+
+import msgpack
+import pytest
+import zmq
+
+from sqlite_rx.auth import Authorizer
+from sqlite_rx.exception import SQLiteRxReplicationError
+from sqlite_rx.replication import Follower, ReplicationLog, read_sequence, statement_kind
+
+
+@pytest.mark.parametrize('query, kind', [
+    ("SELECT * FROM t", None),
+    ("INSERT INTO t VALUES (1)", 'write'),
+    ("/* c */ create table t (x)", 'write'),
+    ("BEGIN IMMEDIATE", None),
+    ("COMMIT", None),
+    ("ROLLBACK", None),
+    ("ROLLBACK TO sp", 'savepoint'),
+    ("ROLLBACK TRANSACTION TO SAVEPOINT sp", 'savepoint'),
+    ("SAVEPOINT sp", 'savepoint'),
+    ("RELEASE sp", 'savepoint'),
+    ("VACUUM", None),
+    ("PRAGMA user_version = 1", None),
+])
+def test_statement_kind(query, kind):
+    assert statement_kind(query) == kind
+
+
+ADDRESSES = ("inproc://replication-{}".format(index) for index in itertools.count())
+
+
+@pytest.fixture
+def primary():
+    context = zmq.Context.instance()
+    publisher = context.socket(zmq.PUB)
+    subscriber = context.socket(zmq.SUB)
+    address = next(ADDRESSES)
+    publisher.bind(address)
+    subscriber.setsockopt(zmq.SUBSCRIBE, b'')
+    subscriber.connect(address)
+    with tempfile.TemporaryDirectory() as base_dir:
+        connection = sqlite3.connect(os.path.join(base_dir, 'primary.db'), isolation_level=None)
+        log = ReplicationLog(publisher, address, max_entries=3)
+        connection.set_authorizer(log.attach(connection, Authorizer()))
+        yield log, connection, subscriber, base_dir
+        connection.close()
+    subscriber.close(0)
+    publisher.close(0)
+
+
+def run(log, connection, query, params=None, mode='plain'):
+    with log.write(query, params, mode):
+        if mode == 'script':
+            connection.executescript(query)
+        elif mode == 'many':
+            connection.executemany(query, params)
+        else:
+            connection.execute(query, params or ())
+    log.flush()
+
+
+def test_replication_log(primary):
+    log, connection, subscriber, _ = primary
+    run(log, connection, "CREATE TABLE t (x)")
+    run(log, connection, "INSERT INTO t VALUES (?)", [1], 'params')
+    run(log, connection, "INSERT INTO t VALUES (?)", [[2], [3]], 'many')
+    run(log, connection, "SELECT * FROM t")
+    assert log.sequence == 3
+    assert read_sequence(connection)[0] == 3
+    assert not connection.in_transaction
+    published = [msgpack.loads(subscriber.recv(), raw=False) for _ in range(3)]
+    assert [entry['sequence'] for entry in published] == [1, 2, 3]
+    assert published[2]['statements'] == [["INSERT INTO t VALUES (?)", [[2], [3]], 'many']]
+
+    run(log, connection, "BEGIN")
+    run(log, connection, "INSERT INTO t VALUES (4)")
+    run(log, connection, "UPDATE t SET x = 5 WHERE x = 4")
+    run(log, connection, "COMMIT")
+    run(log, connection, "BEGIN")
+    run(log, connection, "UPDATE t SET x = 0")
+    run(log, connection, "ROLLBACK")
+    assert log.sequence == 4
+    entry = msgpack.loads(subscriber.recv(), raw=False)
+    assert [statement[0] for statement in entry['statements']] == ["INSERT INTO t VALUES (4)",
+                                                                   "UPDATE t SET x = 5 WHERE x = 4"]
+
+    # A failed statement is neither executed nor recorded
+    with pytest.raises(sqlite3.OperationalError):
+        run(log, connection, "INSERT INTO missing VALUES (1)")
+    assert log.sequence == 4
+
+    assert [entry['sequence'] for entry in log.entries(1)] == [2, 3, 4]
+    assert log.entries(4) == []
+    # Only the last 3 transactions are kept
+    assert log.entries(0) is None
+
+
+def test_non_deterministic_writes_are_refused(primary):
+    log, connection, _, _ = primary
+    run(log, connection, "CREATE TABLE t (x)")
+    for query in ("INSERT INTO t VALUES (random())",
+                  "INSERT INTO t VALUES (datetime('now'))",
+                  "UPDATE t SET x = CURRENT_TIMESTAMP",
+                  "INSERT INTO t VALUES (last_insert_rowid())"):
+        with pytest.raises(SQLiteRxReplicationError):
+            run(log, connection, query)
+    assert connection.execute("SELECT count(*) FROM t").fetchone() == (0,)
+    assert log.sequence == 1
+    # Reads are not replicated and may use them
+    run(log, connection, "SELECT random()")
+
+
+def test_sequence_table_is_protected(primary):
+    log, connection, _, _ = primary
+    with pytest.raises(sqlite3.DatabaseError):
+        connection.execute("UPDATE _sqlite_rx_replication SET sequence = 10")
+
+
+def test_follower(primary):
+    log, connection, _, base_dir = primary
+    run(log, connection, "CREATE TABLE t (x)")
+    run(log, connection, "INSERT INTO t VALUES (1)")
+    backup = os.path.join(base_dir, 'backup.db')
+    target = sqlite3.connect(backup)
+    connection.backup(target)
+    target.close()
+    for value in range(2, 5):
+        run(log, connection, "INSERT INTO t VALUES (?)", [value], 'params')
+
+    follower = Follower(os.path.join(base_dir, 'follower.db'), "tcp://127.0.0.1:1", bootstrap_database=backup)
+    follower.open()
+    # The follower starts from the backup, which holds the first 2 transactions
+    assert follower.sequence == 2
+    assert follower.bootstraps == 1
+
+    requests = []
+
+    def request(since):
+        requests.append(since)
+        return log.status({"since": since})
+
+    follower._request = request
+    follower.catch_up()
+    assert follower.sequence == log.sequence == 5
+    assert requests == [2]
+    status = follower.status({})
+    assert (status['lag'], status['primary_sequence'], status['applied']) == (0, 5, 3)
+    values = sqlite3.connect(follower.database).execute("SELECT x FROM t ORDER BY x").fetchall()
+    assert values == [(value,) for value in range(1, 5)]
+
+    # Too far behind and the backup is too old to catch up from
+    run(log, connection, "INSERT INTO t VALUES (5)")
+    follower.sequence = 1
+    with pytest.raises(SQLiteRxReplicationError):
+        follower.catch_up()
+
+
+def test_follower_without_bootstrap(primary):
+    _, _, _, base_dir = primary
+    follower = Follower(os.path.join(base_dir, 'follower.db'), "tcp://127.0.0.1:1")
+    follower.open()
+    with pytest.raises(SQLiteRxReplicationError):
+        follower.bootstrap()
@@ -0,0 +1,50 @@
+import collections
+
+import pytest
+
+from sqlite_rx.sharding import HashRing, RangeMap, ShardedSQLiteClient
+
+
+def test_hash_ring_distribution():
+    ring = HashRing(["a", "b", "c"])
+    counts = collections.Counter(ring.shard_for(key) for key in range(30000))
+    assert set(counts) == {"a", "b", "c"}
+    assert all(7000 < count < 13000 for count in counts.values())
+
+
+def test_hash_ring_moves_keys_to_the_new_shard_only():
+    ring = HashRing(["a", "b", "c"])
+    bigger = ring.with_shard("d")
+    assert ring.shards == ["a", "b", "c"]
+    moved = [key for key in range(10000) if ring.shard_for(key) != bigger.shard_for(key)]
+    assert all(bigger.shard_for(key) == "d" for key in moved)
+    assert 1500 < len(moved) < 3500
+
+    smaller = bigger.without_shard("d")
+    assert all(smaller.shard_for(key) == ring.shard_for(key) for key in range(1000))
+
+    with pytest.raises(ValueError):
+        ring.with_shard("a")
+    with pytest.raises(ValueError):
+        HashRing().shard_for(1)
+
+
+def test_range_map():
+    ranges = RangeMap([(None, "a"), (1000, "b"), (5000, "c")])
+    assert [ranges.shard_for(key) for key in (-1, 999, 1000, 4999, 5000, 10 ** 9)] == ["a", "a", "b", "b", "c", "c"]
+
+    split = ranges.with_shard("d", 3000)
+    assert split.shards == ["a", "b", "d", "c"]
+    assert [split.shard_for(key) for key in (2999, 3000, 5000)] == ["b", "d", "c"]
+
+    with pytest.raises(ValueError):
+        RangeMap([(0, "a")])
+    with pytest.raises(ValueError):
+        RangeMap([(None, "a"), (10, "b"), (5, "c")])
+    with pytest.raises(ValueError):
+        ranges.with_shard("d")
+
+
+def test_router_must_match_the_shards():
+    with pytest.raises(ValueError):
+        ShardedSQLiteClient({"a": "tcp://127.0.0.1:5999"}, router=HashRing(["a", "b"]))
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from sqlite_rx.slowlog import SlowQueryLog
+
+
+def test_threshold_and_redaction():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE t (x)')
+    log = SlowQueryLog(':memory:', threshold=0.5, redact_params=True, connection=connection)
+    assert not log.check(0.1, {}, 'SELECT * FROM t WHERE x = ?', [1], 'params', 0)
+    assert log.check(0.6, {'client_id': 'c'}, 'SELECT * FROM t WHERE x = ?', [1], 'params', 0)
+    record = log.recent[-1]
+    assert record['params'] is None
+    assert record['plan'] == ['SCAN t']
+    assert log.count == 1
+
+
+def test_long_params_are_truncated():
+    log = SlowQueryLog(':memory:', threshold=0)
+    log.check(1, {}, 'SELECT ?, ?', ['x' * 1000, b'blob'], 'params', 1)
+    record = log.recent[-1]
+    assert record['params'][1] == '<4 bytes>'
+    assert len(record['params'][0]) < 300
+    # Without a connection the query can't be explained
+    assert record['plan'] is None
+
+
+def test_nested_plan():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE t (x)')
+    log = SlowQueryLog(':memory:', threshold=0, connection=connection)
+    plan = log.explain('SELECT * FROM t WHERE x IN (SELECT x FROM t WHERE x > 1)')
+    assert plan[0] == 'SCAN t'
+    assert any(line.startswith('  ') for line in plan)
+
+
+def test_close_side_connection():
+    with tempfile.TemporaryDirectory() as base_dir:
+        database = os.path.join(base_dir, 'main.db')
+        connection = sqlite3.connect(database)
+        connection.execute('CREATE TABLE t (x)')
+        log = SlowQueryLog(database, threshold=0, connection=connection)
+        assert log.explain('SELECT * FROM t') == ['SCAN t']
+        side_connection = log._side_connection
+        log.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            side_connection.execute('SELECT 1')
+        # Closing twice is harmless
+        log.close()
+        connection.close()
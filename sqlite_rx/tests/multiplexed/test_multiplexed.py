@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sqlite_rx.client import MultiplexedSQLiteClient
+from sqlite_rx.exception import SQLiteRxConnectionError
+
+
+def test_submit(multiplexed_client):
+    response = multiplexed_client.execute("CREATE TABLE numbers (value INTEGER)")
+    assert response['error'] is None
+
+    futures = [multiplexed_client.submit("INSERT INTO numbers VALUES (?)", value) for value in range(50)]
+    assert all(future.result()['error'] is None for future in futures)
+    assert multiplexed_client.in_flight == 0
+
+    response = multiplexed_client.execute("SELECT count(*), sum(value) FROM numbers")
+    assert response['items'] == [[50, sum(range(50))]]
+
+
+def test_many_threads_share_the_client(multiplexed_client):
+    def square(value):
+        return multiplexed_client.execute("SELECT ? * ?", value, value)['items'][0][0]
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        assert list(executor.map(square, range(200))) == [value * value for value in range(200)]
+    assert len([thread for thread in threading.enumerate() if thread.name == 'sqlite-rx-client-io']) >= 1
+
+
+def test_errors_and_batches(multiplexed_client):
+    response = multiplexed_client.execute("SELECT * FROM missing")
+    assert response['error']['type'] == 'sqlite3.OperationalError'
+
+    response = multiplexed_client.execute_batch([
+        ("INSERT INTO numbers VALUES (?)", (100,)),
+        "SELECT max(value) FROM numbers",
+    ])
+    assert response['error'] is None
+    assert response['results'][1]['items'] == [[100]]
+
+
+def test_no_server():
+    with MultiplexedSQLiteClient(connect_address="tcp://127.0.0.1:5998") as client:
+        future = client.submit("SELECT 1", request_timeout=50, retries=2)
+        with pytest.raises(SQLiteRxConnectionError):
+            future.result(timeout=5)
+
+        pending = client.submit("SELECT 1", request_timeout=10000)
+    with pytest.raises(SQLiteRxConnectionError):
+        pending.result(timeout=5)
+    with pytest.raises(SQLiteRxConnectionError):
+        client.submit("SELECT 1")
@@ -8,6 +8,7 @@ import logging.config
 
 from sqlite_rx import get_default_logger_settings
 from sqlite_rx.client import SQLiteClient
+from sqlite_rx.codec import FRAME_THRESHOLD, Codec
 from sqlite_rx.server import SQLiteServer
 
 logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
@@ -24,7 +25,8 @@ def plain_client():
     }
     server = SQLiteServer(bind_address="tcp://127.0.0.1:5003",
                           database=":memory:",
-                          auth_config=auth_config)
+                          auth_config=auth_config,
+                          codec=Codec(frame_threshold=FRAME_THRESHOLD))
     
     # server.daemon = True
 
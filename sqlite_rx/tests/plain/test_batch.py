@@ -0,0 +1,43 @@
+def test_setup_tables(plain_client):
+    result = plain_client.execute_batch([
+        'CREATE TABLE orders (id integer PRIMARY KEY, item text, qty integer)',
+        'CREATE TABLE stock (item text PRIMARY KEY, qty integer CHECK (qty >= 0))',
+        ('INSERT INTO stock VALUES (?, ?)', ('apple', 10)),
+    ])
+    assert result['error'] is None
+    assert len(result['results']) == 3
+
+
+def test_transactional_batch(plain_client):
+    result = plain_client.execute_batch([
+        ('INSERT INTO orders (item, qty) VALUES (?, ?)', ('apple', 3)),
+        ('UPDATE stock SET qty = qty - ? WHERE item = ?', (3, 'apple')),
+        ('SELECT qty FROM stock WHERE item = ?', ('apple',)),
+    ])
+    assert result['error'] is None
+    assert result['results'] == [{'items': [], 'rowcount': 1, 'lastrowid': 1},
+                                 {'items': [], 'rowcount': 1, 'lastrowid': 1},
+                                 {'items': [[7]], 'lastrowid': 1}]
+
+
+def test_transactional_batch_rolls_back(plain_client):
+    result = plain_client.execute_batch([
+        ('INSERT INTO orders (item, qty) VALUES (?, ?)', ('apple', 30)),
+        ('UPDATE stock SET qty = qty - ? WHERE item = ?', (30, 'apple')),
+    ])
+    assert result['error']['type'] == 'sqlite3.IntegrityError'
+    assert result['failed_statement'] == 1
+    assert result['results'] == []
+    assert plain_client.execute('SELECT COUNT(*) FROM orders')['items'] == [[1]]
+    assert plain_client.execute('SELECT qty FROM stock')['items'] == [[7]]
+
+
+def test_non_transactional_batch_stops_at_error(plain_client):
+    result = plain_client.execute_batch([
+        ('INSERT INTO orders (item, qty) VALUES (?, ?)', ('pear', 1)),
+        'SELECT * FROM IDOLS',
+        ('INSERT INTO orders (item, qty) VALUES (?, ?)', ('plum', 1)),
+    ], transactional=False)
+    assert result['failed_statement'] == 1
+    assert len(result['results']) == 1
+    assert plain_client.execute('SELECT item FROM orders ORDER BY id')['items'] == [['apple'], ['pear']]
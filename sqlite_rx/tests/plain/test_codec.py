@@ -0,0 +1,53 @@
+import os
+import zlib
+
+import msgpack
+import zmq
+
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.codec import FRAME_THRESHOLD, Codec
+
+
+def test_client_switches_to_framed_messages(plain_client):
+    plain_client.execute('SELECT 1')
+    assert plain_client._peer is not None
+    assert not plain_client._peer.legacy
+    result = plain_client.execute('SELECT ?', 'x' * 10000)
+    assert result['items'] == [['x' * 10000]]
+
+
+def test_legacy_client():
+    context = zmq.Context()
+    socket = context.socket(zmq.REQ)
+    socket.connect("tcp://127.0.0.1:5003")
+    request = {"client_id": "legacy", "query": "SELECT 42", "params": [],
+               "execute_many": False, "execute_script": False}
+    socket.send(zlib.compress(msgpack.dumps(request)))
+    assert socket.poll(2500)
+    response = msgpack.loads(zlib.decompress(socket.recv()), raw=False)
+    assert response == {"items": [[42]], "error": None}
+    socket.close(linger=0)
+    context.term()
+
+
+def test_large_blobs_sent_out_of_band(plain_client):
+    blob = os.urandom(256 * 1024)
+    with SQLiteClient(connect_address="tcp://127.0.0.1:5003", codec=Codec(frame_threshold=FRAME_THRESHOLD)) as client:
+        client.execute('CREATE TABLE images (id INTEGER PRIMARY KEY, data BLOB)')
+        assert client.execute('INSERT INTO images VALUES (?, ?)', 1, blob)['error'] is None
+        assert client.execute('INSERT INTO images VALUES (?, ?)', [2, blob], [3, b'small'],
+                              execute_many=True)['error'] is None
+
+        rows = client.execute('SELECT id, data FROM images ORDER BY id')['items']
+        assert [row[0] for row in rows] == [1, 2, 3]
+        assert isinstance(rows[0][1], memoryview)
+        assert rows[0][1] == blob and rows[1][1] == blob
+        assert rows[2][1] == b'small'
+
+        response = client.execute_batch([('SELECT length(?)', (blob,)), 'SELECT data FROM images WHERE id = 1'])
+        assert response['results'][0]['items'] == [[len(blob)]]
+        assert response['results'][1]['items'][0][0] == blob
+
+    # Clients which don't opt in get bytes, even from a server which does
+    rows = plain_client.execute('SELECT data FROM images WHERE id = 1')['items']
+    assert type(rows[0][0]) is bytes and rows[0][0] == blob
@@ -0,0 +1,39 @@
+from array import array
+
+import pytest
+
+
+def test_setup_table(plain_client):
+    plain_client.execute('CREATE TABLE metrics (ts integer, value real, host text, note text)')
+    rows = [(n, n * 0.5, 'host{}'.format(n % 3), None if n % 2 else 'even') for n in range(1000)]
+    result = plain_client.execute('INSERT INTO metrics VALUES (?, ?, ?, ?)', *rows, execute_many=True)
+    assert result['rowcount'] == 1000
+
+
+def test_columnar_select(plain_client):
+    result = plain_client.execute('SELECT ts, value, host, note FROM metrics ORDER BY ts', result_format='columnar')
+    assert result['error'] is None
+    assert result['items'] == []
+    assert result['columns'] == ['ts', 'value', 'host', 'note']
+    ts, value, host, note = result['data']
+    assert ts == array('q', range(1000))
+    assert value == array('d', [n * 0.5 for n in range(1000)])
+    assert host[:3] == ['host0', 'host1', 'host2']
+    assert note[:2] == ['even', None]
+
+
+def test_columnar_empty_result(plain_client):
+    result = plain_client.execute('SELECT ts, value FROM metrics WHERE ts < 0', result_format='columnar')
+    assert result['columns'] == ['ts', 'value']
+    assert result['data'] == [[], []]
+
+
+def test_columnar_non_select(plain_client):
+    result = plain_client.execute('UPDATE metrics SET value = 1 WHERE ts = 0', result_format='columnar')
+    assert result['columns'] == []
+    assert result['rowcount'] == 1
+
+
+def test_invalid_result_format(plain_client):
+    with pytest.raises(ValueError):
+        plain_client.execute('SELECT 1', result_format='arrow')
@@ -0,0 +1,44 @@
+import pytest
+
+from sqlite_rx.exception import SQLiteRxQueryError
+
+
+def test_setup_table(plain_client):
+    plain_client.execute('CREATE TABLE numbers (n integer, square integer)')
+    rows = [(n, n * n) for n in range(2500)]
+    result = plain_client.execute('INSERT INTO numbers VALUES (?, ?)', *rows, execute_many=True)
+    assert result['rowcount'] == 2500
+
+
+def test_iterate_all_rows(plain_client):
+    rows = list(plain_client.iterate('SELECT n, square FROM numbers ORDER BY n', batch_size=1000))
+    assert rows == [[n, n * n] for n in range(2500)]
+
+
+def test_iterate_with_params(plain_client):
+    rows = list(plain_client.iterate('SELECT n FROM numbers WHERE n < ? ORDER BY n', 10, batch_size=3))
+    assert rows == [[n] for n in range(10)]
+
+
+def test_iterate_exact_batches(plain_client):
+    rows = list(plain_client.iterate('SELECT n FROM numbers WHERE n < 10', batch_size=5))
+    assert len(rows) == 10
+
+
+def test_iterate_early_close(plain_client):
+    iterator = plain_client.iterate('SELECT n FROM numbers ORDER BY n', batch_size=100)
+    assert [next(iterator) for _ in range(150)] == [[n] for n in range(150)]
+    iterator.close()
+    # The connection is still usable once the server-side cursor is closed.
+    result = plain_client.execute('SELECT COUNT(*) FROM numbers')
+    assert result['items'] == [[2500]]
+
+
+def test_iterate_error(plain_client):
+    with pytest.raises(SQLiteRxQueryError):
+        list(plain_client.iterate('SELECT * FROM IDOLS'))
+
+
+def test_iterate_invalid_batch_size(plain_client):
+    with pytest.raises(ValueError):
+        list(plain_client.iterate('SELECT n FROM numbers', batch_size=0))
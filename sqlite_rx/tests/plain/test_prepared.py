@@ -0,0 +1,51 @@
+def test_prepare_and_execute(plain_client):
+    plain_client.execute('CREATE TABLE kv (k text PRIMARY KEY, v integer)')
+    insert = plain_client.prepare('INSERT INTO kv VALUES (?, ?)')
+    select = plain_client.prepare('SELECT v FROM kv WHERE k = ?')
+    assert insert.statement_id != select.statement_id
+    assert select.read_only and not insert.read_only
+
+    for n in range(10):
+        result = plain_client.execute_prepared(insert, 'key{}'.format(n), n)
+        assert result['error'] is None
+        assert result['rowcount'] == 1
+
+    assert plain_client.execute_prepared(select, 'key7')['items'] == [[7]]
+
+
+def test_execute_many_prepared(plain_client):
+    insert = plain_client.prepare('INSERT INTO kv VALUES (?, ?)')
+    rows = [('many{}'.format(n), n) for n in range(5)]
+    result = plain_client.execute_prepared(insert, *rows, execute_many=True)
+    assert result['rowcount'] == 5
+
+
+def test_hit_and_miss_counts(plain_client):
+    before = plain_client.stats()['prepared_statements']
+    select = plain_client.prepare('SELECT COUNT(*) FROM kv')
+    for _ in range(3):
+        assert plain_client.execute_prepared(select)['items'] == [[15]]
+    after = plain_client.stats()['prepared_statements']
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 3
+
+
+def test_unknown_statement_is_reprepared(plain_client):
+    from sqlite_rx.client import PreparedStatement
+
+    # A handle the server has never seen, e.g. after a server restart.
+    statement = PreparedStatement('SELECT COUNT(*) + 1 FROM kv')
+    assert plain_client.execute_prepared(statement)['items'] == [[16]]
+    assert plain_client.execute_prepared(statement)['items'] == [[16]]
+
+
+def test_schema_change(plain_client):
+    select = plain_client.prepare('SELECT * FROM kv WHERE k = ?')
+    assert plain_client.execute_prepared(select, 'key1')['items'] == [['key1', 1]]
+    plain_client.execute('ALTER TABLE kv ADD COLUMN extra text')
+    assert plain_client.execute_prepared(select, 'key1')['items'] == [['key1', 1, None]]
+
+
+def test_unknown_admin_command(plain_client):
+    response = plain_client._request({"client_id": plain_client.client_id, "admin": "nope"}, 1, 2500)
+    assert response['error']['type'] == 'builtins.ValueError'
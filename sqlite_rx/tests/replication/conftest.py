@@ -0,0 +1,57 @@
+import os
+import platform
+import signal
+import tempfile
+import pytest
+
+import logging.config
+
+from collections import namedtuple
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+replication_pair = namedtuple('replication_pair', ('primary', 'follower', 'orphan'))
+
+
+def stop(server):
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+
+
+@pytest.fixture(scope="module")
+def replication():
+    with tempfile.TemporaryDirectory() as base_dir:
+        primary = SQLiteServer(bind_address="tcp://127.0.0.1:5016",
+                               database=os.path.join(base_dir, 'primary.db'),
+                               replication_address="tcp://127.0.0.1:5017")
+        follower = SQLiteServer(bind_address="tcp://127.0.0.1:5018",
+                                database=os.path.join(base_dir, 'follower.db'),
+                                follow="tcp://127.0.0.1:5016")
+        # Follows a primary which is down
+        orphan = SQLiteServer(bind_address="tcp://127.0.0.1:5036",
+                              database=os.path.join(base_dir, 'orphan.db'),
+                              follow="tcp://127.0.0.1:5998")
+        primary.start()
+        follower.start()
+        orphan.start()
+        LOG.info("Started a primary and a follower SQLiteServer")
+
+        pair = replication_pair(primary=SQLiteClient(connect_address="tcp://127.0.0.1:5016"),
+                                follower=SQLiteClient(connect_address="tcp://127.0.0.1:5018"),
+                                orphan=SQLiteClient(connect_address="tcp://127.0.0.1:5036"))
+        yield pair
+
+        stop(orphan)
+        stop(follower)
+        stop(primary)
+        pair.primary.cleanup()
+        pair.follower.cleanup()
+        pair.orphan.cleanup()
@@ -0,0 +1,92 @@
+import time
+
+
+def wait_for_follower(replication, timeout=10):
+    sequence = replication.primary.replication()['sequence']
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = replication.follower.replication()
+        if status['sequence'] >= sequence:
+            return status
+        time.sleep(0.1)
+    raise AssertionError("Follower did not reach sequence {}: {}".format(sequence, status))
+
+
+def test_writes_are_replicated(replication):
+    primary = replication.primary
+    assert primary.execute("CREATE TABLE stocks (symbol text, qty real)")['error'] is None
+    assert primary.execute("INSERT INTO stocks VALUES (?, ?)", 'IBM', 10)['error'] is None
+    assert primary.execute("INSERT INTO stocks VALUES (?, ?)", ('MSFT', 20), ('AAPL', 30),
+                           execute_many=True)['error'] is None
+    result = primary.execute_batch([("UPDATE stocks SET qty = qty + 1 WHERE symbol = ?", ('IBM',)),
+                                    ("INSERT INTO stocks VALUES ('ORCL', 40)", None)])
+    assert result['error'] is None
+
+    status = wait_for_follower(replication)
+    assert status['role'] == 'follower'
+    assert status['lag'] == 0
+    assert status['lag_seconds'] == 0.0
+    assert status['subscribed']
+    query = "SELECT symbol, qty FROM stocks ORDER BY symbol"
+    assert replication.follower.execute(query)['items'] == primary.execute(query)['items']
+    assert len(primary.execute(query)['items']) == 4
+
+
+def test_transactions(replication):
+    primary = replication.primary
+    primary.execute("CREATE TABLE accounts (id INTEGER PRIMARY KEY, balance INTEGER)")
+    primary.execute("BEGIN")
+    primary.execute("INSERT INTO accounts VALUES (1, 100)")
+    primary.execute("SAVEPOINT transfer")
+    primary.execute("INSERT INTO accounts VALUES (2, 200)")
+    primary.execute("ROLLBACK TO transfer")
+    primary.execute("INSERT INTO accounts VALUES (3, 300)")
+    primary.execute("COMMIT")
+    sequence = primary.replication()['sequence']
+
+    primary.execute("BEGIN")
+    primary.execute("INSERT INTO accounts VALUES (4, 400)")
+    primary.execute("ROLLBACK")
+    # A rolled back transaction gets no sequence number
+    assert primary.replication()['sequence'] == sequence
+
+    wait_for_follower(replication)
+    assert replication.follower.execute("SELECT id FROM accounts ORDER BY id")['items'] == [[1], [3]]
+
+
+def test_follower_is_read_only(replication):
+    result = replication.follower.execute("CREATE TABLE local (x)")
+    assert 'readonly' in result['error']['message']
+
+
+def test_sequence_table_is_protected(replication):
+    result = replication.primary.execute("UPDATE _sqlite_rx_replication SET sequence = 0")
+    assert result['error'] is not None
+    assert replication.primary.execute("SELECT sequence FROM _sqlite_rx_replication")['items'] == \
+        [[replication.primary.replication()['sequence']]]
+
+
+def test_reads_while_the_primary_is_down(replication):
+    # The follower's requests to the primary time out after a second without stalling its reads
+    latencies = []
+    deadline = time.monotonic() + 2.5
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        assert replication.orphan.execute("SELECT 1")['items'] == [[1]]
+        latencies.append(time.monotonic() - started)
+        time.sleep(0.05)
+    assert max(latencies) < 0.5
+    status = replication.orphan.replication()
+    assert not status['subscribed']
+    assert status['error']
+
+
+def test_non_deterministic_writes_are_refused(replication):
+    primary = replication.primary
+    primary.execute("CREATE TABLE events (at TEXT)")
+    result = primary.execute("INSERT INTO events VALUES (datetime('now'))")
+    assert result['error']['type'] == 'sqlite_rx.exception.SQLiteRxReplicationError'
+    # Bound as a parameter the value is replicated as it is
+    assert primary.execute("INSERT INTO events VALUES (?)", '2024-01-01 00:00:00')['error'] is None
+    wait_for_follower(replication)
+    assert replication.follower.execute("SELECT at FROM events")['items'] == [['2024-01-01 00:00:00']]
@@ -0,0 +1,47 @@
+import os
+import platform
+import signal
+import pytest
+
+import sqlite3
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.server import SQLiteServer
+from sqlite_rx.sharding import ShardedSQLiteClient
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+SHARDS = {
+    "a": "tcp://127.0.0.1:5019",
+    "b": "tcp://127.0.0.1:5020",
+    "c": "tcp://127.0.0.1:5021",
+}
+
+
+@pytest.fixture(scope="module")
+def sharded_client():
+    auth_config = {
+        sqlite3.SQLITE_OK: {
+            sqlite3.SQLITE_DELETE
+        }
+    }
+    servers = [SQLiteServer(bind_address=address, database=":memory:", auth_config=auth_config)
+               for address in SHARDS.values()]
+    for server in servers:
+        server.start()
+    LOG.info("Started 3 SQLiteServer shards")
+
+    # Shard c is added by the tests
+    client = ShardedSQLiteClient({name: SHARDS[name] for name in ("a", "b")})
+    yield client
+
+    for server in servers:
+        if platform.system().lower() == 'windows':
+            os.system("taskkill  /F /pid "+str(server.pid))
+        else:
+            os.kill(server.pid, signal.SIGINT)
+        server.join()
+    client.cleanup()
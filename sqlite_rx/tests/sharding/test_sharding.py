@@ -0,0 +1,77 @@
+from sqlite_rx.sharding import RangeMap, ShardedSQLiteClient
+
+from .conftest import SHARDS
+
+
+def test_routing(sharded_client):
+    schema = "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)"
+    for response in sharded_client.execute_all(schema).values():
+        assert response['error'] is None
+
+    for user_id in range(100):
+        response = sharded_client.execute("INSERT INTO users VALUES (?, ?)", user_id, "user-{}".format(user_id),
+                                          shard_key=user_id)
+        assert response['error'] is None
+
+    for user_id in (0, 17, 99):
+        response = sharded_client.execute("SELECT name FROM users WHERE id = ?", user_id, shard_key=user_id)
+        assert response['items'] == [["user-{}".format(user_id)]]
+
+    counts = {shard: response['items'][0][0]
+              for shard, response in sharded_client.execute_all("SELECT count(*) FROM users").items()}
+    assert sum(counts.values()) == 100
+    assert all(count > 0 for count in counts.values())
+
+
+def test_scatter_gather(sharded_client):
+    response = sharded_client.scatter_gather("SELECT id FROM users ORDER BY id")
+    assert response['error'] is None
+    assert sorted(row[0] for row in response['items']) == list(range(100))
+    assert sum(response['shards'].values()) == 100
+
+    response = sharded_client.scatter_gather("SELECT id FROM users ORDER BY id DESC LIMIT 5",
+                                             key=lambda row: row[0], reverse=True, limit=5)
+    assert [row[0] for row in response['items']] == [99, 98, 97, 96, 95]
+
+    response = sharded_client.scatter_gather("SELECT * FROM missing")
+    assert response['error']['type'] == 'sqlite3.OperationalError'
+    assert response['shard'] in ("a", "b")
+
+
+def test_add_shard(sharded_client):
+    with ShardedSQLiteClient({"c": SHARDS["c"]}) as new_shard:
+        new_shard.execute_all("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+
+        moved = sharded_client.add_shard("c", SHARDS["c"], tables={"users": "id"}, delete=True)
+        assert 0 < moved["users"] < 100
+        assert sharded_client.shards == ["a", "b", "c"]
+
+        counts = {shard: response['items'][0][0]
+                  for shard, response in sharded_client.execute_all("SELECT count(*) FROM users").items()}
+        assert counts["c"] == moved["users"]
+        assert sum(counts.values()) == 100
+
+        for user_id in range(100):
+            response = sharded_client.execute("SELECT name FROM users WHERE id = ?", user_id, shard_key=user_id)
+            assert response['items'] == [["user-{}".format(user_id)]]
+
+        assert sharded_client.rebalance({"users": "id"}) == {"users": 0}
+
+
+def test_add_shard_taking_over_a_range(sharded_client):
+    router = RangeMap([(None, "a"), (50, "b")])
+    with ShardedSQLiteClient({name: SHARDS[name] for name in ("a", "b")}, router=router) as client, \
+            ShardedSQLiteClient({"c": SHARDS["c"]}) as new_shard:
+        for response in client.execute_all("CREATE TABLE orders (id INTEGER PRIMARY KEY)").values():
+            assert response['error'] is None
+        new_shard.execute_all("CREATE TABLE orders (id INTEGER PRIMARY KEY)")
+        for order_id in range(100):
+            client.execute("INSERT INTO orders VALUES (?)", order_id, shard_key=order_id)
+
+        # Shard b owns no range once c takes over its keys, yet its rows must move
+        moved = client.add_shard("c", SHARDS["c"], tables={"orders": "id"}, delete=True,
+                                 lower_bound=50, batch_size=7)
+        assert moved == {"orders": 50}
+        counts = {shard: response['items'][0][0]
+                  for shard, response in client.execute_all("SELECT count(*) FROM orders").items()}
+        assert counts == {"a": 50, "b": 0, "c": 50}
@@ -0,0 +1,42 @@
+import os
+import platform
+import signal
+import tempfile
+import pytest
+
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+
+@pytest.fixture(scope="module")
+def slow_log_path():
+    with tempfile.TemporaryDirectory() as base_dir:
+        yield base_dir
+
+
+@pytest.fixture(scope="module")
+def slowlog_client(slow_log_path):
+    # Every query is slow with a threshold of 0
+    server = SQLiteServer(bind_address="tcp://127.0.0.1:5015",
+                          database=os.path.join(slow_log_path, 'data.db'),
+                          slow_query_threshold=0,
+                          slow_query_log=os.path.join(slow_log_path, 'slow.log'))
+
+    client = SQLiteClient(connect_address="tcp://127.0.0.1:5015")
+
+    server.start()
+    LOG.info("Started Test SQLiteServer with a slow query log")
+    yield client
+    if platform.system().lower() == 'windows':
+        os.system("taskkill  /F /pid "+str(server.pid))
+    else:
+        os.kill(server.pid, signal.SIGINT)
+    server.join()
+    client.cleanup()
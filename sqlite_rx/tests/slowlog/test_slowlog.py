@@ -0,0 +1,48 @@
+import json
+import os
+
+
+def test_setup(slowlog_client):
+    slowlog_client.execute('CREATE TABLE numbers (n integer, label text)')
+    slowlog_client.execute('CREATE INDEX numbers_label ON numbers (label)')
+    slowlog_client.execute('INSERT INTO numbers VALUES (?, ?)', *[(n, str(n)) for n in range(100)],
+                           execute_many=True)
+
+
+def test_table_scan_is_logged_with_its_plan(slowlog_client):
+    result = slowlog_client.execute('SELECT * FROM numbers WHERE n > ?', 90)
+    assert len(result['items']) == 9
+    record = slowlog_client.slow_queries()[-1]
+    assert record['query'] == 'SELECT * FROM numbers WHERE n > ?'
+    assert record['params'] == [90]
+    assert record['rows'] == 9
+    assert record['mode'] == 'params'
+    assert record['client_id'] == slowlog_client.client_id
+    assert record['plan'] == ['SCAN numbers']
+    assert record['table_scan'] is True
+    assert record['duration'] >= 0
+
+
+def test_indexed_query(slowlog_client):
+    slowlog_client.execute('SELECT n FROM numbers WHERE label = ?', '7')
+    record = slowlog_client.slow_queries()[-1]
+    assert record['plan'] == ['SEARCH numbers USING INDEX numbers_label (label=?)']
+    assert record['table_scan'] is False
+
+
+def test_execute_many_and_scripts(slowlog_client):
+    slowlog_client.execute('UPDATE numbers SET label = ? WHERE n = ?', ('a', 1), ('b', 2), execute_many=True)
+    record = slowlog_client.slow_queries()[-1]
+    assert record['mode'] == 'many'
+    assert record['rows'] == 2
+    assert record['plan'] is not None
+    slowlog_client.execute('CREATE TABLE other (x integer); INSERT INTO other VALUES (1);', execute_script=True)
+    assert slowlog_client.slow_queries()[-1]['plan'] is None
+
+
+def test_log_file(slowlog_client, slow_log_path):
+    count = slowlog_client.stats()['slow_queries']
+    with open(os.path.join(slow_log_path, 'slow.log')) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == count
+    assert records[-1]['mode'] == 'script'
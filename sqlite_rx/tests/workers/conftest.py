@@ -0,0 +1,35 @@
+import os
+import platform
+import signal
+import tempfile
+import pytest
+
+import logging.config
+
+from sqlite_rx import get_default_logger_settings
+from sqlite_rx.client import SQLiteClient
+from sqlite_rx.server import SQLiteServer
+
+logging.config.dictConfig(get_default_logger_settings(level="DEBUG"))
+
+LOG = logging.getLogger(__file__)
+
+
+@pytest.fixture(scope="module")
+def workers_client():
+    with tempfile.TemporaryDirectory() as base_dir:
+        server = SQLiteServer(bind_address="tcp://127.0.0.1:5005",
+                              database=os.path.join(base_dir, 'main.db'),
+                              read_workers=2)
+
+        client = SQLiteClient(connect_address="tcp://127.0.0.1:5005")
+
+        server.start()
+        LOG.info("Started Test SQLiteServer with read workers")
+        yield client
+        if platform.system().lower() == 'windows':
+            os.system("taskkill  /F /pid "+str(server.pid))
+        else:
+            os.kill(server.pid, signal.SIGINT)
+        server.join()
+        client.cleanup()
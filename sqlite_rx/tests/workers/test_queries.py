@@ -0,0 +1,105 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sqlite_rx.client import AsyncSQLiteClient
+from sqlite_rx.exception import SQLiteRxWorkerSetupError
+from sqlite_rx.server import SQLiteServer
+
+
+purchases = [('2006-03-28', 'BUY', 'IBM', 1000, 45.00),
+             ('2006-04-05', 'BUY', 'MSFT', 1000, 72.00),
+             ('2006-04-06', 'SELL', 'XOM', 500, 53.00)]
+
+
+def test_memory_database_not_allowed():
+    with pytest.raises(SQLiteRxWorkerSetupError):
+        SQLiteServer(bind_address="tcp://127.0.0.1:5006", database=":memory:", read_workers=2)
+
+
+def test_table_creation(workers_client):
+    result = workers_client.execute('CREATE TABLE stocks (date text, trans text, symbol text, qty real, price real)')
+    assert result == {"error": None, 'items': []}
+
+
+def test_table_rows_insertion(workers_client):
+    result = workers_client.execute('INSERT INTO stocks VALUES (?,?,?,?,?)', *purchases, execute_many=True)
+    assert result == {'error': None, 'items': [], 'rowcount': 3}
+
+
+def test_select_from_readers(workers_client):
+    result = workers_client.execute('SELECT * FROM stocks WHERE symbol = ?', 'IBM')
+    assert result['error'] is None
+    assert result['items'] == [list(purchases[0])]
+
+
+def test_concurrent_selects(workers_client):
+    def count(_):
+        return workers_client.execute('SELECT COUNT(*) FROM stocks')['items']
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(count, range(20)))
+    assert results == [[[3]]] * 20
+
+
+def test_update_goes_to_writer(workers_client):
+    result = workers_client.execute('UPDATE stocks SET price = 480 where symbol = ?', 'IBM')
+    assert result['error'] is None
+    assert result['rowcount'] == 1
+    result = workers_client.execute('SELECT price FROM stocks WHERE symbol = ?', 'IBM')
+    assert result['items'] == [[480.0]]
+
+
+def test_iterate(workers_client):
+    rows = list(workers_client.iterate('SELECT symbol FROM stocks ORDER BY symbol', batch_size=2))
+    assert rows == [['IBM'], ['MSFT'], ['XOM']]
+
+
+def test_async_client(workers_client):
+    async def main():
+        async with AsyncSQLiteClient(connect_address="tcp://127.0.0.1:5005") as client:
+            return await asyncio.gather(*[client.execute('SELECT COUNT(*) FROM stocks') for _ in range(50)])
+
+    results = asyncio.run(main())
+    assert [result['items'] for result in results] == [[[3]]] * 50
+
+
+def test_prepared_statement_on_readers(workers_client):
+    select = workers_client.prepare('SELECT qty FROM stocks WHERE symbol = ?')
+    for _ in range(5):
+        assert workers_client.execute_prepared(select, 'XOM')['items'] == [[500.0]]
+
+
+def test_large_blobs_through_readers(workers_client):
+    blob = os.urandom(256 * 1024)
+    rows = workers_client.execute('SELECT ?, length(?)', blob, blob)['items']
+    assert rows[0][0] == blob
+    assert rows[0][1] == len(blob)
+
+    async def main():
+        async with AsyncSQLiteClient(connect_address="tcp://127.0.0.1:5005") as client:
+            await client.execute('SELECT 1')
+            return await client.execute('SELECT ?', blob)
+
+    assert asyncio.run(main())['items'][0][0] == blob
+
+
+def test_reads_inside_a_transaction_go_to_writer(workers_client):
+    workers_client.execute('CREATE TABLE ledger (x integer)')
+    assert workers_client.execute('BEGIN')['error'] is None
+    workers_client.execute('INSERT INTO ledger VALUES (1)')
+    # The readers don't see the uncommitted row
+    assert workers_client.execute('SELECT COUNT(*) FROM ledger')['items'] == [[1]]
+    assert workers_client.execute('ROLLBACK')['error'] is None
+    assert workers_client.execute('SELECT COUNT(*) FROM ledger')['items'] == [[0]]
+
+
+def test_reads_of_temp_tables_go_to_writer(workers_client):
+    # Runs last: once the writer has TEMP tables, every read stays on it
+    assert workers_client.execute('CREATE TEMP TABLE scratch (x integer)')['error'] is None
+    workers_client.execute('INSERT INTO scratch VALUES (1)')
+    result = workers_client.execute('SELECT x FROM scratch')
+    assert result['error'] is None
+    assert result['items'] == [[1]]